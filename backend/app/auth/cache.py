@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+from sqlalchemy import event
+from app.auth.models import User
+
+# Upper bounds on how many principals are cached and for how long (seconds).
+# The cache is per process and so are its invalidations: with several workers, a
+# change to a user (or their deletion) reaches the other workers only when their
+# entries expire, so PRINCIPAL_CACHE_TTL bounds how long they may serve the old one.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+CacheKey = Tuple[str, int]  # (sub, exp) of a verified token
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    The identity fields of an authenticated user, detached from any session.
+    """
+    id: int
+    username: str
+    email: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, username=user.username, email=user.email)
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of user snapshots keyed by token `(sub, exp)`.
+    Entries expire after `ttl` seconds or when the token does, whichever is sooner.
+    Local to this process: `invalidate_user` does not reach other workers.
+    """
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, UserSnapshot]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[UserSnapshot]:
+        """
+        Return the cached snapshot for a token, or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: CacheKey, snapshot: UserSnapshot, token_exp: Optional[float] = None) -> None:
+        """
+        Cache a snapshot; `token_exp` (a Unix timestamp) caps the entry's lifetime.
+        """
+        lifetime = self.ttl
+        if token_exp is not None:
+            lifetime = min(lifetime, token_exp - time.time())
+        if lifetime <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + lifetime, snapshot)
+            self._keys_by_user.setdefault(snapshot.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Drop every cached token of a user, e.g. after the user changed or was deleted.
+        """
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters and current size, for monitoring.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: CacheKey) -> None:
+        # Caller holds the lock
+        _, snapshot = self._entries.pop(key)
+        keys = self._keys_by_user.get(snapshot.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[snapshot.id]
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_principal(mapper, connection, target):
+    """
+    Evict a user's cached principals whenever the ORM updates or deletes the user
+    (in this process only; other workers keep theirs until PRINCIPAL_CACHE_TTL).
+    Bulk UPDATE/DELETE statements bypass this hook and must call
+    `principal_cache.invalidate_user` themselves.
+    """
+    principal_cache.invalidate_user(target.id)
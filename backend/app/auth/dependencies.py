@@ -1,13 +1,52 @@
-from fastapi import Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from app.database import get_db
+import logging
+from typing import Optional
+from fastapi import Depends, HTTPException, Header, Query, WebSocketException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, get_async_db
 from app.auth.models import User
 from app.auth.utils import decode_token  # Utility to decode JWT
+from app.auth.cache import UserSnapshot, principal_cache
 
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)) -> User:
+logger = logging.getLogger(__name__)
+
+async def get_current_user(authorization: str = Header(...), db: AsyncSession = Depends(get_async_db)) -> UserSnapshot:
     """
     Extracts the current authenticated user based on the JWT token passed in the Authorization header.
+    Verified principals are served from the principal cache, so most requests make no DB trip.
+    """
+    return await _authenticate(authorization, db)
+
+
+async def get_optional_user(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Optional[UserSnapshot]:
+    """
+    Like `get_current_user`, but anonymous requests get None instead of a 401.
+    A token that is present but invalid is still rejected.
+    """
+    if not authorization:
+        return None
+    return await _authenticate(authorization, db)
+
+
+async def get_websocket_user(token: Optional[str] = Query(None)) -> Optional[UserSnapshot]:
+    """
+    Authenticate a WebSocket from its `token` query parameter (browsers cannot set
+    headers on WebSocket requests); None when no token is given. The session is
+    closed before returning so a long-lived socket does not hold a DB connection.
     """
+    if not token:
+        return None
+    try:
+        async with AsyncSessionLocal() as db:
+            return await _authenticate(f"Bearer {token}", db)
+    except HTTPException as http_error:
+        # 1008: policy violation
+        raise WebSocketException(code=1008, reason=http_error.detail)
+
+
+async def _authenticate(authorization: str, db: AsyncSession) -> UserSnapshot:
     try:
         # Ensure the Authorization header contains "Bearer <token>"
         if not authorization.startswith("Bearer "):
@@ -15,29 +54,33 @@ def get_current_user(authorization: str = Header(...), db: Session = Depends(get
         
         # Extract the token
         token = authorization.split("Bearer ")[1]
-        print(f"Extracted Token: {token}")  # Debugging: Log the extracted token
 
-        # Decode the token to extract the payload
+        # Decode the token to extract the payload (this also checks signature and expiry)
         payload = decode_token(token)
-        print(f"Decoded Payload: {payload}")  # Debugging: Log the decoded payload
 
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token payload")
-        
+
+        cache_key = (str(user_id), int(payload.get("exp", 0)))
+        snapshot = principal_cache.get(cache_key)
+        if snapshot is not None:
+            return snapshot
+
         # Retrieve the user from the database
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, int(user_id))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        
-        print(f"Authenticated User: {user}")  # Debugging: Log the authenticated user
-        return user
+
+        snapshot = UserSnapshot.from_user(user)
+        principal_cache.put(cache_key, snapshot, token_exp=payload.get("exp"))
+        return snapshot
 
     except HTTPException as http_error:
         # Reraise HTTP exceptions with their existing status code and detail
-        print(f"HTTP Exception in get_current_user: {http_error.detail}")  # Debugging
+        logger.debug("Authentication rejected: %s", http_error.detail)
         raise http_error
-    except Exception as e:
+    except Exception:
         # Catch all other exceptions and log them
-        print(f"Unexpected error in get_current_user: {e}")  # Debugging
+        logger.exception("Unexpected error authenticating request")
         raise HTTPException(status_code=401, detail="Authentication failed")
@@ -0,0 +1,564 @@
+"""
+The follow graph held in memory as compressed sparse rows: for every user, the
+sorted ids they follow (and, mirrored, the sorted ids following them) packed
+end to end in one int32 array, with an offsets array marking where each user's
+run starts. A membership check is a binary search within one run, a count is
+the difference of two offsets, and set queries (mutuals, friends of friends)
+are NumPy operations over whole runs.
+
+Edges changed since the arrays were built live in a small overlay of per-user
+sets on top of them. This worker's follows apply immediately; every worker
+tails the `follow_events` log to pick up the others', and rebuilds the arrays
+from the `followers` table (in a worker thread) when the overlay grows large
+or every FOLLOW_GRAPH_RELOAD_INTERVAL seconds.
+
+Event ids are allocated when a transaction inserts them but become visible
+when it commits, so a lower id can appear after a higher one was read. Ids the
+cursor skipped are kept as gaps and looked for again on every sync; an event
+that turns up late is not replayed in order but reconciled against the
+`followers` table.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+from app.auth.models import FollowEvent, followers
+from starlette.concurrency import run_in_threadpool
+from app.database import AsyncSessionLocal, SessionLocal
+from app.utils import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reads of the follow event log, and between full rebuilds of the arrays
+FOLLOW_GRAPH_SYNC_INTERVAL = float(os.getenv("FOLLOW_GRAPH_SYNC_INTERVAL", "5"))
+FOLLOW_GRAPH_RELOAD_INTERVAL = float(os.getenv("FOLLOW_GRAPH_RELOAD_INTERVAL", "3600"))
+
+# Overlay size (changed edges) that triggers an early rebuild
+FOLLOW_GRAPH_COMPACT_THRESHOLD = int(os.getenv("FOLLOW_GRAPH_COMPACT_THRESHOLD", "100000"))
+
+# Rows fetched per round trip when loading edges or events
+FOLLOW_GRAPH_LOAD_BATCH = 50000
+
+# How long (seconds) an event id skipped by the cursor is looked for before it is
+# taken to be a rolled-back transaction, and how many such gaps are tracked at most
+FOLLOW_EVENT_GAP_TIMEOUT = float(os.getenv("FOLLOW_EVENT_GAP_TIMEOUT", "60"))
+MAX_FOLLOW_EVENT_GAPS = 10000
+
+# Ids just below the cursor read at a rebuild that are re-checked as possible gaps
+FOLLOW_EVENT_LOAD_WINDOW = 200
+
+# Follow events older than this (seconds) are deleted at each rebuild
+FOLLOW_EVENT_RETENTION = float(os.getenv("FOLLOW_EVENT_RETENTION", str(24 * 60 * 60)))
+
+# At most this many followed accounts are expanded for friends-of-friends suggestions
+SUGGESTION_SOURCES = int(os.getenv("FOLLOW_SUGGESTION_SOURCES", "500"))
+
+# Most-followed accounts kept per snapshot for users who follow nobody yet
+POPULAR_ACCOUNTS = 200
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+@dataclass
+class GraphSnapshot:
+    """
+    Both directions of the follow graph as CSR arrays over user ids `0..size-1`.
+    The run of ids for user `u` is `ids[offsets[u]:offsets[u + 1]]`, sorted.
+    """
+    version: int
+    size: int
+    out_offsets: np.ndarray  # int64, size + 1
+    out_ids: np.ndarray      # int32, followed ids grouped by follower
+    in_offsets: np.ndarray   # int64, size + 1
+    in_ids: np.ndarray       # int32, follower ids grouped by followed
+    popular: np.ndarray      # int32, most-followed first
+
+    @property
+    def edges(self) -> int:
+        return len(self.out_ids)
+
+
+def _compress(keys: np.ndarray, values: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group `values` by `keys` into (offsets, ids), each group sorted.
+    """
+    order = np.lexsort((values, keys))
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+def _contains(sorted_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask of which `values` occur in `sorted_ids` (one binary search each).
+    """
+    if not sorted_ids.size:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return sorted_ids[positions] == values
+
+
+def _gather(offsets: np.ndarray, ids: np.ndarray, users: np.ndarray) -> np.ndarray:
+    """
+    The runs of several users concatenated, without a Python loop over them.
+    """
+    starts = offsets[users]
+    lengths = offsets[users + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return _EMPTY
+    # Position of each output element: its run's start plus its index within the run
+    run_starts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return ids[run_starts + np.arange(total)]
+
+
+class FollowGraph:
+    """
+    Who follows whom, for membership checks, counts, mutuals and suggestions
+    without a query. Reads take no lock on the arrays (a snapshot is immutable
+    and swapped whole); the overlay is guarded by a lock.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[GraphSnapshot] = None
+        self._added_out: Dict[int, Set[int]] = {}
+        self._removed_out: Dict[int, Set[int]] = {}
+        self._added_in: Dict[int, Set[int]] = {}
+        self._removed_in: Dict[int, Set[int]] = {}
+        self._overlay_size = 0
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        # Id of the last follow event applied, ids below it not seen yet (with when
+        # they were first missed), and when the arrays were last built
+        self.event_cursor = 0
+        self._gaps: Dict[int, float] = {}
+        self.loaded_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def overlay_size(self) -> int:
+        return self._overlay_size
+
+    def replace(self, follower_ids: np.ndarray, followed_ids: np.ndarray, event_cursor: int) -> GraphSnapshot:
+        """
+        Build new arrays from a full edge list and drop the overlay.
+        :param event_cursor: The newest follow event the edge list is known to include.
+        """
+        src = np.asarray(follower_ids, dtype=np.int32)
+        dst = np.asarray(followed_ids, dtype=np.int32)
+        size = int(max(src.max(initial=0), dst.max(initial=0))) + 1
+        out_offsets, out_ids = _compress(src, dst, size)
+        in_offsets, in_ids = _compress(dst, src, size)
+        in_degree = np.diff(in_offsets)
+        k = min(POPULAR_ACCOUNTS, size)
+        popular = np.argpartition(-in_degree, k - 1)[:k]
+        popular = popular[np.argsort(-in_degree[popular], kind="stable")]
+        snapshot = GraphSnapshot(
+            version=next(self._versions),
+            size=size,
+            out_offsets=out_offsets,
+            out_ids=out_ids,
+            in_offsets=in_offsets,
+            in_ids=in_ids,
+            popular=popular[in_degree[popular] > 0].astype(np.int32),
+        )
+        with self._lock:
+            self._snapshot = snapshot
+            self._added_out, self._removed_out = {}, {}
+            self._added_in, self._removed_in = {}, {}
+            self._overlay_size = 0
+            self.event_cursor = event_cursor
+            self._gaps = {}
+            self.loaded_at = time.monotonic()
+        return snapshot
+
+    # Changes
+
+    def add(self, follower_id: int, followed_id: int) -> bool:
+        """
+        Record a follow. Before the first load this does nothing: the load reads
+        the committed edge (or its event) anyway.
+        :return: False if the edge was already present or the graph is not loaded.
+        """
+        with self._lock:
+            if self._snapshot is None or self._has_edge(follower_id, followed_id):
+                return False
+            self._overlay_size += self._flip(follower_id, followed_id, self._removed_out, self._added_out)
+            self._flip(followed_id, follower_id, self._removed_in, self._added_in)
+            return True
+
+    def remove(self, follower_id: int, followed_id: int) -> bool:
+        """
+        Record an unfollow; like `add`, nothing happens before the first load.
+        :return: False if the edge was not present or the graph is not loaded.
+        """
+        with self._lock:
+            if self._snapshot is None or not self._has_edge(follower_id, followed_id):
+                return False
+            self._overlay_size += self._flip(follower_id, followed_id, self._added_out, self._removed_out)
+            self._flip(followed_id, follower_id, self._added_in, self._removed_in)
+            return True
+
+    def add_many(self, follower_id: int, followed_ids: Iterable[int]) -> int:
+        return sum(self.add(follower_id, followed_id) for followed_id in followed_ids)
+
+    def remove_many(self, follower_id: int, followed_ids: Iterable[int]) -> int:
+        return sum(self.remove(follower_id, followed_id) for followed_id in followed_ids)
+
+    def set_edge(self, follower_id: int, followed_id: int, present: bool) -> bool:
+        """
+        Make an edge present or absent. :return: Whether it changed.
+        """
+        if present:
+            return self.add(follower_id, followed_id)
+        return self.remove(follower_id, followed_id)
+
+    def apply_events(self, events: Iterable[Tuple[int, int, int, bool]]) -> int:
+        """
+        Apply `(id, follower_id, followed_id, following)` log entries newer than
+        the cursor, in id order, noting any ids skipped as gaps.
+        Replaying an entry already reflected is harmless.
+        :return: The number of edges that changed.
+        """
+        changed = 0
+        for event_id, follower_id, followed_id, following in events:
+            changed += self.set_edge(follower_id, followed_id, following)
+            with self._lock:
+                if event_id > self.event_cursor + 1:
+                    self._note_gaps(range(max(self.event_cursor + 1, event_id - MAX_FOLLOW_EVENT_GAPS), event_id))
+                self.event_cursor = max(self.event_cursor, event_id)
+        return changed
+
+    def note_gaps(self, event_ids: Iterable[int]) -> None:
+        """
+        Look for these event ids again on later syncs.
+        """
+        with self._lock:
+            self._note_gaps(event_ids)
+
+    def open_gaps(self, timeout: float = FOLLOW_EVENT_GAP_TIMEOUT) -> List[int]:
+        """
+        Event ids still missing, after giving up on those missing for over `timeout` seconds.
+        """
+        cutoff = time.monotonic() - timeout
+        with self._lock:
+            self._gaps = {event_id: since for event_id, since in self._gaps.items() if since >= cutoff}
+            return list(self._gaps)
+
+    def close_gaps(self, event_ids: Iterable[int]) -> None:
+        with self._lock:
+            for event_id in event_ids:
+                self._gaps.pop(event_id, None)
+
+    def _note_gaps(self, event_ids: Iterable[int]) -> None:
+        now = time.monotonic()
+        for event_id in event_ids:
+            self._gaps.setdefault(event_id, now)
+        while len(self._gaps) > MAX_FOLLOW_EVENT_GAPS:
+            # Oldest first (insertion order)
+            del self._gaps[next(iter(self._gaps))]
+
+    @staticmethod
+    def _flip(user_id: int, other_id: int, undo: Dict[int, Set[int]], do: Dict[int, Set[int]]) -> int:
+        # Cancel a pending opposite change if there is one, otherwise record this one
+        # :return: The change in overlay entries (-1 or 1)
+        pending = undo.get(user_id)
+        if pending is not None and other_id in pending:
+            pending.discard(other_id)
+            if not pending:
+                del undo[user_id]
+            return -1
+        do.setdefault(user_id, set()).add(other_id)
+        return 1
+
+    # Reads
+
+    def is_following(self, follower_id: int, followed_id: int) -> bool:
+        with self._lock:
+            return self._has_edge(follower_id, followed_id)
+
+    def following(self, user_id: int) -> np.ndarray:
+        """
+        Sorted ids of the users `user_id` follows.
+        """
+        snapshot = self._require()
+        with self._lock:
+            return self._run(snapshot.out_offsets, snapshot.out_ids, user_id, self._added_out, self._removed_out)
+
+    def followers(self, user_id: int) -> np.ndarray:
+        """
+        Sorted ids of the users following `user_id`.
+        """
+        snapshot = self._require()
+        with self._lock:
+            return self._run(snapshot.in_offsets, snapshot.in_ids, user_id, self._added_in, self._removed_in)
+
+    def following_count(self, user_id: int) -> int:
+        snapshot = self._require()
+        with self._lock:
+            return self._degree(snapshot.out_offsets, user_id, self._added_out, self._removed_out)
+
+    def followers_count(self, user_id: int) -> int:
+        snapshot = self._require()
+        with self._lock:
+            return self._degree(snapshot.in_offsets, user_id, self._added_in, self._removed_in)
+
+    def follows_many(self, follower_id: int, followed_ids: Iterable[int]) -> np.ndarray:
+        """
+        Boolean mask of which of `followed_ids` the user follows.
+        """
+        return _contains(self.following(follower_id), np.fromiter(followed_ids, dtype=np.int32))
+
+    def mutuals(self, user_id: int) -> np.ndarray:
+        """
+        Sorted ids of the users who follow `user_id` and are followed back.
+        """
+        return np.intersect1d(self.following(user_id), self.followers(user_id), assume_unique=True)
+
+    def common_following(self, user_id: int, other_id: int) -> np.ndarray:
+        """
+        Sorted ids of the users both `user_id` and `other_id` follow.
+        """
+        return np.intersect1d(self.following(user_id), self.following(other_id), assume_unique=True)
+
+    def suggestions(self, user_id: int, limit: int = 20, max_sources: int = SUGGESTION_SOURCES) -> List[Tuple[int, int]]:
+        """
+        Friends of friends: accounts followed by the accounts `user_id` follows,
+        ranked by how many of them follow it, then by follower count. Someone who
+        follows nobody gets the most-followed accounts.
+        :return: `(user_id, followed_by_count)` pairs, best first.
+        """
+        snapshot = self._require()
+        followed = self.following(user_id)
+
+        sources = followed
+        if len(sources) > max_sources:
+            # Deterministic per user, so repeated calls agree
+            sources = np.random.default_rng(user_id).choice(sources, max_sources, replace=False)
+        with self._lock:
+            changed = set(self._added_out) | set(self._removed_out)
+        in_overlay = np.fromiter((source in changed for source in sources.tolist()), dtype=bool, count=len(sources))
+        plain = sources[~in_overlay & (sources < snapshot.size)]
+        candidates = [_gather(snapshot.out_offsets, snapshot.out_ids, plain)]
+        candidates.extend(self.following(int(source)) for source in sources[in_overlay])
+        candidates = np.concatenate(candidates)
+
+        if candidates.size:
+            candidates = candidates[(candidates != user_id) & ~_contains(followed, candidates)]
+            ids, counts = np.unique(candidates, return_counts=True)
+        else:
+            ids = snapshot.popular[(snapshot.popular != user_id) & ~_contains(followed, snapshot.popular)][:limit]
+            counts = np.zeros(len(ids), dtype=np.int64)
+        if not ids.size:
+            return []
+
+        in_degree = np.zeros(len(ids), dtype=np.int64)
+        known = ids < snapshot.size
+        in_degree[known] = snapshot.in_offsets[ids[known] + 1] - snapshot.in_offsets[ids[known]]
+        k = min(limit, len(ids))
+        score = counts.astype(np.int64) * (int(in_degree.max()) + 1) + in_degree
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return list(zip(ids[top].tolist(), counts[top].tolist()))
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "users": snapshot.size if snapshot else 0,
+            "edges": snapshot.edges if snapshot else 0,
+            "overlay": self._overlay_size,
+            "event_cursor": self.event_cursor,
+            "event_gaps": len(self._gaps),
+        }
+
+    # Internals (callers hold the lock)
+
+    def _require(self) -> GraphSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Follow graph has not been loaded")
+        return snapshot
+
+    def _has_edge(self, follower_id: int, followed_id: int) -> bool:
+        if followed_id in self._added_out.get(follower_id, ()):
+            return True
+        if followed_id in self._removed_out.get(follower_id, ()):
+            return False
+        snapshot = self._require()
+        if follower_id >= snapshot.size:
+            return False
+        start, end = snapshot.out_offsets[follower_id], snapshot.out_offsets[follower_id + 1]
+        run = snapshot.out_ids[start:end]
+        position = int(np.searchsorted(run, followed_id))
+        return position < len(run) and bool(run[position] == followed_id)
+
+    @staticmethod
+    def _run(offsets, ids, user_id, added, removed) -> np.ndarray:
+        size = len(offsets) - 1
+        run = ids[offsets[user_id]:offsets[user_id + 1]] if user_id < size else _EMPTY
+        if user_id in removed:
+            run = run[~_contains(np.fromiter(sorted(removed[user_id]), dtype=np.int32), run)]
+        if user_id in added:
+            run = np.union1d(run, np.fromiter(added[user_id], dtype=np.int32)).astype(np.int32)
+        return run
+
+    @staticmethod
+    def _degree(offsets, user_id, added, removed) -> int:
+        size = len(offsets) - 1
+        base = int(offsets[user_id + 1] - offsets[user_id]) if user_id < size else 0
+        return base + len(added.get(user_id, ())) - len(removed.get(user_id, ()))
+
+
+follow_graph = FollowGraph()
+
+
+def record_follow_events(db: Session, follower_id: int, followed_ids: Iterable[int], following: bool) -> None:
+    """
+    Log follows (or unfollows) for other workers' graphs, in the caller's transaction.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"follower_id": follower_id, "followed_id": followed_id, "following": following, "created_at": now}
+        for followed_id in followed_ids
+    ]
+    if rows:
+        db.execute(insert(FollowEvent), rows)
+
+
+def load_follow_graph(db: Session, graph: FollowGraph = follow_graph) -> GraphSnapshot:
+    """
+    Rebuild the graph's arrays from the `followers` table, then catch up on the event log.
+    """
+    # Read the cursor first: events committed while the edges stream in are replayed after
+    cursor = db.execute(select(func.coalesce(func.max(FollowEvent.id), 0))).scalar()
+    result = db.execute(
+        select(followers.c.follower_id, followers.c.followed_id).execution_options(yield_per=FOLLOW_GRAPH_LOAD_BATCH)
+    )
+    chunks = [
+        np.fromiter(itertools.chain.from_iterable(partition), dtype=np.int32, count=2 * len(partition)).reshape(-1, 2)
+        for partition in result.partitions()
+    ]
+    edges = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int32)
+    snapshot = graph.replace(edges[:, 0], edges[:, 1], cursor)
+
+    # Ids just below the cursor that were not visible yet may belong to
+    # transactions still in flight, whose edges the load may have missed
+    low = max(cursor - FOLLOW_EVENT_LOAD_WINDOW, 0)
+    visible = set(db.execute(select(FollowEvent.id).where(FollowEvent.id > low, FollowEvent.id <= cursor)).scalars())
+    graph.note_gaps(event_id for event_id in range(low + 1, cursor + 1) if event_id not in visible)
+
+    apply_follow_events(db, graph)
+    return snapshot
+
+
+def apply_follow_events(db: Session, graph: FollowGraph = follow_graph) -> int:
+    """
+    Apply every follow event newer than the graph's cursor, then reconcile the
+    edges of any skipped events that have committed since.
+    :return: The number of events read.
+    """
+    applied = 0
+    while True:
+        rows = db.execute(
+            select(FollowEvent.id, FollowEvent.follower_id, FollowEvent.followed_id, FollowEvent.following)
+            .where(FollowEvent.id > graph.event_cursor)
+            .order_by(FollowEvent.id)
+            .limit(FOLLOW_GRAPH_LOAD_BATCH)
+        ).all()
+        graph.apply_events(rows)
+        applied += len(rows)
+        if len(rows) < FOLLOW_GRAPH_LOAD_BATCH:
+            break
+
+    gaps = graph.open_gaps()
+    if gaps:
+        late = db.execute(
+            select(FollowEvent.id, FollowEvent.follower_id, FollowEvent.followed_id).where(FollowEvent.id.in_(gaps))
+        ).all()
+        if late:
+            applied += len(late)
+            reconcile_edges(db, graph, {(row.follower_id, row.followed_id) for row in late})
+            graph.close_gaps(row.id for row in late)
+    return applied
+
+
+def reconcile_edges(db: Session, graph: FollowGraph, pairs: Set[Tuple[int, int]]) -> None:
+    """
+    Set `(follower_id, followed_id)` edges to what the `followers` table holds now.
+    """
+    pairs = list(pairs)
+    present = set()
+    for start in range(0, len(pairs), FOLLOW_GRAPH_LOAD_BATCH):
+        chunk = pairs[start:start + FOLLOW_GRAPH_LOAD_BATCH]
+        present.update(
+            (row.follower_id, row.followed_id)
+            for row in db.execute(
+                select(followers.c.follower_id, followers.c.followed_id)
+                .where(tuple_(followers.c.follower_id, followers.c.followed_id).in_(chunk))
+            )
+        )
+    for follower_id, followed_id in pairs:
+        graph.set_edge(follower_id, followed_id, (follower_id, followed_id) in present)
+
+
+def prune_follow_events(db: Session, retention: float = FOLLOW_EVENT_RETENTION) -> int:
+    """
+    Delete events older than `retention` seconds. The caller must commit.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    return db.execute(delete(FollowEvent).where(FollowEvent.created_at < cutoff)).rowcount
+
+
+def rebuild_follow_graph(graph: FollowGraph = follow_graph) -> GraphSnapshot:
+    """
+    Reload the graph and prune old events with a session of its own. Blocking:
+    run it in a worker thread, never on the event loop.
+    """
+    with SessionLocal() as db:
+        snapshot = load_follow_graph(db, graph)
+        prune_follow_events(db)
+        db.commit()
+    return snapshot
+
+
+async def sync_follow_graph(graph: FollowGraph = follow_graph) -> None:
+    """
+    Apply new follow events, or rebuild the arrays when they are due or the overlay is large.
+    """
+    rebuild = (
+        not graph.ready
+        or graph.overlay_size > FOLLOW_GRAPH_COMPACT_THRESHOLD
+        or time.monotonic() - graph.loaded_at > FOLLOW_GRAPH_RELOAD_INTERVAL
+    )
+    if not rebuild:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(apply_follow_events, graph)
+        return
+    started = time.perf_counter()
+    # Streaming every edge and sorting them takes seconds on a large graph; requests keep being served meanwhile
+    snapshot = await run_in_threadpool(rebuild_follow_graph, graph)
+    logger.info(
+        "Loaded follow graph: %d users, %d edges in %.2fs", snapshot.size, snapshot.edges, time.perf_counter() - started,
+    )
+
+
+async def run_follow_graph_sync(interval: float = FOLLOW_GRAPH_SYNC_INTERVAL) -> None:
+    """
+    Background task that loads the follow graph at startup and keeps it in step every `interval` seconds.
+    """
+    try:
+        await sync_follow_graph()
+    except Exception:
+        logger.exception("Error loading follow graph")
+    await run_periodically(sync_follow_graph, interval, "follow graph sync")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -8,8 +9,23 @@ followers = Table(
     Base.metadata,
     Column("follower_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
     Column("followed_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    # Lookups by the followed side (follower lists, timeline fan-out)
+    Index("ix_followers_followed_id", "followed_id"),
 )
 
+class FollowEvent(Base):
+    """
+    Append-only log of follows and unfollows, tailed by each worker's in-memory
+    follow graph (see app.auth.graph) and pruned after a retention period.
+    """
+    __tablename__ = "follow_events"
+
+    id = Column(Integer, primary_key=True)
+    follower_id = Column(Integer, nullable=False)
+    followed_id = Column(Integer, nullable=False)
+    following = Column(Boolean, nullable=False)  # False for an unfollow
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -1,67 +1,238 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.auth.models import User
-from app.auth.schemas import UserCreate, UserLogin  # Import schemas
-from app.auth.utils import create_token, verify_password  # Import utilities
+from app.database import get_async_db
+from app.auth.models import User, followers
+from app.auth.schemas import UserCreate, UserLogin, FollowBatch  # Import schemas
+from app.auth.utils import create_token, hash_password_async, verify_and_update_password  # Import utilities
 from app.auth.dependencies import get_current_user  # Import get_current_user dependency
+from app.auth.graph import follow_graph, record_follow_events
+from app.loaders import Loaders, batch_ids, get_loaders
+from app.timeline.service import backfill_inbox, prune_inbox
+from app.profile.models import UserStats
+from app.profile.stats import bump_stats
 
 router = APIRouter()
 
 @router.post("/register")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    if existing_user:
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User.id).where(User.email == user.email))
+    if result.first():
         raise HTTPException(status_code=400, detail="Email is already registered")
 
-    hashed_password = verify_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     new_user = User(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
+    db.add(UserStats(user_id=new_user.id))
+    await db.commit()
 
     token = create_token({"sub": new_user.id})
     return {"message": "User registered successfully", "token": token}
 
 @router.post("/login")
-def login_user(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login_user(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    valid, new_hash = await verify_and_update_password(user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # The bcrypt cost changed since this hash was made; store an upgraded one
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     token = create_token({"sub": db_user.id})
     return {"message": "Login successful", "token": token}
 
+# Most accounts one batch follow or unfollow may name
+FOLLOW_BATCH_LIMIT = 100
+
+def _insert_ignoring_duplicates(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Follow writes are not supported on {dialect}")
+    return insert(followers)
+
+def follow_users(db: Session, follower_id: int, followed_ids: List[int]) -> List[int]:
+    """
+    Follow several users in one statement, skipping those already followed, and
+    update inboxes, counters and the follow event log to match.
+    :return: The ids newly followed. The caller must commit.
+    """
+    if not followed_ids:
+        return []
+    stmt = (
+        _insert_ignoring_duplicates(db)
+        .values([{"follower_id": follower_id, "followed_id": followed_id} for followed_id in followed_ids])
+        .on_conflict_do_nothing(index_elements=["follower_id", "followed_id"])
+        .returning(followers.c.followed_id)
+    )
+    created = list(db.execute(stmt).scalars())
+    for followed_id in created:
+        backfill_inbox(db, follower_id, followed_id)
+        bump_stats(db, followed_id, followers_count=1)
+    bump_stats(db, follower_id, following_count=len(created))
+    record_follow_events(db, follower_id, created, following=True)
+    return created
+
+def unfollow_users(db: Session, follower_id: int, followed_ids: List[int]) -> List[int]:
+    """
+    Unfollow several users in one statement, skipping those not followed.
+    :return: The ids unfollowed. The caller must commit.
+    """
+    if not followed_ids:
+        return []
+    removed = list(
+        db.execute(
+            delete(followers)
+            .where(followers.c.follower_id == follower_id, followers.c.followed_id.in_(followed_ids))
+            .returning(followers.c.followed_id)
+        ).scalars()
+    )
+    for followed_id in removed:
+        prune_inbox(db, follower_id, followed_id)
+        bump_stats(db, followed_id, followers_count=-1)
+    bump_stats(db, follower_id, following_count=-len(removed))
+    record_follow_events(db, follower_id, removed, following=False)
+    return removed
+
+async def _is_following(db: AsyncSession, follower_id: int, followed_id: int) -> bool:
+    """
+    Check a single edge of the follow graph, in memory once the graph is loaded.
+    """
+    if follow_graph.ready:
+        return follow_graph.is_following(follower_id, followed_id)
+    result = await db.execute(
+        select(followers.c.follower_id).where(
+            followers.c.follower_id == follower_id,
+            followers.c.followed_id == followed_id,
+        )
+    )
+    return result.first() is not None
+
+async def _existing_user_ids(db: AsyncSession, user_ids: List[int], exclude: int) -> List[int]:
+    if len(user_ids) > FOLLOW_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {FOLLOW_BATCH_LIMIT} users per batch")
+    wanted = sorted(set(user_ids) - {exclude})
+    if not wanted:
+        return []
+    return list((await db.execute(select(User.id).where(User.id.in_(wanted)).order_by(User.id))).scalars())
+
+def _graph_or_503():
+    if not follow_graph.ready:
+        raise HTTPException(status_code=503, detail="Follow graph is loading, try again shortly")
+    return follow_graph
+
+# The database arbitrates follows (a duplicate insert or a missing row is skipped),
+# so the in-memory graph, which may lag other workers by a sync, is only updated after the commit.
+
+@router.post("/follow/batch")
+async def follow_batch(batch: FollowBatch, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    user_ids = await _existing_user_ids(db, batch.user_ids, exclude=current_user.id)
+    followed = await db.run_sync(follow_users, current_user.id, user_ids)
+    await db.commit()
+    follow_graph.add_many(current_user.id, followed)
+    return {"followed": followed, "skipped": sorted(set(batch.user_ids) - set(followed))}
+
+@router.post("/unfollow/batch")
+async def unfollow_batch(batch: FollowBatch, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    user_ids = await _existing_user_ids(db, batch.user_ids, exclude=current_user.id)
+    unfollowed = await db.run_sync(unfollow_users, current_user.id, user_ids)
+    await db.commit()
+    follow_graph.remove_many(current_user.id, unfollowed)
+    return {"unfollowed": unfollowed, "skipped": sorted(set(batch.user_ids) - set(unfollowed))}
+
 @router.post("/follow/{user_id}")
-async def follow_user(user_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    user_to_follow = db.query(User).filter(User.id == user_id).first()
+async def follow_user(user_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    user_to_follow = await db.get(User, user_id)
     if not user_to_follow:
         raise HTTPException(status_code=404, detail="User not found")
     if user_to_follow.id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot follow yourself")
 
-    if user_to_follow in current_user.following:
+    if not await db.run_sync(follow_users, current_user.id, [user_to_follow.id]):
         raise HTTPException(status_code=400, detail="Already following this user")
-
-    current_user.following.append(user_to_follow)
-    db.commit()
+    await db.commit()
+    follow_graph.add(current_user.id, user_to_follow.id)
     return {"message": f"Started following {user_to_follow.username}"}
 
 @router.post("/unfollow/{user_id}")
-async def unfollow_user(user_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    user_to_unfollow = db.query(User).filter(User.id == user_id).first()
+async def unfollow_user(user_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    user_to_unfollow = await db.get(User, user_id)
     if not user_to_unfollow:
         raise HTTPException(status_code=404, detail="User not found")
     if user_to_unfollow.id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot unfollow yourself")
 
-    if user_to_unfollow not in current_user.following:
+    if not await db.run_sync(unfollow_users, current_user.id, [user_to_unfollow.id]):
         raise HTTPException(status_code=400, detail="Not following this user")
-
-    current_user.following.remove(user_to_unfollow)
-    db.commit()
+    await db.commit()
+    follow_graph.remove(current_user.id, user_to_unfollow.id)
     return {"message": f"Stopped following {user_to_unfollow.username}"}
+
+@router.get("/users/batch")
+async def get_users_batch(ids: List[int] = Depends(batch_ids), loaders: Loaders = Depends(get_loaders)):
+    """
+    Public profile summaries of several users (`?ids=1,2,3`) in the order given;
+    ids that do not exist are listed in `missing`.
+    """
+    users = await loaders.users.load_many(ids)
+    return {
+        "users": [user for user in users if user is not None],
+        "missing": [user_id for user_id, user in zip(ids, users) if user is None],
+    }
+
+@router.get("/relationship/{user_id}")
+async def relationship(user_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
+    """
+    Whether the current user follows `user_id`, is followed by them, or both.
+    """
+    following = await _is_following(db, current_user.id, user_id)
+    followed_by = await _is_following(db, user_id, current_user.id)
+    return {"following": following, "followed_by": followed_by, "mutual": following and followed_by}
+
+@router.get("/mutuals")
+async def mutual_follows(
+    limit: int = Query(50, ge=1, le=200),
+    loaders: Loaders = Depends(get_loaders),
+    current_user=Depends(get_current_user),
+):
+    """
+    Users the current user follows who follow them back.
+    """
+    graph = _graph_or_503()
+    mutual_ids = graph.mutuals(current_user.id)
+    users = await loaders.users.load_many(mutual_ids[:limit].tolist())
+    return {"total": len(mutual_ids), "users": [user for user in users if user is not None]}
+
+@router.get("/suggestions")
+async def follow_suggestions(
+    limit: int = Query(20, ge=1, le=100),
+    loaders: Loaders = Depends(get_loaders),
+    current_user=Depends(get_current_user),
+):
+    """
+    Who to follow: accounts followed by the accounts the current user follows.
+    """
+    graph = _graph_or_503()
+    suggested = graph.suggestions(current_user.id, limit=limit)
+    users = await loaders.users.load_many([uid for uid, _ in suggested])
+    return [
+        {**user, "followed_by_following": count}
+        for user, (_, count) in zip(users, suggested)
+        if user is not None
+    ]
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, EmailStr
 
 class UserCreate(BaseModel):
@@ -8,3 +9,6 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+
+class FollowBatch(BaseModel):
+    user_ids: List[int]
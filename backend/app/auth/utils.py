@@ -1,11 +1,17 @@
+import asyncio
 import jwt
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from jwt import PyJWTError
 from fastapi import HTTPException
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 import os
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from the .env file
 load_dotenv()
 
@@ -15,7 +21,55 @@ if SECRET_KEY == "default-secret-key":
     raise RuntimeError("SECRET_KEY is not set. Define it in the .env file.")
 
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt cost factor. Pinning min/max to it makes existing hashes with any other
+# cost "need update", so they are transparently rehashed on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Size of the password hashing pool and how many calls may wait for it
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt off the event loop on a fixed number of threads.
+    bcrypt releases the GIL while it works, so threads hash in parallel without
+    the pickling and start-up cost of a process pool. When more than
+    `max_pending` calls are running or queued, new calls are rejected with 503
+    straight away instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        # Only touched from the event loop thread, so no lock is needed
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+
+password_hash_pool = PasswordHashPool()
 
 def hash_password(plain_password: str) -> str:
     """
@@ -34,6 +88,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(plain_password: str) -> str:
+    """
+    Hash a password on the password hashing pool.
+    :raises HTTPException: 503 if the pool is saturated.
+    """
+    return await password_hash_pool.run(hash_password, plain_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the password hashing pool.
+    :return: Whether it matched, and a replacement hash if the stored one uses an
+             outdated cost or scheme (None otherwise).
+    :raises HTTPException: 503 if the pool is saturated.
+    """
+    return await password_hash_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def decode_token(token: str) -> dict:
     """
     Decode a JWT token and return its payload.
@@ -60,6 +130,6 @@ def create_token(data: dict, expires_delta: timedelta = timedelta(hours=1)) -> s
         })
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
-    except Exception as e:
-        print(f"Error creating token: {e}")  # Debug: Remove in production
+    except Exception:
+        logger.exception("Error creating token")
         raise HTTPException(status_code=500, detail="Failed to create token")
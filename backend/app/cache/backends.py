@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+# Upper bound on entries held by the in-memory backend
+MEMORY_CACHE_MAX_ENTRIES = 10000
+
+
+class MemoryBackend:
+    """
+    Process-local cache store: a bounded LRU of byte values with per-entry expiry.
+    Invalidations are only seen by this process, so run a shared backend when
+    serving from several workers.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._get(key)
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._entries.get(key, (None, b"0"))
+            value = int(value) + 1
+            self._entries[key] = (None, str(value).encode())
+            self._entries.move_to_end(key)
+            return value
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+
+class RedisBackend:
+    """
+    Cache store shared by all workers, on Redis or any server speaking its protocol.
+    Requires the `redis` package.
+    """
+
+    def __init__(self, url: str, prefix: str = "bytetok:"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis_asyncio.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget([self.prefix + key for key in keys])
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        px = max(int(ttl * 1000), 1) if ttl else None
+        await self.client.set(self.prefix + key, value, px=px)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+def create_backend(url: Optional[str]):
+    """
+    Build the backend named by a cache URL: `memory://` (or nothing) for the
+    in-process store, `redis://` / `rediss://` / `unix://` for a Redis-compatible server.
+    """
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache URL: {url}")
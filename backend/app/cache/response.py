@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+from fastapi import Request
+from starlette.responses import Response
+from app.cache.backends import create_backend
+from app.responses import dumps
+from app.utils import etag_matches
+
+# Where cached responses live (memory:// or a redis:// URL) and their default lifetime (seconds).
+# Invalidation bumps a generation key in this store, so it reaches every worker
+# sharing it; with memory:// each worker has its own store and only sees its own.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+
+# Tags naming what a cached response was built from; bumping one invalidates those responses
+VIDEOS_TAG = "videos"
+STREAMS_TAG = "streams"
+
+# Responses are revalidated on every use, cheaply thanks to the ETag
+CACHE_CONTROL = "no-cache"
+
+
+class ResponseCache:
+    """
+    Caches serialized JSON responses keyed by route and query string.
+
+    Every key embeds the current generation of its tags, so `invalidate(tag)`
+    retires all dependent responses with one counter bump (stale entries then
+    age out on their TTL). Concurrent misses for the same key share a single
+    fill, so a cold key costs one query no matter how many requests arrive.
+    """
+
+    def __init__(self, backend=None, default_ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend if backend is not None else create_backend(CACHE_URL)
+        self.default_ttl = default_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def respond(
+        self,
+        request: Request,
+        build: Callable[[], Awaitable[Any]],
+        tags: Sequence[str] = (),
+        ttl: Optional[float] = None,
+    ) -> Response:
+        """
+        Serve the cached response for this request, calling `build` to produce
+        the JSON content on a miss. Answers 304 when If-None-Match matches.
+        """
+        key = await self._key(request, tags)
+        etag, body = await self._get_or_fill(key, build, self.default_ttl if ttl is None else ttl)
+
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *tags: str) -> None:
+        """
+        Retire every cached response built from any of `tags`.
+        """
+        for tag in tags:
+            await self.backend.incr(f"gen:{tag}")
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+    async def _key(self, request: Request, tags: Sequence[str]) -> str:
+        tags = sorted(tags)
+        generations = await self.backend.get_many([f"gen:{tag}" for tag in tags])
+        versions = ",".join(f"{tag}={int(gen or 0)}" for tag, gen in zip(tags, generations))
+        query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+        return f"resp:{versions}:{request.url.path}?{query}"
+
+    async def _get_or_fill(self, key: str, build: Callable[[], Awaitable[Any]], ttl: float):
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            etag, _, body = cached.partition(b"\n")
+            return etag.decode(), body
+
+        # Single flight: later misses wait for the fill already in progress
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = dumps(await build())
+            etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+            await self.backend.set(key, etag.encode() + b"\n" + body, ttl)
+            future.set_result((etag, body))
+            return etag, body
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting; mark the exception retrieved to keep the loop quiet
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+response_cache = ResponseCache()
@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,9 +10,85 @@ load_dotenv()
 Base = declarative_base()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+
+
+def _enable_sqlite_foreign_keys(engine) -> None:
+    """
+    SQLite ignores foreign keys, including their ON DELETE CASCADE, unless each
+    connection turns them on; the schema relies on them as it does on PostgreSQL.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+# Synchronous engine, used by maintenance scripts and background jobs
+engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+_enable_sqlite_foreign_keys(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Pool sizing and timeouts for the async engine used by the request handlers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+
+def _async_database_url(url: str) -> str:
+    """
+    Derive the async driver URL (asyncpg / aiosqlite) from DATABASE_URL,
+    unless ASYNC_DATABASE_URL is set explicitly.
+    """
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+
+    parsed = make_url(url)
+    if parsed.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    elif parsed.drivername in ("sqlite", "sqlite+pysqlite"):
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _create_async_engine(url: str):
+    """
+    Build the async engine with explicit pool sizing, pre-ping and timeouts.
+    """
+    if url.startswith("sqlite"):
+        # SQLite has no server-side pool or statement timeout; just wait on locks
+        return create_async_engine(url, pool_pre_ping=True, connect_args={"timeout": DB_POOL_TIMEOUT})
+
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={
+            "timeout": DB_CONNECT_TIMEOUT,
+            "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+        },
+    )
+
+
+async_engine = _create_async_engine(_async_database_url(DATABASE_URL))
+_enable_sqlite_foreign_keys(async_engine.sync_engine)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 def get_db():
     from sqlalchemy.orm import Session
     db = SessionLocal()
@@ -18,3 +96,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    Yield an AsyncSession whose queries await the database instead of blocking the event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,366 @@
+import asyncio
+import contextvars
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.gifts.models import GiftLedgerEntry, GiftSettlement, CreatorBalance
+from app.utils import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# Gift prices in coins
+GIFT_CATALOG = {
+    "rose": 1,
+    "heart": 5,
+    "finger_heart": 10,
+    "perfume": 20,
+    "galaxy": 1000,
+    "lion": 29999,
+}
+
+# The creator's share of each gift, in percent; the rest goes to the platform
+GIFT_CREATOR_SHARE_PERCENT = int(os.getenv("GIFT_CREATOR_SHARE_PERCENT", "75"))
+
+# Group commit: gifts arriving within GIFT_COMMIT_WINDOW seconds share one insert, up to GIFT_COMMIT_BATCH
+GIFT_COMMIT_WINDOW = float(os.getenv("GIFT_COMMIT_WINDOW", "0.005"))
+GIFT_COMMIT_BATCH = int(os.getenv("GIFT_COMMIT_BATCH", "500"))
+
+# Seconds between settlement runs, and how many entries one settlement claims
+GIFT_SETTLEMENT_INTERVAL = float(os.getenv("GIFT_SETTLEMENT_INTERVAL", "30"))
+GIFT_SETTLEMENT_BATCH = int(os.getenv("GIFT_SETTLEMENT_BATCH", "10000"))
+
+_ENTRY_COLUMNS = (
+    GiftLedgerEntry.id,
+    GiftLedgerEntry.idempotency_key,
+    GiftLedgerEntry.sender_id,
+    GiftLedgerEntry.recipient_id,
+    GiftLedgerEntry.stream_id,
+    GiftLedgerEntry.gift,
+    GiftLedgerEntry.amount,
+    GiftLedgerEntry.created_at,
+)
+
+
+def split_amount(gross: int, creator_percent: int = GIFT_CREATOR_SHARE_PERCENT) -> Tuple[int, int]:
+    """
+    Split a gross amount into (creator, platform) shares; rounding favours the platform.
+    """
+    creator = gross * creator_percent // 100
+    return creator, gross - creator
+
+
+def _insert_ignoring_duplicates(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Gift ledger writes are not supported on {dialect}")
+    return insert(model)
+
+
+def insert_gift_entries(db: Session, rows: List[dict]) -> List[Tuple[dict, bool]]:
+    """
+    Append entries in one multi-row INSERT, skipping idempotency keys already recorded.
+    :return: For each row, the stored entry and whether this call created it. The caller must commit.
+    """
+    stmt = (
+        _insert_ignoring_duplicates(db, GiftLedgerEntry)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+        .returning(GiftLedgerEntry.idempotency_key)
+    )
+    inserted = set(db.execute(stmt).scalars())
+
+    keys = [row["idempotency_key"] for row in rows]
+    stored = {
+        row.idempotency_key: dict(row._mapping)
+        for row in db.execute(select(*_ENTRY_COLUMNS).where(GiftLedgerEntry.idempotency_key.in_(keys)))
+    }
+
+    results = []
+    for key in keys:
+        entry = stored[key]
+        # A key repeated within one batch is created once; the rest are replays
+        created = key in inserted
+        inserted.discard(key)
+        results.append((entry, created))
+    return results
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """
+    Whether a write failed because of the database rather than a row in it
+    (retrying smaller batches would only fail again).
+    """
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class GiftLedgerWriter:
+    """
+    Group-commits gift entries: concurrent requests are queued and written together
+    in one INSERT and one transaction, so thousands of gifts a second cost a few
+    commits rather than one each, and no request touches a balance row.
+    """
+
+    def __init__(self, window: float = GIFT_COMMIT_WINDOW, batch_size: int = GIFT_COMMIT_BATCH, session_factory=AsyncSessionLocal):
+        self.window = window
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+
+    async def start(self) -> None:
+        """
+        Start the writer task. Called at app startup; `submit` also starts it on first use.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            # In a fresh context, not that of whichever request happens to start it: the batches it
+            # writes belong to many requests, so must not carry one's request id or query accounting
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def close(self) -> None:
+        """
+        Write out everything already queued, then stop.
+        """
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def submit(self, row: dict) -> Tuple[dict, bool]:
+        """
+        Queue one entry and wait until the batch containing it is committed.
+        :return: The stored entry and whether it was newly created (False on an idempotent replay).
+        """
+        await self.start()
+        row = {**row, "created_at": row.get("created_at") or datetime.utcnow()}
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        """
+        Write a batch and resolve its futures. When a row makes the batch fail,
+        the batch is retried in halves, so only the offending row's request fails.
+        """
+        try:
+            results = await self._write([row for row, _ in batch])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if len(batch) > 1 and not _is_connection_error(e):
+                logger.warning("Gift ledger batch of %d failed (%s), retrying it in halves", len(batch), type(e).__name__)
+                middle = len(batch) // 2
+                await self._commit(batch[:middle])
+                await self._commit(batch[middle:])
+                return
+            logger.exception("Error writing gift ledger batch")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _write(self, rows: List[dict]) -> List[Tuple[dict, bool]]:
+        async with self.session_factory() as db:
+            results = await db.run_sync(insert_gift_entries, rows)
+            await db.commit()
+        self.batches += 1
+        return results
+
+
+gift_ledger_writer = GiftLedgerWriter()
+
+
+def settle_gifts(db: Session, batch_size: int = GIFT_SETTLEMENT_BATCH) -> Optional[GiftSettlement]:
+    """
+    Claim up to `batch_size` unsettled entries and roll them up into creator
+    balances, taking each balance row lock once per settlement instead of once per gift.
+    :return: The settlement, or None if nothing was pending. The caller must commit.
+    """
+    claimed = db.execute(
+        select(GiftLedgerEntry.id)
+        .where(GiftLedgerEntry.settlement_id.is_(None))
+        .order_by(GiftLedgerEntry.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not claimed:
+        return None
+
+    settlement = GiftSettlement(entry_count=0, gross_amount=0, creator_amount=0, platform_amount=0)
+    db.add(settlement)
+    db.flush()
+    db.execute(
+        update(GiftLedgerEntry)
+        .where(GiftLedgerEntry.id.in_(claimed))
+        .values(settlement_id=settlement.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    per_recipient = db.execute(
+        select(GiftLedgerEntry.recipient_id, func.sum(GiftLedgerEntry.amount), func.count())
+        .where(GiftLedgerEntry.settlement_id == settlement.id)
+        .group_by(GiftLedgerEntry.recipient_id)
+    ).all()
+    recipient_ids = [recipient_id for recipient_id, _, _ in per_recipient]
+    # Create missing balances up front; a concurrent settlement creating the same one is skipped, not an error
+    db.execute(
+        _insert_ignoring_duplicates(db, CreatorBalance)
+        .values([{"user_id": recipient_id, "earned_amount": 0, "gift_count": 0} for recipient_id in recipient_ids])
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+    balances = {
+        row.user_id: row
+        for row in db.query(CreatorBalance)
+        .filter(CreatorBalance.user_id.in_(recipient_ids))
+        .with_for_update()
+        .all()
+    }
+
+    for recipient_id, gross, count in per_recipient:
+        creator, platform = split_amount(int(gross))
+        balance = balances[recipient_id]
+        balance.earned_amount += creator
+        balance.gift_count += count
+        settlement.entry_count += count
+        settlement.gross_amount += int(gross)
+        settlement.creator_amount += creator
+        settlement.platform_amount += platform
+    db.flush()
+    return settlement
+
+
+def platform_balance(db: Session) -> int:
+    """
+    The platform's settled share of all gifts.
+    """
+    return int(db.scalar(select(func.coalesce(func.sum(GiftSettlement.platform_amount), 0))))
+
+
+def reconcile_gift_ledger(db: Session) -> List[str]:
+    """
+    Check settlements and creator balances against the ledger they were derived from.
+    :return: A description of each discrepancy found (empty when everything matches).
+    """
+    problems = []
+    per_settlement: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    expected_balances: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    rows = db.execute(
+        select(
+            GiftLedgerEntry.settlement_id,
+            GiftLedgerEntry.recipient_id,
+            func.sum(GiftLedgerEntry.amount),
+            func.count(),
+        )
+        .where(GiftLedgerEntry.settlement_id.is_not(None))
+        .group_by(GiftLedgerEntry.settlement_id, GiftLedgerEntry.recipient_id)
+    ).all()
+    for settlement_id, recipient_id, gross, count in rows:
+        per_settlement[settlement_id][0] += int(gross)
+        per_settlement[settlement_id][1] += count
+        # Settlement splits each creator's total per run, so recompute it the same way
+        expected_balances[recipient_id][0] += split_amount(int(gross))[0]
+        expected_balances[recipient_id][1] += count
+
+    for settlement in db.query(GiftSettlement).all():
+        gross, count = per_settlement.pop(settlement.id, (0, 0))
+        if (settlement.gross_amount, settlement.entry_count) != (gross, count):
+            problems.append(
+                f"settlement {settlement.id}: recorded {settlement.gross_amount} over {settlement.entry_count} "
+                f"entries, ledger has {gross} over {count}"
+            )
+        if settlement.creator_amount + settlement.platform_amount != settlement.gross_amount:
+            problems.append(f"settlement {settlement.id}: shares do not add up to the gross amount")
+    for settlement_id in per_settlement:
+        problems.append(f"settlement {settlement_id}: referenced by ledger entries but missing")
+
+    for balance in db.query(CreatorBalance).all():
+        earned, count = expected_balances.pop(balance.user_id, (0, 0))
+        if (balance.earned_amount, balance.gift_count) != (earned, count):
+            problems.append(
+                f"creator {balance.user_id}: balance {balance.earned_amount} from {balance.gift_count} gifts, "
+                f"ledger implies {earned} from {count}"
+            )
+    for user_id, (earned, count) in expected_balances.items():
+        problems.append(f"creator {user_id}: no balance row, ledger implies {earned} from {count} gifts")
+    return problems
+
+
+async def settle_pending_gifts() -> int:
+    """
+    Settle everything pending, committing one settlement at a time.
+    :return: The number of entries settled.
+    """
+    settled = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            settlement = await db.run_sync(settle_gifts)
+            if settlement is None:
+                return settled
+            settled += settlement.entry_count
+            await db.commit()
+
+
+async def run_gift_settlement(interval: float = GIFT_SETTLEMENT_INTERVAL) -> None:
+    """
+    Background task that settles pending gifts every `interval` seconds.
+    """
+    await run_periodically(settle_pending_gifts, interval, "gift settlement")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from app.database import SessionLocal
+    import app.models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Gift ledger maintenance")
+    parser.add_argument("action", choices=["settle", "reconcile"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.action == "settle":
+            settled = 0
+            while (settlement := settle_gifts(db)) is not None:
+                settled += settlement.entry_count
+                db.commit()
+            print(f"Settled {settled} gift ledger entries")
+        else:
+            problems = reconcile_gift_ledger(db)
+            for problem in problems:
+                print(problem)
+            print(f"Gift ledger reconciliation: {len(problems)} discrepancies")
+            sys.exit(1 if problems else 0)
+    finally:
+        db.close()
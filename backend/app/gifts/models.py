@@ -0,0 +1,82 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, text
+from datetime import datetime
+from app.database import Base
+
+
+class GiftLedgerEntry(Base):
+    """
+    One gift sent during a live stream. Entries are only ever inserted; settlement
+    stamps `settlement_id` once, and the amounts never change.
+    """
+    __tablename__ = "gift_ledger"
+    __table_args__ = (
+        # Entries still waiting for settlement, oldest first
+        Index(
+            "ix_gift_ledger_unsettled_id",
+            "id",
+            postgresql_where=text("settlement_id IS NULL"),
+            sqlite_where=text("settlement_id IS NULL"),
+        ),
+        Index(
+            "ix_gift_ledger_unsettled_recipient_id",
+            "recipient_id",
+            postgresql_where=text("settlement_id IS NULL"),
+            sqlite_where=text("settlement_id IS NULL"),
+        ),
+        Index("ix_gift_ledger_settlement_id_recipient_id", "settlement_id", "recipient_id"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    idempotency_key = Column(String(64), nullable=False, unique=True)  # Client-chosen, makes retries safe
+    sender_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # The ledger is the record balances and settlements are derived from, so a recipient with
+    # entries cannot be deleted out from under it
+    recipient_id = Column(Integer, ForeignKey("users.id", ondelete="RESTRICT"), nullable=False)
+    stream_id = Column(Integer, ForeignKey("live_streams.id", ondelete="SET NULL"), nullable=True)
+    gift = Column(String(32), nullable=False)
+    amount = Column(Integer, nullable=False)  # Price in coins at the time it was sent
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    settlement_id = Column(Integer, ForeignKey("gift_settlements.id"), nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "sender_id": self.sender_id,
+            "recipient_id": self.recipient_id,
+            "stream_id": self.stream_id,
+            "gift": self.gift,
+            "amount": self.amount,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class GiftSettlement(Base):
+    """
+    One run of the settlement job: which entries it rolled up and how the total was split.
+    """
+    __tablename__ = "gift_settlements"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    entry_count = Column(Integer, nullable=False, default=0)
+    gross_amount = Column(BigInteger, nullable=False, default=0)
+    creator_amount = Column(BigInteger, nullable=False, default=0)
+    platform_amount = Column(BigInteger, nullable=False, default=0)
+
+
+class CreatorBalance(Base):
+    """
+    A creator's settled share of the gifts they received.
+    """
+    __tablename__ = "creator_balances"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    earned_amount = Column(BigInteger, nullable=False, default=0)
+    gift_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "earned": self.earned_amount,
+            "gifts": self.gift_count,
+        }
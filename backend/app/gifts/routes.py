@@ -0,0 +1,93 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.auth.dependencies import get_current_user
+from app.gifts.models import GiftLedgerEntry, CreatorBalance
+from app.gifts.schemas import GiftSend
+from app.gifts.ledger import GIFT_CATALOG, GIFT_CREATOR_SHARE_PERCENT, gift_ledger_writer, split_amount
+from app.live_stream.hub import live_hub
+from app.live_stream.registry import stream_registry
+from app.live_stream.models import LiveStream
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/catalog")
+async def get_gift_catalog():
+    """
+    Available gifts and their prices in coins.
+    """
+    return {"gifts": GIFT_CATALOG, "creator_share_percent": GIFT_CREATOR_SHARE_PERCENT}
+
+
+@router.post("/send")
+async def send_gift(
+    gift_data: GiftSend,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Send a gift to the streamer of an active live stream.
+    Retrying with the same `idempotency_key` returns the original entry instead of charging twice.
+    """
+    amount = GIFT_CATALOG.get(gift_data.gift)
+    if amount is None:
+        raise HTTPException(status_code=400, detail="Unknown gift")
+
+    if stream_registry.loaded:
+        stream = stream_registry.get(gift_data.stream_id)
+    else:
+        stream = await db.get(LiveStream, gift_data.stream_id)
+        stream = stream if stream is not None and stream.is_active else None
+    # The ledger write does not need this session; hand the connection back before queueing
+    await db.close()
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Live stream not found")
+    if stream.streamer_id == current_user.id:
+        raise HTTPException(status_code=400, detail="You cannot send gifts to yourself")
+
+    try:
+        entry, created = await gift_ledger_writer.submit({
+            "idempotency_key": f"{current_user.id}:{gift_data.idempotency_key}",
+            "sender_id": current_user.id,
+            "recipient_id": stream.streamer_id,
+            "stream_id": stream.id,
+            "gift": gift_data.gift,
+            "amount": amount,
+        })
+    except Exception:
+        logger.exception("Error recording gift")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    entry.pop("idempotency_key")
+    if created:
+        await live_hub.publish(stream.id, {
+            "type": "gift",
+            "stream_id": stream.id,
+            "sender_id": current_user.id,
+            "sender_username": current_user.username,
+            "gift": gift_data.gift,
+            "amount": amount,
+        })
+    return {"message": "Gift sent" if created else "Gift already recorded", "entry": entry}
+
+
+@router.get("/balance")
+async def get_creator_balance(
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    The current user's settled earnings, plus their share of gifts not settled yet.
+    """
+    balance = await db.get(CreatorBalance, current_user.id)
+    pending = await db.scalar(
+        select(func.coalesce(func.sum(GiftLedgerEntry.amount), 0))
+        .where(GiftLedgerEntry.recipient_id == current_user.id, GiftLedgerEntry.settlement_id.is_(None))
+    )
+    settled = balance.to_dict() if balance else {"earned": 0, "gifts": 0}
+    return {**settled, "pending": split_amount(int(pending))[0]}
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+class GiftSend(BaseModel):
+    stream_id: int
+    gift: str
+    idempotency_key: str = Field(..., min_length=8, max_length=64)  # Reuse it when retrying the same gift
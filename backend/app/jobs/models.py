@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON
+from datetime import datetime
+from app.database import Base
+
+# Job lifecycle
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job(Base):
+    """
+    A unit of background work, claimed by workers with SKIP LOCKED.
+    A running job whose lease (`locked_until`) lapses is picked up again.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_status_locked_until", "status", "locked_until"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)  # Name of the processor that runs it
+    payload = Column(JSON, nullable=False, default=dict)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), nullable=True, index=True)
+    status = Column(String(16), nullable=False, default=JOB_QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)  # Not claimable before this (backoff)
+    locked_until = Column(DateTime, nullable=True)  # Lease held by the worker running it
+    locked_by = Column(String(64), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,226 @@
+"""
+Job processors. A processor is a plain function `payload -> dict` registered under
+a job kind; it runs in a worker's process pool, so it must not touch the database.
+The dict it returns holds the video fields it learned, which the worker writes back.
+
+Processors are looked up by kind inside the pool process. To replace one (e.g. to
+exercise the queue without ffmpeg), register the replacement in a module and name
+it in JOB_PROCESSOR_MODULES or `--processors`; the worker imports those modules in
+every pool process, which also works with the spawn and forkserver start methods.
+"""
+import hashlib
+import importlib
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Callable, Dict, Iterable, Optional
+from app.utils import CHUNK_SIZE
+from app.storage.backends import media_storage, blob_key, thumbnail_key
+
+# Job kind queued for every new upload
+PROCESS_VIDEO = "process_video"
+
+# Extra modules that register or override processors, comma separated
+JOB_PROCESSOR_MODULES = [m for m in os.getenv("JOB_PROCESSOR_MODULES", "").split(",") if m.strip()]
+
+# External tools; steps that need a missing tool are skipped
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+# Seconds any one external tool may run
+PROCESSOR_COMMAND_TIMEOUT = float(os.getenv("PROCESSOR_COMMAND_TIMEOUT", "300"))
+
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+
+# Containers that get their index (moov atom) moved to the front so playback can start before the download ends
+FASTSTART_EXTENSIONS = (".mp4", ".m4v", ".mov")
+
+Processor = Callable[[dict], Optional[dict]]
+
+PROCESSORS: Dict[str, Processor] = {}
+
+
+class ProcessingError(Exception):
+    """
+    A processor failure worth retrying (e.g. a tool timed out).
+    """
+
+
+class PermanentProcessingError(ProcessingError):
+    """
+    A processor failure that retrying cannot fix (e.g. the file is corrupt); the job fails at once.
+    """
+
+
+def register_processor(kind: str, processor: Optional[Processor] = None):
+    """
+    Register `processor` for jobs of `kind`, replacing any earlier one.
+    Usable as a decorator: `@register_processor("kind")`.
+    """
+    if processor is None:
+        return lambda fn: register_processor(kind, fn)
+    PROCESSORS[kind] = processor
+    return processor
+
+
+def load_processor_modules(modules: Iterable[str] = ()) -> None:
+    """
+    Import modules that register processors. Runs as the pool initializer.
+    """
+    for module in [*JOB_PROCESSOR_MODULES, *modules]:
+        importlib.import_module(module.strip())
+
+
+def run_processor(kind: str, payload: dict) -> dict:
+    """
+    Entry point executed in the pool process.
+    :return: Video fields to store (may be empty).
+    """
+    processor = PROCESSORS.get(kind)
+    if processor is None:
+        raise PermanentProcessingError(f"No processor registered for job kind '{kind}'")
+    return processor(payload) or {}
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _run(args: list) -> str:
+    """
+    Run an external tool and return its stdout.
+    :raises ProcessingError: If it fails or times out.
+    """
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=PROCESSOR_COMMAND_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise ProcessingError(f"{os.path.basename(args[0])} timed out after {PROCESSOR_COMMAND_TIMEOUT:.0f}s")
+    if result.returncode != 0:
+        raise ProcessingError(f"{os.path.basename(args[0])} failed: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+def verify_integrity(path: str, checksum: Optional[str]) -> None:
+    """
+    :raises PermanentProcessingError: If the file is missing or no longer matches its checksum.
+    """
+    if not os.path.isfile(path):
+        raise PermanentProcessingError(f"Video file {path} does not exist")
+    if checksum and _sha256(path) != checksum:
+        raise PermanentProcessingError(f"Video file {path} does not match its checksum")
+
+
+def probe_duration_ms(path: str) -> Optional[int]:
+    """
+    :return: The video's duration in milliseconds, or None without ffprobe.
+    :raises PermanentProcessingError: If ffprobe cannot read it as media.
+    """
+    if shutil.which(FFPROBE_BINARY) is None:
+        return None
+    try:
+        output = _run([
+            FFPROBE_BINARY, "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            path,
+        ])
+    except ProcessingError as e:
+        raise PermanentProcessingError(str(e))
+    try:
+        return int(float(output.strip()) * 1000)
+    except ValueError:
+        return None
+
+
+def extract_thumbnail(path: str, checksum: str, duration_ms: Optional[int], storage=media_storage) -> Optional[str]:
+    """
+    Grab a frame (one second in, or the middle of shorter clips) as a JPEG and
+    store it next to the video's blob.
+    :return: The thumbnail's URL, or None without ffmpeg.
+    """
+    if shutil.which(FFMPEG_BINARY) is None:
+        return None
+    offset = 1.0 if duration_ms is None else min(1.0, duration_ms / 2000)
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "thumbnail.jpg")
+        _run([
+            FFMPEG_BINARY, "-v", "error", "-y",
+            "-ss", f"{offset:.3f}", "-i", path,
+            "-frames:v", "1", "-vf", f"scale={THUMBNAIL_WIDTH}:-2",
+            output,
+        ])
+        key = thumbnail_key(checksum)
+        storage.put_file(output, key)
+    return storage.url(key)
+
+
+def _moov_before_mdat(path: str) -> bool:
+    """
+    Walk the top-level MP4 boxes to see whether the index precedes the media data.
+    """
+    with open(path, "rb") as f:
+        while header := f.read(8):
+            if len(header) < 8:
+                return False
+            size, box = int.from_bytes(header[:4], "big"), header[4:]
+            if box == b"moov":
+                return True
+            if box == b"mdat":
+                return False
+            if size == 1:
+                size = int.from_bytes(f.read(8), "big") - 8
+            elif size == 0:
+                return False
+            f.seek(size - 8, os.SEEK_CUR)
+    return False
+
+
+def normalize_container(path: str, workdir: str) -> Optional[str]:
+    """
+    Remux MP4/MOV files whose index sits at the end into a fast-start MP4 in
+    `workdir` (streams are copied, not re-encoded).
+    :return: The new file's path, or None if nothing needed doing or ffmpeg is missing.
+    """
+    if not path.lower().endswith(FASTSTART_EXTENSIONS) or shutil.which(FFMPEG_BINARY) is None:
+        return None
+    if _moov_before_mdat(path):
+        return None
+    output = os.path.join(workdir, "faststart.mp4")
+    _run([FFMPEG_BINARY, "-v", "error", "-y", "-i", path, "-map", "0", "-c", "copy", "-movflags", "+faststart", output])
+    return output
+
+
+@register_processor(PROCESS_VIDEO)
+def process_video(payload: dict, storage=media_storage) -> dict:
+    """
+    Post-upload processing: integrity check, duration probe, fast-start remux
+    and thumbnail. Steps needing ffmpeg/ffprobe are skipped when they are not installed.
+    Payload: {"key": the blob's storage key, "checksum": its SHA-256}.
+    A remuxed file is stored as a new blob; the worker moves the video's reference to it.
+    """
+    checksum = payload["checksum"]
+    fields = {}
+    with storage.local_copy(payload["key"]) as path, tempfile.TemporaryDirectory() as workdir:
+        verify_integrity(path, checksum)
+        duration_ms = probe_duration_ms(path)
+        if duration_ms is not None:
+            fields["duration_ms"] = duration_ms
+
+        normalized = normalize_container(path, workdir)
+        if normalized is not None:
+            path = normalized
+            checksum = _sha256(normalized)
+            fields["key"] = blob_key(checksum, ".mp4")
+            fields["size_bytes"] = os.path.getsize(normalized)
+            fields["checksum"] = checksum
+            storage.put_file(normalized, fields["key"])
+
+        thumbnail_url = extract_thumbnail(path, checksum, duration_ms, storage)
+        if thumbnail_url is not None:
+            fields["thumbnail_url"] = thumbnail_url
+    return fields
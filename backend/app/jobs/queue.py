@@ -0,0 +1,175 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+from app.jobs.models import Job, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
+from app.video.models import Video, PROCESSING_PENDING, PROCESSING, PROCESSING_READY, PROCESSING_FAILED
+
+# Seconds a claimed job stays leased to its worker; the worker renews the lease while it runs,
+# and a job whose lease lapses (the worker died) becomes claimable again
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+
+# Attempts before a job is marked failed for good
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+
+# Retry backoff: JOB_RETRY_BASE * 2^(attempt - 1) seconds with jitter, capped at JOB_RETRY_MAX
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "10"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "3600"))
+
+# Longest error message kept on a job
+MAX_JOB_ERROR_LENGTH = 2000
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    video_id: Optional[int] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    delay: float = 0,
+) -> Job:
+    """
+    Queue a job. Enqueue inside the transaction that creates the work, so the
+    job exists exactly when that transaction commits.
+    :return: The job (flushed, so it has an id). The caller must commit.
+    """
+    job = Job(
+        kind=kind,
+        payload=payload,
+        video_id=video_id,
+        status=JOB_QUEUED,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def claim_jobs(db: Session, worker_id: str, limit: int, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> List[Job]:
+    """
+    Lease up to `limit` due jobs to `worker_id`: queued jobs whose backoff has
+    passed, and running jobs whose lease has lapsed. Rows locked by another
+    worker's claim are skipped rather than waited on (FOR UPDATE SKIP LOCKED).
+    :return: The claimed jobs, oldest first. The caller must commit to release the row locks.
+    """
+    now = datetime.utcnow()
+    due = or_(
+        (Job.status == JOB_QUEUED) & (Job.run_after <= now),
+        (Job.status == JOB_RUNNING) & (Job.locked_until < now),
+    )
+    jobs = db.execute(
+        select(Job).where(due).order_by(Job.run_after, Job.id).limit(limit).with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    claimed = []
+    locked_until = now + timedelta(seconds=visibility_timeout)
+    for job in jobs:
+        if job.attempts >= job.max_attempts:
+            # Its last attempt lost its lease (the worker crashed or hung): give up on it
+            _finish_failed(db, job, job.last_error or "Lease expired on the final attempt")
+            continue
+        job.status = JOB_RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = locked_until
+        _set_video_status(db, job, PROCESSING)
+        claimed.append(job)
+    db.flush()
+    return claimed
+
+
+def _set_video_status(db: Session, job: Job, status: str, **fields) -> None:
+    if job.video_id is None:
+        return
+    db.execute(
+        update(Video)
+        .where(Video.id == job.video_id)
+        .values(processing_status=status, **fields)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def extend_leases(db: Session, worker_id: str, job_ids: List[int], visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> None:
+    """
+    Renew the leases this worker holds on jobs that are still running.
+    The caller must commit.
+    """
+    if not job_ids:
+        return
+    db.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.status == JOB_RUNNING, Job.locked_by == worker_id)
+        .values(locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _held_by(db: Session, job_id: int, worker_id: str) -> Optional[Job]:
+    """
+    The job, if `worker_id` still holds it; a lease that lapsed may have passed to another worker.
+    """
+    job = db.get(Job, job_id, with_for_update=True)
+    if job is None or job.status != JOB_RUNNING or job.locked_by != worker_id:
+        return None
+    return job
+
+
+def complete_job(db: Session, job_id: int, worker_id: str, video_fields: Optional[dict] = None) -> Optional[Job]:
+    """
+    Mark a job succeeded and its video ready, applying `video_fields` (what the processor learned) to the video.
+    :return: The job, or None if this worker no longer holds it. The caller must commit.
+    """
+    job = _held_by(db, job_id, worker_id)
+    if job is None:
+        return None
+    job.status = JOB_SUCCEEDED
+    job.locked_until = None
+    job.last_error = None
+    job.finished_at = datetime.utcnow()
+    _set_video_status(db, job, PROCESSING_READY, **(video_fields or {}))
+    return job
+
+
+def retry_delay(attempts: int, base: float = JOB_RETRY_BASE, cap: float = JOB_RETRY_MAX) -> float:
+    """
+    Seconds to wait before the next attempt: exponential in the attempts so far,
+    with jitter so jobs that failed together do not retry together.
+    """
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str, retry: bool = True) -> Optional[Job]:
+    """
+    Record a failed attempt: requeue the job with backoff, or mark it failed once
+    it has used all its attempts (or at once, when `retry` is False).
+    :return: The job, or None if this worker no longer holds it. The caller must commit.
+    """
+    job = _held_by(db, job_id, worker_id)
+    if job is None:
+        return None
+    if not retry or job.attempts >= job.max_attempts:
+        _finish_failed(db, job, error)
+    else:
+        job.status = JOB_QUEUED
+        job.last_error = error[:MAX_JOB_ERROR_LENGTH]
+        job.locked_until = None
+        job.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        _set_video_status(db, job, PROCESSING_PENDING)
+    return job
+
+
+def _finish_failed(db: Session, job: Job, error: str) -> None:
+    job.status = JOB_FAILED
+    job.last_error = error[:MAX_JOB_ERROR_LENGTH]
+    job.locked_until = None
+    job.finished_at = datetime.utcnow()
+    _set_video_status(db, job, PROCESSING_FAILED)
+
+
+def jobs_for_video(db: Session, video_id: int) -> List[Job]:
+    return db.execute(select(Job).where(Job.video_id == video_id).order_by(Job.id)).scalars().all()
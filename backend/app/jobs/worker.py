@@ -0,0 +1,200 @@
+"""
+Background job worker. Claims due jobs from the database and runs their
+processors in a process pool, so CPU-heavy or blocking work (hashing, ffmpeg)
+never runs in the API processes. Run any number of these side by side:
+
+    python -m app.jobs.worker --processes 4
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Optional
+from app.database import SessionLocal
+from app.jobs.queue import JOB_VISIBILITY_TIMEOUT, claim_jobs, complete_job, extend_leases, fail_job
+from app.jobs.processors import PermanentProcessingError, load_processor_modules, run_processor
+from app.storage.backends import media_storage
+from app.storage.blobs import retain_blob, release_blob
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls for new jobs while idle
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+# Video columns a processor may set
+PROCESSED_VIDEO_FIELDS = ("duration_ms", "thumbnail_url", "size_bytes", "checksum")
+
+
+def _processed_fields(result) -> dict:
+    """
+    The video fields in a processor's result.
+    :raises PermanentProcessingError: If the result is malformed; running the processor again would not fix it.
+    """
+    if not isinstance(result, dict):
+        raise PermanentProcessingError(f"Processor returned {type(result).__name__}, not a dict")
+    fields = {key: value for key, value in result.items() if key in PROCESSED_VIDEO_FIELDS}
+    if "checksum" in fields:
+        missing = [name for name in ("key", "size_bytes") if result.get(name) is None]
+        if missing:
+            raise PermanentProcessingError(f"Processor returned a checksum without {' or '.join(missing)}")
+    return fields
+
+
+class JobWorker:
+    """
+    Keeps up to `processes` jobs in flight, one per pool process, renewing their
+    leases while they run and recording each outcome as it completes.
+    """
+
+    def __init__(
+        self,
+        processes: int = os.cpu_count() or 1,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+        processor_modules: Iterable[str] = (),
+        session_factory=SessionLocal,
+    ):
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.processor_modules = list(processor_modules)
+        self.session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[Future, tuple] = {}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        load_processor_modules(self.processor_modules)
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=load_processor_modules,
+            initargs=(self.processor_modules,),
+        )
+
+    def run(self, exit_when_idle: bool = False) -> None:
+        """
+        Process jobs until `stop()` is called (or, with `exit_when_idle`, until no
+        job is due). Jobs already running are finished before returning.
+        """
+        self._pool = self._new_pool()
+        last_renewal = time.monotonic()
+        try:
+            while self._running or not self.stop_event.is_set():
+                if not self.stop_event.is_set():
+                    claimed = self._claim(self.processes - len(self._running))
+                    if not claimed and not self._running:
+                        if exit_when_idle:
+                            return
+                        self.stop_event.wait(self.poll_interval)
+                        continue
+
+                done, _ = wait(self._running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    broken |= self._finish(future, *self._running.pop(future))
+                if broken:
+                    # A pool process died; the pool cannot be used again
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._new_pool()
+
+                if time.monotonic() - last_renewal > self.visibility_timeout / 3:
+                    self._renew_leases()
+                    last_renewal = time.monotonic()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self, *_) -> None:
+        self.stop_event.set()
+
+    def _claim(self, slots: int) -> int:
+        if slots <= 0:
+            return 0
+        with self.session_factory() as db:
+            jobs = claim_jobs(db, self.worker_id, slots, self.visibility_timeout)
+            claimed = [(job.id, job.kind, dict(job.payload)) for job in jobs]
+            db.commit()
+        for job_id, kind, payload in claimed:
+            future = self._pool.submit(run_processor, kind, payload)
+            self._running[future] = (job_id, kind, payload)
+        return len(claimed)
+
+    def _finish(self, future: Future, job_id: int, kind: str, payload: dict) -> bool:
+        """
+        Record a finished job's outcome. A result that cannot be recorded fails the job
+        instead, so one bad job never stops the worker.
+        :return: True if its pool process crashed.
+        """
+        error = future.exception()
+        if error is None:
+            try:
+                if self._record_success(job_id, payload, future.result()):
+                    self.succeeded += 1
+                return False
+            except Exception as e:
+                logger.exception("Could not record job %s (%s) as succeeded", job_id, kind)
+                error = e
+        self._record_failure(job_id, kind, error)
+        return isinstance(error, BrokenProcessPool)
+
+    def _record_success(self, job_id: int, payload: dict, result) -> bool:
+        """
+        :return: Whether the success was committed (False if this worker lost the job's lease).
+        """
+        fields = _processed_fields(result)
+        with self.session_factory() as db:
+            if "checksum" in fields and fields["checksum"] != payload.get("checksum"):
+                # The processor stored a replacement file: point the video at its blob
+                key = retain_blob(db, fields["checksum"], result["key"], fields["size_bytes"])
+                release_blob(db, payload.get("checksum"))
+                fields["url"] = media_storage.url(key)
+            if complete_job(db, job_id, self.worker_id, fields) is None:
+                db.rollback()
+                return False
+            db.commit()
+            return True
+
+    def _record_failure(self, job_id: int, kind: str, error: BaseException) -> None:
+        message = f"{type(error).__name__}: {error}"
+        logger.warning("Job %s (%s) failed: %s", job_id, kind, message)
+        try:
+            with self.session_factory() as db:
+                recorded = fail_job(db, job_id, self.worker_id, message, retry=not isinstance(error, PermanentProcessingError))
+                db.commit()
+        except Exception:
+            # The lease runs out and the job is claimed again
+            logger.exception("Could not record the failure of job %s (%s)", job_id, kind)
+            return
+        if recorded is not None:
+            self.failed += 1
+
+    def _renew_leases(self) -> None:
+        with self.session_factory() as db:
+            extend_leases(db, self.worker_id, [job_id for job_id, _, _ in self._running.values()], self.visibility_timeout)
+            db.commit()
+
+
+if __name__ == "__main__":
+    import argparse
+    import app.models  # noqa: F401
+    from app.log import configure_logging
+
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="jobs run in parallel")
+    parser.add_argument("--processors", action="append", default=[], help="module registering processors (repeatable)")
+    parser.add_argument("--once", action="store_true", help="exit once no job is due")
+    args = parser.parse_args()
+
+    configure_logging()
+    worker = JobWorker(processes=args.processes, processor_modules=args.processors)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    logger.info("Job worker %s started with %d processes", worker.worker_id, args.processes)
+    worker.run(exit_when_idle=args.once)
+    logger.info("Job worker stopped: %d succeeded, %d failed", worker.succeeded, worker.failed)
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional, Set
+from starlette.websockets import WebSocket, WebSocketState
+from app.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# Where live events are exchanged between workers: memory:// (single process) or a redis:// URL
+LIVE_BROKER_URL = os.getenv("LIVE_BROKER_URL", "memory://")
+
+# Events queued per connection before it is dropped as a slow consumer
+LIVE_SEND_QUEUE_SIZE = int(os.getenv("LIVE_SEND_QUEUE_SIZE", "256"))
+
+# How long (seconds) a connection waits to gather more events into one frame, and the frame's cap
+LIVE_BATCH_WINDOW = float(os.getenv("LIVE_BATCH_WINDOW", "0.05"))
+LIVE_MAX_BATCH = int(os.getenv("LIVE_MAX_BATCH", "100"))
+
+# Chat messages one connection may send: a sustained rate per second, and a burst on top of it
+LIVE_CHAT_RATE = float(os.getenv("LIVE_CHAT_RATE", "1"))
+LIVE_CHAT_BURST = int(os.getenv("LIVE_CHAT_BURST", "5"))
+
+# Close code sent to consumers that cannot keep up (1013: try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+_CLOSE = object()
+
+
+class Subscriber:
+    """
+    One WebSocket viewer. Events are queued here by the hub and written out by
+    `run_sender`, several per frame, so a slow socket never blocks the publisher.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int = LIVE_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, payload: str) -> bool:
+        """
+        Queue an encoded event. When the queue is full the subscriber is marked
+        dropped, its backlog discarded and the connection scheduled to close.
+        :return: False if the subscriber was dropped.
+        """
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_CLOSE)
+            return False
+
+    async def run_sender(self, batch_window: float = LIVE_BATCH_WINDOW, max_batch: int = LIVE_MAX_BATCH) -> None:
+        """
+        Write queued events to the socket as JSON arrays until the connection ends.
+        """
+        while True:
+            payload = await self.queue.get()
+            if payload is _CLOSE:
+                await self._close(SLOW_CONSUMER_CLOSE_CODE, "Too slow to keep up")
+                return
+            batch = [payload]
+            if batch_window:
+                await asyncio.sleep(batch_window)
+            while len(batch) < max_batch and not self.queue.empty():
+                payload = self.queue.get_nowait()
+                if payload is _CLOSE:
+                    await self._close(SLOW_CONSUMER_CLOSE_CODE, "Too slow to keep up")
+                    return
+                batch.append(payload)
+            await self.websocket.send_text("[" + ",".join(batch) + "]")
+
+    async def _close(self, code: int, reason: str) -> None:
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            await self.websocket.close(code=code, reason=reason)
+
+
+class ChatRateLimit:
+    """
+    Token bucket limiting how fast one connection may send chat messages.
+    """
+
+    def __init__(self, rate: float = LIVE_CHAT_RATE, burst: int = LIVE_CHAT_BURST, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def allow(self) -> bool:
+        """
+        Take a token for one message.
+        :return: False if the connection is sending too fast and the message should be refused.
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LocalBroker:
+    """
+    Delivers published events straight to this process's rooms.
+    """
+
+    async def start(self, deliver: Callable[[int, str], None]) -> None:
+        self._deliver = deliver
+
+    async def publish(self, stream_id: int, payload: str) -> None:
+        self._deliver(stream_id, payload)
+
+    async def join(self, stream_id: int) -> None:
+        pass
+
+    async def leave(self, stream_id: int) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBroker:
+    """
+    Relays events between workers over Redis pub/sub (or any server speaking its
+    protocol). Each worker subscribes only to the streams it has viewers for, and
+    every worker, including the publisher, delivers from the channel.
+    Requires the `redis` package.
+    """
+
+    def __init__(self, url: str, prefix: str = "bytetok:live:"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("LIVE_BROKER_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis_asyncio.from_url(url)
+        self.prefix = prefix
+        self.pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[int, str], None]) -> None:
+        self._deliver = deliver
+        self.pubsub = self.client.pubsub()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def publish(self, stream_id: int, payload: str) -> None:
+        await self.client.publish(f"{self.prefix}{stream_id}", payload)
+
+    async def join(self, stream_id: int) -> None:
+        await self.pubsub.subscribe(f"{self.prefix}{stream_id}")
+
+    async def leave(self, stream_id: int) -> None:
+        await self.pubsub.unsubscribe(f"{self.prefix}{stream_id}")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self.pubsub is not None:
+            await self.pubsub.close()
+        await self.client.close()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Error reading live events from Redis: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            channel = message["channel"].decode() if isinstance(message["channel"], bytes) else message["channel"]
+            data = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+            self._deliver(int(channel[len(self.prefix):]), data)
+
+
+def create_broker(url: Optional[str]):
+    if not url or url.startswith("memory://"):
+        return LocalBroker()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported live broker URL: {url}")
+
+
+class LiveHub:
+    """
+    Pub/sub hub for live-stream rooms. A published event is encoded once and then
+    only queued per viewer, so fan-out cost is a queue put per subscriber.
+    """
+
+    def __init__(self, broker=None):
+        self.broker = broker if broker is not None else create_broker(LIVE_BROKER_URL)
+        self.rooms: Dict[int, Set[Subscriber]] = {}
+        self.dropped = 0
+        self._started = False
+
+    async def start(self) -> None:
+        if not self._started:
+            await self.broker.start(self.deliver)
+            self._started = True
+
+    async def close(self) -> None:
+        if self._started:
+            await self.broker.close()
+            self._started = False
+
+    async def join(self, stream_id: int, subscriber: Subscriber) -> None:
+        await self.start()
+        room = self.rooms.get(stream_id)
+        if room is None:
+            room = self.rooms[stream_id] = set()
+            await self.broker.join(stream_id)
+        room.add(subscriber)
+
+    async def leave(self, stream_id: int, subscriber: Subscriber) -> None:
+        room = self.rooms.get(stream_id)
+        if room is None:
+            return
+        # The subscriber may already be gone if it was dropped as a slow consumer
+        room.discard(subscriber)
+        if not room:
+            del self.rooms[stream_id]
+            await self.broker.leave(stream_id)
+
+    async def publish(self, stream_id: int, event: dict) -> None:
+        await self.start()
+        await self.broker.publish(stream_id, dumps(event).decode())
+
+    def deliver(self, stream_id: int, payload: str) -> None:
+        """
+        Queue an encoded event for every local viewer of a stream, dropping slow ones.
+        """
+        room = self.rooms.get(stream_id)
+        if not room:
+            return
+        for subscriber in list(room):
+            if not subscriber.offer(payload):
+                # The room itself is cleaned up when the dropped connection leaves
+                room.discard(subscriber)
+                self.dropped += 1
+
+    def viewer_count(self, stream_id: int) -> int:
+        """
+        Viewers of a stream connected to this worker.
+        """
+        return len(self.rooms.get(stream_id, ()))
+
+
+live_hub = LiveHub()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel
 from datetime import datetime
@@ -6,6 +6,16 @@ from app.database import Base
 
 class LiveStream(Base):
     __tablename__ = "live_streams"
+    __table_args__ = (
+        # At most one active stream per streamer, enforced by the database
+        Index(
+            "uq_live_streams_active_streamer_id",
+            "streamer_id",
+            unique=True,
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -14,6 +24,7 @@ class LiveStream(Base):
     streamer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     started_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime, nullable=True)
+    last_heartbeat_at = Column(DateTime, default=datetime.utcnow)  # Last sign of life from the broadcaster
 
     streamer = relationship("app.auth.models.User", back_populates="live_streams")
 
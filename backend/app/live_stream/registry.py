@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.live_stream.models import LiveStream
+from app.live_stream.hub import live_hub
+from app.cache.response import response_cache, STREAMS_TAG
+from app.utils import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# Broadcasters should heartbeat every STREAM_HEARTBEAT_INTERVAL seconds; a stream
+# silent for STREAM_HEARTBEAT_TIMEOUT seconds is ended automatically
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+STREAM_HEARTBEAT_TIMEOUT = float(os.getenv("STREAM_HEARTBEAT_TIMEOUT", "60"))
+
+# Seconds between expiry sweeps / reloads of the registry from the database
+LIVE_REGISTRY_SYNC_INTERVAL = float(os.getenv("LIVE_REGISTRY_SYNC_INTERVAL", "5"))
+
+
+@dataclass
+class ActiveStream:
+    """
+    The listing fields of an active stream, detached from any session.
+    """
+    id: int
+    title: str
+    description: Optional[str]
+    streamer_id: int
+    started_at: datetime
+    last_heartbeat_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, stream: LiveStream) -> "ActiveStream":
+        return cls(
+            id=stream.id,
+            title=stream.title,
+            description=stream.description,
+            streamer_id=stream.streamer_id,
+            started_at=stream.started_at,
+            last_heartbeat_at=stream.last_heartbeat_at,
+        )
+
+    def to_dict(self, viewers: int = 0) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "streamer_id": self.streamer_id,
+            "is_active": True,
+            "started_at": self.started_at,
+            "ended_at": None,
+            "viewers": viewers,
+        }
+
+
+class StreamRegistry:
+    """
+    Active streams held in memory and indexed by stream and streamer id.
+    This worker's starts, stops and heartbeats apply immediately; changes made
+    by other workers arrive with the next sync from the database.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, ActiveStream] = {}
+        self._by_streamer: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def replace_all(self, streams: Iterable[ActiveStream]) -> None:
+        by_id = {stream.id: stream for stream in streams}
+        with self._lock:
+            self._by_id = by_id
+            self._by_streamer = {stream.streamer_id: stream.id for stream in by_id.values()}
+            self.loaded = True
+
+    def add(self, stream: ActiveStream) -> None:
+        with self._lock:
+            self._by_id[stream.id] = stream
+            self._by_streamer[stream.streamer_id] = stream.id
+
+    def remove(self, stream_id: int) -> Optional[ActiveStream]:
+        with self._lock:
+            stream = self._by_id.pop(stream_id, None)
+            if stream is not None and self._by_streamer.get(stream.streamer_id) == stream_id:
+                del self._by_streamer[stream.streamer_id]
+            return stream
+
+    def heartbeat(self, stream_id: int, at: datetime) -> None:
+        with self._lock:
+            stream = self._by_id.get(stream_id)
+            if stream is not None:
+                stream.last_heartbeat_at = at
+
+    def get(self, stream_id: int) -> Optional[ActiveStream]:
+        return self._by_id.get(stream_id)
+
+    def for_streamer(self, streamer_id: int) -> Optional[ActiveStream]:
+        stream_id = self._by_streamer.get(streamer_id)
+        return self._by_id.get(stream_id) if stream_id is not None else None
+
+    def listing(self) -> List[dict]:
+        """
+        Every active stream with its viewer count on this worker, newest first.
+        """
+        with self._lock:
+            streams = list(self._by_id.values())
+        streams.sort(key=lambda stream: (stream.started_at, stream.id), reverse=True)
+        return [stream.to_dict(viewers=live_hub.viewer_count(stream.id)) for stream in streams]
+
+
+stream_registry = StreamRegistry()
+
+
+def expire_silent_streams(db: Session, timeout: float = STREAM_HEARTBEAT_TIMEOUT) -> List[int]:
+    """
+    End active streams whose broadcaster has not sent a heartbeat for `timeout` seconds.
+    :return: The ids of the streams ended. The caller must commit.
+    """
+    now = datetime.utcnow()
+    last_seen = func.coalesce(LiveStream.last_heartbeat_at, LiveStream.started_at)
+    stale = (LiveStream.is_active == True) & (last_seen < now - timedelta(seconds=timeout))
+    stale_ids = list(db.execute(select(LiveStream.id).where(stale)).scalars())
+    if stale_ids:
+        db.execute(
+            update(LiveStream)
+            .where(LiveStream.id.in_(stale_ids), stale)
+            .values(is_active=False, ended_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    return stale_ids
+
+
+def load_active_streams(db: Session) -> List[ActiveStream]:
+    rows = db.execute(select(LiveStream).where(LiveStream.is_active == True)).scalars().all()
+    return [ActiveStream.from_model(row) for row in rows]
+
+
+async def sync_stream_registry(registry: StreamRegistry = stream_registry) -> None:
+    """
+    Expire silent streams, then reload the registry from the database.
+    """
+    async with AsyncSessionLocal() as db:
+        expired = await db.run_sync(expire_silent_streams)
+        await db.commit()
+        streams = await db.run_sync(load_active_streams)
+    registry.replace_all(streams)
+
+    if expired:
+        await response_cache.invalidate(STREAMS_TAG)
+        for stream_id in expired:
+            await live_hub.publish(stream_id, {"type": "stream_ended", "stream_id": stream_id, "reason": "timeout"})
+
+
+async def run_stream_registry_sync(interval: float = LIVE_REGISTRY_SYNC_INTERVAL) -> None:
+    """
+    Background task that loads the registry at startup and re-syncs it every `interval` seconds.
+    """
+    try:
+        await sync_stream_registry()
+    except Exception:
+        logger.exception("Error loading live stream registry")
+    await run_periodically(sync_stream_registry, interval, "live stream registry sync")
@@ -1,68 +1,192 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from app.database import get_db
-from app.auth.dependencies import get_current_user
+from app.database import AsyncSessionLocal, get_async_db
+from app.auth.dependencies import get_current_user, get_websocket_user
 from app.live_stream.models import LiveStream
 from app.live_stream.schemas import LiveStreamCreate  # Import the schema
+from app.cache.response import response_cache, STREAMS_TAG
+from starlette.websockets import WebSocketState
+from app.live_stream.hub import live_hub, ChatRateLimit, Subscriber
+from app.live_stream.registry import stream_registry, ActiveStream, STREAM_HEARTBEAT_INTERVAL
+from app.responses import dumps
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Longest chat message accepted, in characters
+MAX_CHAT_MESSAGE_LENGTH = 500
+
 @router.post("/start")
 async def start_live_stream(
     stream_data: LiveStreamCreate,  # Automatically parses and validates JSON body
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
-    # Check if the user already has an active live stream
-    active_stream = (
-        db.query(LiveStream)
-        .filter(LiveStream.streamer_id == current_user.id, LiveStream.is_active == True)
-        .first()
-    )
-    if active_stream:
-        raise HTTPException(status_code=400, detail="You already have an active live stream.")
-
-    # Create new stream
+    # The partial unique index allows one active stream per streamer, so concurrent
+    # starts cannot both succeed
     new_stream = LiveStream(
         title=stream_data.title,
         description=stream_data.description,
         streamer_id=current_user.id,
     )
     db.add(new_stream)
-    db.commit()
-    db.refresh(new_stream)
-    return {"message": "Live stream started successfully", "stream": new_stream}
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="You already have an active live stream.")
+    await db.refresh(new_stream)
+
+    stream_registry.add(ActiveStream.from_model(new_stream))
+    await response_cache.invalidate(STREAMS_TAG)
+    return {
+        "message": "Live stream started successfully",
+        "stream": new_stream.to_dict(),
+        "heartbeat_interval": STREAM_HEARTBEAT_INTERVAL,
+    }
 
 @router.post("/stop")
 async def stop_live_stream(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """
     Stop an active live stream.
     """
     # Find the active live stream for the user
-    active_stream = (
-        db.query(LiveStream)
-        .filter(LiveStream.streamer_id == current_user.id, LiveStream.is_active == True)
-        .first()
+    result = await db.execute(
+        select(LiveStream).where(LiveStream.streamer_id == current_user.id, LiveStream.is_active == True)
     )
+    active_stream = result.scalars().first()
     if not active_stream:
         raise HTTPException(status_code=404, detail="No active live stream found.")
 
     # Mark the live stream as inactive and record the end time
     active_stream.is_active = False
     active_stream.ended_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+
+    stream_registry.remove(active_stream.id)
+    await response_cache.invalidate(STREAMS_TAG)
+    await live_hub.publish(active_stream.id, {"type": "stream_ended", "stream_id": active_stream.id})
 
     return {"message": "Live stream stopped successfully"}
 
 
+@router.post("/heartbeat")
+async def live_stream_heartbeat(
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Keep the caller's active stream alive. Streams that miss heartbeats for
+    STREAM_HEARTBEAT_TIMEOUT seconds are ended automatically.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(LiveStream)
+        .where(LiveStream.streamer_id == current_user.id, LiveStream.is_active == True)
+        .values(last_heartbeat_at=now)
+        .returning(LiveStream.id)
+    )
+    stream_id = result.scalar()
+    if stream_id is None:
+        raise HTTPException(status_code=404, detail="No active live stream found.")
+    await db.commit()
+
+    stream_registry.heartbeat(stream_id, now)
+    return {"stream_id": stream_id, "viewers": live_hub.viewer_count(stream_id)}
+
+
 @router.get("/")
-async def get_active_streams(db: Session = Depends(get_db)):
+async def get_active_streams(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get all active live streams with their viewer counts, served from the stream
+    registry (or the database until the registry has loaded).
+    """
+    async def build():
+        if stream_registry.loaded:
+            return {"streams": stream_registry.listing()}
+        result = await db.execute(select(LiveStream).where(LiveStream.is_active == True))
+        streams = result.scalars().all()
+        return {"streams": [stream.to_dict() for stream in streams]}
+
+    return await response_cache.respond(request, build, tags=(STREAMS_TAG,))
+
+
+@router.websocket("/{stream_id}/ws")
+async def live_stream_events(websocket: WebSocket, stream_id: int, current_user=Depends(get_websocket_user)):
     """
-    Get all active live streams.
+    Live chat and gift events for one stream. Every frame sent is a JSON array of
+    events. Signed-in viewers (`?token=<jwt>`) may send `{"type": "chat", "text": "..."}`.
     """
-    streams = db.query(LiveStream).filter(LiveStream.is_active == True).all()
-    return {"streams": [stream.to_dict() for stream in streams]}
+    if stream_registry.loaded:
+        stream = stream_registry.get(stream_id)
+    else:
+        async with AsyncSessionLocal() as db:
+            stream = await db.get(LiveStream, stream_id)
+            stream = stream if stream is not None and stream.is_active else None
+    if stream is None:
+        await websocket.close(code=1008, reason="Live stream not found")
+        return
+
+    await websocket.accept()
+    subscriber = Subscriber(websocket)
+    await live_hub.join(stream_id, subscriber)
+    # Whichever ends first (the viewer leaving, or the sender dropping a slow or broken
+    # socket) ends the connection; the other is cancelled
+    sender = asyncio.create_task(subscriber.run_sender())
+    receiver = asyncio.create_task(_receive_chat(websocket, stream_id, subscriber, current_user))
+    try:
+        await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        results = await asyncio.gather(sender, receiver, return_exceptions=True)
+        await live_hub.leave(stream_id, subscriber)
+        for result in results:
+            if isinstance(result, Exception) and not isinstance(result, WebSocketDisconnect):
+                logger.warning("Live stream %s connection failed: %s", stream_id, type(result).__name__, exc_info=result)
+        if websocket.application_state == WebSocketState.CONNECTED and websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+
+
+async def _receive_chat(websocket: WebSocket, stream_id: int, subscriber: Subscriber, user) -> None:
+    """
+    Publish the chat messages a viewer sends until they disconnect.
+    """
+    rate_limit = ChatRateLimit()
+    while True:
+        try:
+            message = json.loads(await websocket.receive_text())
+        except ValueError:
+            continue
+        if not isinstance(message, dict) or message.get("type") != "chat":
+            continue
+        if user is None:
+            subscriber.offer(dumps({"type": "error", "detail": "Sign in to chat"}).decode())
+            continue
+        if not rate_limit.allow():
+            subscriber.offer(dumps({"type": "error", "detail": "You are sending messages too fast"}).decode())
+            continue
+
+        text = str(message.get("text", "")).strip()[:MAX_CHAT_MESSAGE_LENGTH]
+        if text:
+            await live_hub.publish(stream_id, {
+                "type": "chat",
+                "stream_id": stream_id,
+                "user_id": user.id,
+                "username": user.username,
+                "text": text,
+                "sent_at": datetime.utcnow(),
+            })
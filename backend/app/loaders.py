@@ -0,0 +1,218 @@
+"""
+Per-request batch loading. A `DataLoader` collects every key asked of it while
+the request's coroutines run, then fetches them all with one query (usually an
+`IN`) and remembers the results for the rest of the request; asking again for
+a key (from any handler or serializer sharing the request's `Loaders`) is free.
+
+    loaders = Depends(get_loaders)
+    video, uploader = await asyncio.gather(loaders.videos.load(1), loaders.users.load(7))
+
+Keys requested in the same event loop iteration share a batch, so gather
+lookups (or use `load_many`) rather than awaiting them one by one.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Literal, Optional, Sequence, TypeVar
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.auth.models import User
+from app.profile.models import UserStats
+from app.video.models import Video, Comment, VIDEO_PAYLOAD_COLUMNS, video_payload
+from app.video.counters import counter_buffer
+
+# Most ids a batch endpoint accepts, and most keys sent in one IN query
+MAX_BATCH_IDS = 100
+MAX_LOADER_BATCH = 500
+
+# Newest comments shown with each video in a comment preview, and videos per
+# preview statement (one UNION ALL branch each; SQLite allows 500)
+COMMENT_PREVIEW_SIZE = 3
+COMMENT_PREVIEW_BATCH = 100
+
+# Related data a video listing can embed (`?expand=uploader&expand=comments`)
+VideoExpansion = Literal["uploader", "comments"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BatchFn = Callable[[List[K]], Awaitable[Dict[K, V]]]
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Coalesces lookups into batches and memoizes them for its lifetime (one request).
+    `batch_fn` maps a list of keys to `{key: value}`; keys it leaves out load as None.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = MAX_LOADER_BATCH):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._results: Dict[K, asyncio.Future] = {}
+        self._queue: List[K] = []
+        self.batches = 0
+
+    async def load(self, key: K) -> Optional[V]:
+        return await self._future(key)
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        """
+        Values for `keys`, in order, fetched together with any other pending lookups.
+        """
+        futures = [self._future(key) for key in keys]
+        return list(await asyncio.gather(*futures)) if futures else []
+
+    def prime(self, key: K, value: V) -> None:
+        """
+        Remember a value loaded some other way, so a later lookup skips the query.
+        """
+        if key not in self._results:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._results[key] = future
+
+    def _future(self, key: K) -> asyncio.Future:
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._results[key] = loop.create_future()
+            if not self._queue:
+                # Dispatch once the coroutines already scheduled have made their lookups
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        asyncio.get_running_loop().create_task(self._run(keys))
+
+    async def _run(self, keys: List[K]) -> None:
+        for start in range(0, len(keys), self.max_batch_size):
+            chunk = keys[start:start + self.max_batch_size]
+            self.batches += 1
+            try:
+                values = await self._batch_fn(chunk)
+            except Exception as exc:
+                for key in keys[start:]:
+                    # Forget failures so a retry queries again
+                    future = self._results.pop(key)
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            for key in chunk:
+                future = self._results[key]
+                if not future.done():
+                    future.set_result(values.get(key))
+
+
+class Loaders:
+    """
+    The loaders of one request, sharing its session. Batches of different
+    loaders may be dispatched together, so their queries take turns on it.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._session_lock = asyncio.Lock()
+        self.videos: DataLoader[int, object] = DataLoader(self._serialized(self._videos))
+        self.users: DataLoader[int, dict] = DataLoader(self._serialized(self._users))
+        self.comment_previews: DataLoader[int, List[dict]] = DataLoader(
+            self._serialized(self._comment_previews), max_batch_size=COMMENT_PREVIEW_BATCH,
+        )
+
+    def _serialized(self, batch_fn: BatchFn) -> BatchFn:
+        async def run(keys):
+            async with self._session_lock:
+                return await batch_fn(keys)
+        return run
+
+    async def _videos(self, video_ids: List[int]) -> Dict[int, object]:
+        """
+        Rows selected with VIDEO_PAYLOAD_COLUMNS (pass them through `video_payload`).
+        """
+        result = await self.db.execute(select(*VIDEO_PAYLOAD_COLUMNS).where(Video.id.in_(video_ids)))
+        return {row.id: row for row in result}
+
+    async def _users(self, user_ids: List[int]) -> Dict[int, dict]:
+        """
+        Public profile summaries: username and counters.
+        """
+        result = await self.db.execute(
+            select(
+                User.id,
+                User.username,
+                func.coalesce(UserStats.followers_count, 0).label("followers_count"),
+                func.coalesce(UserStats.following_count, 0).label("following_count"),
+                func.coalesce(UserStats.video_count, 0).label("video_count"),
+            )
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )
+        return {row.id: dict(row._mapping) for row in result}
+
+    async def _comment_previews(self, video_ids: List[int]) -> Dict[int, List[dict]]:
+        """
+        The newest COMMENT_PREVIEW_SIZE comments of each video, newest first.
+        One statement of per-video branches, so each reads only its few newest
+        rows off the (video_id, created_at, id) index instead of ranking every
+        comment of a busy video.
+        """
+        branches = [
+            select(Comment.id, Comment.video_id, Comment.content.label("text"), Comment.user_id, Comment.created_at)
+            .where(Comment.video_id == video_id)
+            .order_by(Comment.created_at.desc(), Comment.id.desc())
+            .limit(COMMENT_PREVIEW_SIZE)
+            .subquery()
+            .select()
+            for video_id in video_ids
+        ]
+        result = await self.db.execute(union_all(*branches))
+        previews = {video_id: [] for video_id in video_ids}
+        for row in result:
+            comment = dict(row._mapping)
+            previews[comment.pop("video_id")].append(comment)
+        for comments in previews.values():
+            # A compound select does not promise to keep each branch's order
+            comments.sort(key=lambda comment: (comment["created_at"], comment["id"]), reverse=True)
+        return previews
+
+
+async def serialize_videos(loaders: Loaders, rows: Iterable, expand: Sequence[str] = ()) -> List[dict]:
+    """
+    Payloads (with unflushed counter deltas) of rows selected with VIDEO_PAYLOAD_COLUMNS,
+    plus the expansions asked for, each loaded for the whole list in one query.
+    """
+    videos = [counter_buffer.merge(video_payload(row)) for row in rows]
+    lookups = {}
+    if "uploader" in expand:
+        lookups["uploader"] = loaders.users.load_many([video["uploader_id"] for video in videos])
+    if "comments" in expand:
+        lookups["comments"] = loaders.comment_previews.load_many([video["id"] for video in videos])
+    results = await asyncio.gather(*lookups.values())
+    for field, values in zip(lookups, results):
+        for video, value in zip(videos, values):
+            video[field] = value
+    return videos
+
+
+async def get_loaders(db: AsyncSession = Depends(get_async_db)) -> Loaders:
+    """
+    Dependency giving a request its loaders (FastAPI resolves it once per request).
+    """
+    return Loaders(db)
+
+
+def batch_ids(ids: str = Query(..., description="Comma-separated ids")) -> List[int]:
+    """
+    Dependency parsing `?ids=1,2,3` into distinct ids, in the order given.
+    """
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=422, detail="ids must name at least one id")
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return parsed
@@ -0,0 +1,256 @@
+"""
+Structured logging that never blocks the event loop on I/O.
+
+Loggers hand records to a bounded in-memory queue; a background thread
+(`logging.handlers.QueueListener`) formats them as JSON lines and writes them
+out. When the queue is full the record is dropped and counted, rather than
+making a request wait for stdout. Every record carries the id of the request
+it was logged under (see RequestIdMiddleware), and high-volume debug loggers
+can be sampled down per logger.
+
+Modules log through `logging.getLogger(__name__)`; `configure_logging()` runs
+once at startup (app.main's startup hook, and the `__main__` of long-running
+workers) and `shutdown_logging()` at shutdown.
+"""
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import traceback
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import orjson
+from app.metrics.registry import registry
+
+# Level of the app's own loggers ("app.*"), and of everything else (libraries, uvicorn)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LIBRARY_LEVEL = os.getenv("LOG_LIBRARY_LEVEL", "INFO").upper()
+
+# "json" for collectors, "text" for reading in a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Records buffered between the app and the writer thread; beyond this they are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fraction of records kept per logger (prefix match, longest wins), e.g.
+# "app.auth=0.01,app.video.routes=0.1"; applies at LOG_SAMPLE_LEVEL and below
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_SAMPLE_LEVEL = os.getenv("LOG_SAMPLE_LEVEL", "DEBUG").upper()
+
+# Header carrying the request id in and out
+REQUEST_ID_HEADER = "x-request-id"
+
+# Incoming request ids are only trusted if they look like this
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+# (uvicorn's color_message duplicates the message with terminal escapes)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "color_message"}
+
+LOG_RECORDS_DROPPED = registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse "logger=rate,logger=rate" into a dict, ignoring malformed entries.
+    """
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the low-level records of chosen loggers. Records above
+    `max_level` always pass, so sampling never hides warnings or errors.
+    """
+
+    def __init__(self, rates: Dict[str, float], max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rates = rates
+        self.max_level = max_level
+        self._rate_by_logger: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rate_by_logger.get(name)
+        if rate is None:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._rate_by_logger[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamp records with the current request's id. Runs in the caller's thread,
+    where the request's context is visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueue without waiting: a full queue drops the record and counts it.
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the arguments may change after the
+        # call returns), but leave formatting and the write to the listener thread
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, request id, any
+    `extra=` fields, and the traceback if there was one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # At shutdown waiting is fine (and a full queue must not lose the stop signal)
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[QueueListener] = None
+_output: Optional[logging.Handler] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None, library_level: str = LOG_LIBRARY_LEVEL) -> None:
+    """
+    Route the root logger (and uvicorn's loggers) through the queue. Idempotent.
+    """
+    global _listener, _output
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES), logging.getLevelName(LOG_SAMPLE_LEVEL)))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(library_level)
+    logging.getLogger("app").setLevel(level)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        # uvicorn installs its own (synchronous) stream handlers; send its records through the queue too
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _output = output
+    _listener = _Listener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """
+    Write out the queued records and stop the writer thread. Records logged
+    afterwards are written directly, so nothing waits in a queue no one drains.
+    """
+    global _listener, _output
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().handlers = [_output]
+    _listener = _output = None
+
+
+class RequestIdMiddleware:
+    """
+    Give every HTTP request an id (the caller's X-Request-ID if it is sane, a
+    fresh one otherwise), expose it to logging, and return it in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
@@ -1,13 +1,41 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from app.auth.routes import router as auth_router  # Import the auth router
 from app.video.routes import router as video_router  # Import the video router
 from app.profile.routes import router as profile_router
 from app.live_stream.routes import router as live_stream_router
-import os
+from app.media.routes import router as media_router
+from app.gifts.routes import router as gifts_router
+from app.metrics.routes import router as metrics_router
+from app.metrics.middleware import MetricsMiddleware, METRICS_ENABLED
+from app.metrics.queries import install_query_tracking
+from app.log import configure_logging, shutdown_logging, RequestIdMiddleware
+from app.responses import ORJSONResponse
+from app.utils import UploadSizeLimitMiddleware, MAX_UPLOAD_BYTES, CHUNK_SIZE
+from app.video.counters import run_counter_flusher, flush_counters
+from app.video.view_events import run_view_flusher, flush_view_events
+from app.ranking.engine import run_ranking_refresher
+from app.auth.graph import run_follow_graph_sync
+from app.timeline.service import run_inbox_trimmer
+from app.live_stream.hub import live_hub
+from app.live_stream.registry import run_stream_registry_sync
+from app.gifts.ledger import gift_ledger_writer, run_gift_settlement
+from app.storage.blobs import run_media_gc
+import asyncio
+import logging
 
-app = FastAPI(title="TikTok Clone Backend", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="TikTok Clone Backend", version="1.0.0", default_response_class=ORJSONResponse)
+
+# Refuse oversized single-shot uploads before their body is spooled
+# (one chunk of slack covers the multipart framing and form fields). Added before
+# CORS so CORS wraps it and its 413s carry the CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=["/video/upload"],
+    max_bytes=MAX_UPLOAD_BYTES + CHUNK_SIZE,
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,33 +46,74 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Ensure the upload directory exists
-UPLOAD_DIR = "./uploads/videos"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Per-route latency, status and SQL accounting, exposed on /metrics
+# (added last so it is outermost and times everything else)
+if METRICS_ENABLED:
+    install_query_tracking()
+    app.add_middleware(MetricsMiddleware)
 
-# Mount the static file route to serve uploaded files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Correlate log records with the request that produced them (outermost, so every layer sees the id)
+app.add_middleware(RequestIdMiddleware)
 
 # Include routers
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(video_router, prefix="/video", tags=["video"])
 app.include_router(profile_router, prefix="/profile", tags=["profile"])
 app.include_router(live_stream_router, prefix="/live-stream", tags=["live_stream"])
+app.include_router(gifts_router, prefix="/gifts", tags=["gifts"])
+app.include_router(metrics_router, tags=["metrics"])
+# Serve uploaded files with Range/ETag support
+app.include_router(media_router, prefix="/uploads", tags=["media"])
 
 @app.get("/")
 def read_root():
     """Health check route."""
     return {"message": "Welcome to TikTok Clone Backend"}
 
-# Print all registered routes at startup
+# JSON logs through a queue drained by a background thread (see app.log);
+# registered first so the other startup hooks log through it
+@app.on_event("startup")
+async def start_logging():
+    configure_logging()
+
+# Log all registered routes at startup
 @app.on_event("startup")
-async def print_routes():
-    print("Registered Routes:")
+async def log_routes():
     for route in app.routes:
-        if hasattr(route, "methods"):  # Check if the route has HTTP methods
-            print(f"Path: {route.path}, Methods: {route.methods}")
-        else:
-            print(f"Path: {route.path}, Mounted App: {type(route.app).__name__}")
+        methods = sorted(getattr(route, "methods", None) or [])
+        logger.debug("Route %s %s", getattr(route, "path", type(route).__name__), methods)
+
+# Background tasks started with the app
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    background_tasks.append(asyncio.create_task(run_counter_flusher()))
+    background_tasks.append(asyncio.create_task(run_view_flusher()))
+    background_tasks.append(asyncio.create_task(run_ranking_refresher()))
+    background_tasks.append(asyncio.create_task(run_follow_graph_sync()))
+    background_tasks.append(asyncio.create_task(run_inbox_trimmer()))
+    background_tasks.append(asyncio.create_task(run_stream_registry_sync()))
+    background_tasks.append(asyncio.create_task(run_gift_settlement()))
+    background_tasks.append(asyncio.create_task(run_media_gc()))
+    await live_hub.start()
+    await gift_ledger_writer.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await live_hub.close()
+    await gift_ledger_writer.close()
+
+    # Write out any like/view deltas and view events still buffered in memory
+    await flush_counters()
+    await flush_view_events()
+
+    # Last, so everything logged while shutting down is written out
+    shutdown_logging()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,57 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+# Read size for servers without zero-copy support
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class MediaFileResponse(Response):
+    """
+    Send `length` bytes of a file starting at `offset`.
+
+    When the ASGI server offers the `http.response.zerocopysend` extension the
+    open file is handed to it and the kernel copies it straight to the socket
+    with sendfile(2). Otherwise the range is read in chunks in a worker thread.
+    """
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int = 200, headers=None,
+                 media_type: str = None, send_body: bool = True):
+        headers = dict(headers or {})
+        headers["content-length"] = str(length)
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            await run_in_threadpool(f.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await run_in_threadpool(f.close)
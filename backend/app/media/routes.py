@@ -0,0 +1,143 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import Response
+from app.media.responses import MediaFileResponse
+from app.utils import etag_matches
+
+router = APIRouter()
+
+# Root directory of served media and the subdirectories that are public
+MEDIA_ROOT = os.path.realpath("./uploads")
+PUBLIC_MEDIA_DIRS = ("videos", "media")
+
+# Media files never change once written (every upload gets a fresh name)
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _resolve_media_path(file_path: str) -> str:
+    """
+    Map a URL path to a file under one of the public media directories.
+    :raises HTTPException: 404 for anything outside them, including traversal attempts.
+    """
+    full_path = os.path.realpath(os.path.join(MEDIA_ROOT, file_path))
+    for directory in PUBLIC_MEDIA_DIRS:
+        if full_path.startswith(os.path.join(MEDIA_ROOT, directory) + os.sep):
+            return full_path
+    raise HTTPException(status_code=404, detail="File not found")
+
+
+def _etag_for(stat: os.stat_result) -> str:
+    """
+    Strong ETag for an immutable media file, derived from its size, mtime and inode.
+    """
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}-{stat.st_ino:x}"'
+
+
+def _not_modified_since(header: str, stat: os.stat_result) -> bool:
+    """
+    Check whether the file is unchanged since an If-Modified-Since date.
+    """
+    try:
+        return int(stat.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `bytes=` header into an inclusive (start, end) pair.
+    :return: None when the header should be ignored and the whole file sent
+             (malformed or multiple ranges).
+    :raises HTTPException: 416 if the range lies outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError
+            first, last = max(size - length, 0), size - 1
+        else:
+            first = int(start)
+            if end:
+                last = int(end)
+                if last < first:
+                    return None
+                last = min(last, size - 1)
+            else:
+                last = size - 1
+    except ValueError:
+        return None
+
+    if first >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return first, last
+
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_media(file_path: str, request: Request):
+    """
+    Serve an uploaded media file with Range, ETag and conditional GET support.
+    """
+    full_path = _resolve_media_path(file_path)
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = _etag_for(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    # Conditional GET: If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and _not_modified_since(if_modified_since, stat)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    send_body = request.method != "HEAD"
+    size = stat.st_size
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        # If-Range: only honour the range if the client's copy is still current
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range.strip() == etag:
+            byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        return MediaFileResponse(full_path, 0, size, headers=headers, media_type=media_type, send_body=send_body)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return MediaFileResponse(
+        full_path,
+        start,
+        end - start + 1,
+        status_code=206,
+        headers=headers,
+        media_type=media_type,
+        send_body=send_body,
+    )
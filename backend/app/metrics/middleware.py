@@ -0,0 +1,116 @@
+import logging
+import os
+import time
+from typing import Optional
+from app.metrics.registry import registry
+from app.metrics.queries import N_PLUS_ONE_THRESHOLD, start_request, end_request, truncate_statement
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to serve without request metrics and SQL accounting
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Label of requests that matched no route (kept as one series so scanners cannot add unbounded labels)
+UNMATCHED_ROUTE = "unmatched"
+
+# Methods labelled as themselves; any other method is counted as OTHER_METHOD
+STANDARD_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "DELETE", "CONNECT", "OPTIONS", "TRACE", "PATCH"})
+OTHER_METHOD = "OTHER"
+
+# How many distinct N+1 statements are logged; later ones are only counted
+MAX_N_PLUS_ONE_REPORTS = 100
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+REQUEST_DURATION = registry.histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+IN_PROGRESS = registry.gauge("http_requests_in_progress", "HTTP requests being served", ["method"])
+DB_QUERIES = registry.counter("db_queries_total", "SQL statements executed while serving requests", ["route"])
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements per request", ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = registry.histogram("db_time_seconds", "Time spent in SQL per request", ["route"])
+N_PLUS_ONE = registry.counter(
+    "db_n_plus_one_total", "Requests that executed one statement N_PLUS_ONE_THRESHOLD times or more", ["route"],
+)
+
+_reported_n_plus_one = set()
+
+
+def route_template(scope) -> str:
+    """
+    The matched route's path template (e.g. /video/comments/{video_id}), so metrics
+    group by endpoint rather than by id. Routes of included routers may carry only
+    their own part of the path; the prefix is recovered from the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return UNMATCHED_ROUTE
+    rendered = template
+    for name, value in scope.get("path_params", {}).items():
+        rendered = rendered.replace("{" + name + "}", str(value))
+    path = scope["path"]
+    if rendered != path and path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + template
+    return template
+
+
+def _report_n_plus_one(method: str, route: str, statement: str, executions: int) -> None:
+    N_PLUS_ONE.labels(route).inc()
+    key = (method, route, statement)
+    if key in _reported_n_plus_one or len(_reported_n_plus_one) >= MAX_N_PLUS_ONE_REPORTS:
+        return
+    _reported_n_plus_one.add(key)
+    logger.warning(
+        "Possible N+1 query in %s %s: %d executions of %s", method, route, executions, truncate_statement(statement),
+    )
+
+
+class MetricsMiddleware:
+    """
+    Time each HTTP request, count it by route and status, and account the SQL it
+    executed. Pure ASGI, so streamed responses are timed to their last byte.
+    """
+
+    def __init__(self, app, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in STANDARD_METHODS else OTHER_METHOD
+        status: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        token = start_request()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            queries = end_request(token)
+            in_progress.dec()
+            self._record(scope, method, status or 500, elapsed, queries)
+
+    def _record(self, scope, method: str, status: int, elapsed: float, queries) -> None:
+        route = route_template(scope)
+        REQUESTS.labels(method, route, str(status)).inc()
+        REQUEST_DURATION.labels(method, route).observe(elapsed)
+        DB_QUERIES.labels(route).inc(queries.count)
+        DB_QUERIES_PER_REQUEST.labels(route).observe(queries.count)
+        DB_TIME.labels(route).observe(queries.seconds)
+        repeated = queries.most_repeated()
+        if repeated is not None and repeated[1] >= self.n_plus_one_threshold:
+            _report_n_plus_one(method, route, *repeated)
@@ -0,0 +1,104 @@
+"""
+SQL accounting per request. Engine events count every statement and its time
+against the request that issued it (found through a context variable, which
+also reaches `run_sync` and threadpool code) and tally repeats of the same
+statement text, the signature of an N+1 query pattern.
+"""
+import contextvars
+import os
+import time
+from collections import Counter
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# A statement executed this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Longest statement text kept in an N+1 report
+MAX_REPORTED_STATEMENT = 300
+
+
+class QueryStats:
+    """
+    The statements one request has executed so far.
+    """
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def most_repeated(self) -> Optional[tuple]:
+        """
+        :return: `(statement, executions)` of the most repeated statement, or None.
+        """
+        common = self.statements.most_common(1)
+        return common[0] if common else None
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def start_request() -> contextvars.Token:
+    """
+    Start counting queries for the current request.
+    :return: A token for `end_request`.
+    """
+    return _current.set(QueryStats())
+
+
+def end_request(token: contextvars.Token) -> QueryStats:
+    stats = _current.get()
+    _current.reset(token)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started")
+    if started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+_installed = False
+
+
+def install_query_tracking() -> None:
+    """
+    Listen on every engine (sync, and the sync core of the async one). Idempotent.
+    """
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _installed = True
+
+
+def truncate_statement(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > MAX_REPORTED_STATEMENT:
+        return statement[:MAX_REPORTED_STATEMENT] + "..."
+    return statement
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+from app.metrics.registry import registry
+
+router = APIRouter()
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Request, latency and SQL metrics for Prometheus to scrape.
+    Rendered on the event loop, where the metrics are updated, so no update
+    changes a metric while it is being read.
+    """
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
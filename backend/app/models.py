@@ -0,0 +1,12 @@
+# Import every model module so string relationship targets (e.g. "app.live_stream.models.LiveStream")
+# resolve in scripts and jobs that do not go through app.main.
+import app.auth.models  # noqa: F401
+import app.video.models  # noqa: F401
+import app.live_stream.models  # noqa: F401
+import app.profile.models  # noqa: F401
+import app.timeline.models  # noqa: F401
+import app.gifts.models  # noqa: F401
+import app.jobs.models  # noqa: F401
+import app.storage.models  # noqa: F401
+import app.search.models  # noqa: F401
+import app.search.index  # noqa: F401  (keeps the fallback search index in step on flush)
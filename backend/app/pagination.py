@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _encode(value) -> str:
+    raw = json.dumps(value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """
+    Encode the sort key of the last item on a page into an opaque cursor.
+    :param created_at: The `created_at` value of the last item.
+    :param item_id: The `id` of the last item (tie-breaker for equal timestamps).
+    :return: A URL-safe cursor string.
+    """
+    return _encode([created_at.isoformat(), item_id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+    :param cursor: The opaque cursor string sent by the client.
+    :return: The `(created_at, id)` pair it encodes.
+    :raises HTTPException: If the cursor is malformed.
+    """
+    try:
+        created_at, item_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_score_cursor(score: int, item_id: int) -> str:
+    """
+    Encode the sort key of the last item on a page ranked by score (e.g. search results).
+    :param score: The integer score of the last item.
+    :param item_id: The `id` of the last item (tie-breaker for equal scores).
+    """
+    return _encode({"s": score, "i": item_id})
+
+
+def decode_score_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Decode a cursor produced by `encode_score_cursor`.
+    :return: The `(score, id)` pair it encodes.
+    :raises HTTPException: If the cursor is malformed.
+    """
+    try:
+        payload = _decode(cursor)
+        return int(payload["s"]), int(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_offset_cursor(version: int, offset: int) -> str:
+    """
+    Encode a position in a precomputed list (e.g. a ranked feed) into an opaque cursor.
+    :param version: Identifies the list the offset refers to.
+    :param offset: Index of the first item of the next page.
+    """
+    return _encode({"v": version, "o": offset})
+
+
+def decode_offset_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    """
+    Decode a cursor produced by `encode_offset_cursor`.
+    :return: The `(version, offset)` pair, or None if the cursor is not an offset cursor.
+    """
+    try:
+        payload = _decode(cursor)
+        return int(payload["v"]), max(int(payload["o"]), 0)
+    except Exception:
+        return None
+
+
+def encode_source_cursor(source: str, cursor: str) -> str:
+    """
+    Tag a cursor with the source that produced it, for feeds paged from more than
+    one (e.g. a ranked list, or the newest videos while no ranking is available).
+    :param source: Names the source, so the next page continues from it.
+    :param cursor: The source's own cursor.
+    """
+    return _encode({"src": source, "c": cursor})
+
+
+def decode_source_cursor(cursor: str) -> Optional[Tuple[str, str]]:
+    """
+    Decode a cursor produced by `encode_source_cursor`.
+    :return: The `(source, cursor)` pair, or None if the cursor is not tagged.
+    """
+    try:
+        payload = _decode(cursor)
+        return str(payload["src"]), str(payload["c"])
+    except Exception:
+        return None
+
+
+def after_cursor(query, created_col, id_col, cursor: Optional[str] = None):
+    """
+    Order a query or select statement newest-first on `(created_col, id_col)`
+    and, when a cursor is given, restrict it to rows strictly after the encoded
+    position.
+    """
+    query = query.order_by(created_col.desc(), id_col.desc())
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_col, id_col) < tuple_(created_at, item_id))
+    return query
+
+
+async def keyset_page(db: AsyncSession, stmt, created_col, id_col, cursor: Optional[str] = None,
+                      limit: int = 10, skip: int = 0, scalars: bool = True):
+    """
+    Page a select statement newest-first on `(created_col, id_col)`.
+
+    With a cursor, the page starts strictly after the encoded position, so the
+    database seeks straight to it through the composite index instead of
+    scanning and discarding `skip` rows. Without one, `skip` is honoured for
+    older clients. Rows are returned together with the cursor for the next page
+    (None when there are no more rows). Pass `scalars=False` when `stmt` selects
+    columns rather than a single entity.
+    """
+    stmt = after_cursor(stmt, created_col, id_col, cursor)
+    if not cursor and skip:
+        stmt = stmt.offset(skip)
+
+    # Fetch one extra row to know whether another page exists
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = result.scalars().all() if scalars else result.all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from app.database import Base
+
+class UserStats(Base):
+    """
+    Denormalized per-user counters shown on the profile page.
+    Kept up to date by the write paths and repaired by `reconcile_user_stats`.
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    video_count = Column(Integer, nullable=False, default=0)
+    like_count = Column(Integer, nullable=False, default=0)  # Likes received on the user's videos
+    view_count = Column(Integer, nullable=False, default=0)  # Views received on the user's videos
+    comment_count = Column(Integer, nullable=False, default=0)  # Comments received on the user's videos
+    followers_count = Column(Integer, nullable=False, default=0)
+    following_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """
+        Convert the UserStats object to the profile "stats" dictionary.
+        """
+        return {
+            "totalVideos": self.video_count,
+            "totalLikes": self.like_count,
+            "totalViews": self.view_count,
+            "totalComments": self.comment_count,
+        }
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
-from app.database import get_db
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.auth.dependencies import get_current_user
-from app.video.models import Video, Comment
-from app.auth.models import User, followers
+from app.video.models import Video, VIDEO_PAYLOAD_COLUMNS, video_payload
+from app.profile.stats import get_user_stats
+from app.video.counters import counter_buffer
+from app.responses import ORJSONResponse
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.get("/")
 async def get_profile_data(
-    db: Session = Depends(get_db),  
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
@@ -19,65 +24,39 @@ async def get_profile_data(
     """
     try:
         # Fetch the user's videos
-        videos = (
-            db.query(Video)
-            .filter(Video.uploader_id == current_user.id)
+        result = await db.execute(
+            select(*VIDEO_PAYLOAD_COLUMNS)
+            .where(Video.uploader_id == current_user.id)
             .order_by(Video.created_at.desc())
-            .all()
-        )
-
-        # Calculate user stats
-        total_videos = db.query(Video).filter(Video.uploader_id == current_user.id).count()
-        total_likes = db.query(func.sum(Video.likes)).filter(Video.uploader_id == current_user.id).scalar() or 0
-        total_views = db.query(func.sum(Video.views)).filter(Video.uploader_id == current_user.id).scalar() or 0
-        total_comments = (
-            db.query(func.count(Comment.id))
-            .join(Video, Video.id == Comment.video_id)
-            .filter(Video.uploader_id == current_user.id)
-            .scalar() or 0
         )
+        rows = result.all()
 
-        # Count followers and following using SQL
-        followers_count = (
-            db.query(User)
-            .join(followers, followers.c.followed_id == User.id)
-            .filter(followers.c.follower_id == current_user.id)
-            .count()
-        )
-        following_count = (
-            db.query(User)
-            .join(followers, followers.c.follower_id == User.id)
-            .filter(followers.c.followed_id == current_user.id)
-            .count()
-        )
+        # Counters are maintained on write, so this is a single primary-key read
+        stats = await db.run_sync(get_user_stats, current_user.id)
+        await db.commit()
 
-        return {
+        return ORJSONResponse({
             "user": {
                 "id": current_user.id,
                 "username": current_user.username,
                 "email": current_user.email,
-                "followersCount": followers_count,
-                "followingCount": following_count,
+                "followersCount": stats.followers_count,
+                "followingCount": stats.following_count,
             },
-            "videos": [video.to_dict() for video in videos],
-            "stats": {
-                "totalVideos": total_videos,
-                "totalLikes": total_likes,
-                "totalViews": total_views,
-                "totalComments": total_comments,
-            },
-        }
-    except Exception as e:
-        print(f"Error fetching profile data: {e}")
+            "videos": [counter_buffer.merge(video_payload(row)) for row in rows],
+            "stats": stats.to_dict(),
+        })
+    except Exception:
+        logger.exception("Error fetching profile data")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @router.get("/{user_id}")
 async def get_user_videos(
     user_id: int,
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 10,
+    db: AsyncSession = Depends(get_async_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=50),
     current_user=Depends(get_current_user),
 ):
     """
@@ -88,34 +67,23 @@ async def get_user_videos(
 
     try:
         # Fetch videos for the user
-        videos = (
-            db.query(Video)
-            .filter(Video.uploader_id == user_id)
+        result = await db.execute(
+            select(*VIDEO_PAYLOAD_COLUMNS)
+            .where(Video.uploader_id == user_id)
             .order_by(Video.created_at.desc())
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        rows = result.all()
 
         # Analytics
-        total_videos = db.query(Video).filter(Video.uploader_id == user_id).count()
-        total_likes = db.query(func.sum(Video.likes)).filter(Video.uploader_id == user_id).scalar() or 0
-        total_views = db.query(func.sum(Video.views)).filter(Video.uploader_id == user_id).scalar() or 0
-        total_comments = (
-            db.query(func.count(Comment.id))
-            .join(Video, Video.id == Comment.video_id)
-            .filter(Video.uploader_id == user_id)
-            .scalar() or 0
-        )
+        stats = await db.run_sync(get_user_stats, user_id)
+        await db.commit()
+        analytics = stats.to_dict()
 
-        analytics = {
-            "totalVideos": total_videos,
-            "totalLikes": total_likes,
-            "totalViews": total_views,
-            "totalComments": total_comments,
-        }
-
-        return {"videos": [video.to_dict() for video in videos], "analytics": analytics}
-    except Exception as e:
-        print(f"Error fetching user videos: {e}")
+        return ORJSONResponse(
+            {"videos": [counter_buffer.merge(video_payload(row)) for row in rows], "analytics": analytics}
+        )
+    except Exception:
+        logger.exception("Error fetching user videos")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,167 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.auth.models import User, followers
+from app.video.models import Video, Comment
+from app.profile.models import UserStats
+
+STAT_FIELDS = (
+    "video_count",
+    "like_count",
+    "view_count",
+    "comment_count",
+    "followers_count",
+    "following_count",
+)
+
+
+def compute_stats(db: Session, user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Aggregate the true counters for a batch of users from the source tables.
+    :param user_ids: The users to aggregate.
+    :return: A mapping of user id to a dictionary of `STAT_FIELDS`.
+    """
+    user_ids = list(user_ids)
+    stats = {uid: dict.fromkeys(STAT_FIELDS, 0) for uid in user_ids}
+    if not user_ids:
+        return stats
+
+    video_rows = (
+        db.query(
+            Video.uploader_id,
+            func.count(Video.id),
+            func.coalesce(func.sum(Video.likes), 0),
+            func.coalesce(func.sum(Video.views), 0),
+        )
+        .filter(Video.uploader_id.in_(user_ids))
+        .group_by(Video.uploader_id)
+        .all()
+    )
+    for uid, video_count, like_count, view_count in video_rows:
+        stats[uid].update(video_count=video_count, like_count=like_count, view_count=view_count)
+
+    comment_rows = (
+        db.query(Video.uploader_id, func.count(Comment.id))
+        .join(Comment, Comment.video_id == Video.id)
+        .filter(Video.uploader_id.in_(user_ids))
+        .group_by(Video.uploader_id)
+        .all()
+    )
+    for uid, comment_count in comment_rows:
+        stats[uid]["comment_count"] = comment_count
+
+    followers_rows = (
+        db.query(followers.c.followed_id, func.count())
+        .filter(followers.c.followed_id.in_(user_ids))
+        .group_by(followers.c.followed_id)
+        .all()
+    )
+    for uid, count in followers_rows:
+        stats[uid]["followers_count"] = count
+
+    following_rows = (
+        db.query(followers.c.follower_id, func.count())
+        .filter(followers.c.follower_id.in_(user_ids))
+        .group_by(followers.c.follower_id)
+        .all()
+    )
+    for uid, count in following_rows:
+        stats[uid]["following_count"] = count
+
+    return stats
+
+
+def bump_stats(db: Session, user_id: int, **deltas: int) -> None:
+    """
+    Atomically add deltas to a user's counters, e.g. `bump_stats(db, uid, like_count=1)`.
+    Runs inside the caller's transaction, so the counters commit or roll back with
+    the change that caused them. Pending changes must be flushed first: a missing
+    row is created from the source tables, which then already include them.
+    """
+    values = {
+        getattr(UserStats, field): getattr(UserStats, field) + delta
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not values:
+        return
+    values[UserStats.updated_at] = datetime.utcnow()
+
+    updated = (
+        db.query(UserStats)
+        .filter(UserStats.user_id == user_id)
+        .update(values, synchronize_session=False)
+    )
+    if updated:
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(UserStats(user_id=user_id, **compute_stats(db, [user_id])[user_id]))
+    except IntegrityError:
+        # Another transaction created the row first; apply the deltas to it
+        db.query(UserStats).filter(UserStats.user_id == user_id).update(values, synchronize_session=False)
+
+
+def get_user_stats(db: Session, user_id: int) -> UserStats:
+    """
+    Read a user's counters with a single primary-key lookup, creating the row if needed.
+    The caller must commit in case the row was created.
+    """
+    stats = db.get(UserStats, user_id)
+    if stats is None:
+        reconcile_user_stats(db, [user_id])
+        stats = db.get(UserStats, user_id)
+    return stats
+
+
+def reconcile_user_stats(db: Session, user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute counters from the source tables and repair any rows that drifted.
+    :param user_ids: The users to check; all users when omitted.
+    :param batch_size: How many users to aggregate per round of queries.
+    :return: The number of rows created or corrected. The caller must commit.
+    """
+    if user_ids is None:
+        user_ids = [uid for (uid,) in db.query(User.id).order_by(User.id).all()]
+    user_ids = list(user_ids)
+
+    repaired = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        # Lock the rows before aggregating so concurrent bumps queue behind the repair
+        existing = {
+            row.user_id: row
+            for row in db.query(UserStats).filter(UserStats.user_id.in_(batch)).with_for_update().all()
+        }
+        expected = compute_stats(db, batch)
+        for uid, values in expected.items():
+            row = existing.get(uid)
+            if row is None:
+                db.add(UserStats(user_id=uid, **values))
+                repaired += 1
+            elif any(getattr(row, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(row, field, value)
+                repaired += 1
+        db.flush()
+    return repaired
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    import app.models  # noqa: F401
+
+    db = SessionLocal()
+    try:
+        all_ids = [uid for (uid,) in db.query(User.id).order_by(User.id).all()]
+        repaired = 0
+        for start in range(0, len(all_ids), 1000):
+            # Commit per batch so row locks are held briefly
+            repaired += reconcile_user_stats(db, all_ids[start:start + 1000])
+            db.commit()
+        print(f"Reconciled user stats: {repaired} rows repaired")
+    finally:
+        db.close()
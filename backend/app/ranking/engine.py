@@ -0,0 +1,336 @@
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.auth.graph import follow_graph
+from app.auth.models import followers
+from app.database import AsyncSessionLocal
+from app.pagination import encode_offset_cursor, decode_offset_cursor, decode_source_cursor
+from app.video.models import Video
+from app.utils import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# How many of the newest videos are considered, and how often (seconds) the pool is rebuilt
+RANKING_POOL_SIZE = int(os.getenv("RANKING_POOL_SIZE", "5000"))
+RANKING_REFRESH_INTERVAL = float(os.getenv("RANKING_REFRESH_INTERVAL", "60"))
+
+# Length of each cached ranked list, how many users' lists are kept, and how many
+# served videos are remembered per user so rebuilt lists skip them
+RANKED_LIST_LENGTH = int(os.getenv("RANKED_LIST_LENGTH", "500"))
+RANKED_CACHE_SIZE = int(os.getenv("RANKED_CACHE_SIZE", "10000"))
+SEEN_HISTORY_SIZE = int(os.getenv("RANKING_SEEN_HISTORY", "1000"))
+
+# Anonymous ranked lists kept after a pool refresh replaces them, so cursors into
+# them keep paging through the list they started (one per refresh interval)
+ANONYMOUS_LIST_HISTORY = int(os.getenv("RANKING_ANONYMOUS_HISTORY", "10"))
+
+# Where a For You page came from; its cursor records which, so the next page continues there
+RANKED_SOURCE = "ranked"
+RECENT_SOURCE = "recent"
+
+# Scoring weights: engagement is log-damped, freshness decays with log(age in hours)
+LIKE_WEIGHT = 1.0
+VIEW_WEIGHT = 0.25
+COMMENT_WEIGHT = 1.5
+AGE_GRAVITY = 1.2
+FOLLOWED_UPLOADER_BOOST = 2.0
+
+
+@dataclass
+class CandidatePool:
+    """
+    Snapshot of the rankable videos as parallel NumPy arrays.
+    `base_scores` holds the user-independent part of each video's score.
+    """
+    version: int
+    ids: np.ndarray           # int64
+    uploader_ids: np.ndarray  # int64
+    age_hours: np.ndarray     # float32
+    likes: np.ndarray         # float32
+    views: np.ndarray         # float32
+    comments: np.ndarray      # float32
+    base_scores: np.ndarray   # float32
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+@dataclass
+class RankedList:
+    """
+    One user's ranking against one pool version. `list_id` is unique per
+    computed list, so a cursor can tell whether it still points into it.
+    """
+    list_id: int
+    pool_version: int
+    video_ids: np.ndarray
+
+
+def base_scores(likes: np.ndarray, views: np.ndarray, comments: np.ndarray, age_hours: np.ndarray) -> np.ndarray:
+    """
+    User-independent score of every candidate, computed in one vectorized pass.
+    """
+    engagement = LIKE_WEIGHT * np.log1p(likes) + VIEW_WEIGHT * np.log1p(views) + COMMENT_WEIGHT * np.log1p(comments)
+    return (engagement - AGE_GRAVITY * np.log1p(age_hours)).astype(np.float32)
+
+
+class RankingEngine:
+    """
+    Ranks the "For You" feed against an in-memory candidate pool.
+    Each user is scored once per pool version; pages are then sliced out of the
+    cached ranked list, so a page costs a dict lookup rather than a query.
+    """
+
+    def __init__(
+        self,
+        list_length: int = RANKED_LIST_LENGTH,
+        cache_size: int = RANKED_CACHE_SIZE,
+        seen_history: int = SEEN_HISTORY_SIZE,
+        anonymous_history: int = ANONYMOUS_LIST_HISTORY,
+    ):
+        self.list_length = list_length
+        self.cache_size = cache_size
+        self.seen_history = seen_history
+        self.anonymous_history = anonymous_history
+        self._pool: Optional[CandidatePool] = None
+        self._ranked: "OrderedDict[Optional[int], RankedList]" = OrderedDict()
+        self._anonymous_lists: "OrderedDict[int, RankedList]" = OrderedDict()
+        self._seen: "OrderedDict[int, OrderedDict[int, None]]" = OrderedDict()
+        self._list_ids = itertools.count(1)
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        pool = self._pool
+        return pool is not None and len(pool) > 0
+
+    def set_pool(
+        self,
+        ids: Iterable[int],
+        uploader_ids: Iterable[int],
+        age_hours: Iterable[float],
+        likes: Iterable[int],
+        views: Iterable[int],
+        comments: Iterable[int],
+    ) -> CandidatePool:
+        """
+        Swap in a new candidate pool; every cached ranking is dropped with the old one.
+        """
+        arrays = {
+            "ids": np.asarray(ids, dtype=np.int64),
+            "uploader_ids": np.asarray(uploader_ids, dtype=np.int64),
+            "age_hours": np.maximum(np.asarray(age_hours, dtype=np.float32), 0),
+            "likes": np.maximum(np.asarray(likes, dtype=np.float32), 0),
+            "views": np.maximum(np.asarray(views, dtype=np.float32), 0),
+            "comments": np.asarray(comments, dtype=np.float32),
+        }
+        pool = CandidatePool(
+            version=next(self._versions),
+            base_scores=base_scores(arrays["likes"], arrays["views"], arrays["comments"], arrays["age_hours"]),
+            **arrays,
+        )
+        with self._lock:
+            self._pool = pool
+            self._ranked.clear()
+        return pool
+
+    def cached(self, user_id: Optional[int]) -> Optional[RankedList]:
+        """
+        The user's ranked list for the current pool, or None if it must be computed.
+        """
+        with self._lock:
+            ranked = self._ranked.get(user_id)
+            if ranked is None or self._pool is None or ranked.pool_version != self._pool.version:
+                return None
+            self._ranked.move_to_end(user_id)
+            return ranked
+
+    def rank(self, user_id: Optional[int], followed_ids: Iterable[int] = ()) -> RankedList:
+        """
+        Score every candidate for one user and keep the top `list_length`, best first.
+        Videos by followed uploaders are boosted and videos already served are excluded.
+        """
+        pool = self._pool
+        if pool is None:
+            raise RuntimeError("Candidate pool has not been loaded")
+
+        scores = pool.base_scores.copy()
+        followed = np.fromiter(followed_ids, dtype=np.int64)
+        if followed.size:
+            scores += FOLLOWED_UPLOADER_BOOST * np.isin(pool.uploader_ids, followed)
+        seen = self._seen_ids(user_id)
+        if seen.size:
+            scores[np.isin(pool.ids, seen)] = -np.inf
+
+        k = min(self.list_length, len(scores))
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top])]
+
+        ranked = RankedList(next(self._list_ids), pool.version, pool.ids[top])
+        with self._lock:
+            self._ranked[user_id] = ranked
+            self._ranked.move_to_end(user_id)
+            while len(self._ranked) > self.cache_size:
+                self._ranked.popitem(last=False)
+            if user_id is None:
+                self._anonymous_lists[ranked.list_id] = ranked
+                while len(self._anonymous_lists) > self.anonymous_history:
+                    self._anonymous_lists.popitem(last=False)
+        return ranked
+
+    def anonymous_list(self, list_id: int) -> Optional[RankedList]:
+        """
+        A recent anonymous ranked list, even if a pool refresh has replaced it.
+        """
+        with self._lock:
+            return self._anonymous_lists.get(list_id)
+
+    def mark_seen(self, user_id: Optional[int], video_ids: Iterable[int]) -> None:
+        """
+        Remember videos served to a user so the next ranking leaves them out.
+        """
+        if user_id is None:
+            return
+        with self._lock:
+            seen = self._seen.get(user_id)
+            if seen is None:
+                seen = self._seen[user_id] = OrderedDict()
+            self._seen.move_to_end(user_id)
+            for video_id in video_ids:
+                seen[video_id] = None
+                seen.move_to_end(video_id)
+            while len(seen) > self.seen_history:
+                seen.popitem(last=False)
+            while len(self._seen) > self.cache_size:
+                self._seen.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pool = self._pool
+            return {
+                "pool_version": pool.version if pool else None,
+                "pool_size": len(pool) if pool else 0,
+                "cached_rankings": len(self._ranked),
+            }
+
+    def _seen_ids(self, user_id: Optional[int]) -> np.ndarray:
+        with self._lock:
+            seen = self._seen.get(user_id) if user_id is not None else None
+            return np.fromiter(seen or (), dtype=np.int64)
+
+
+ranking_engine = RankingEngine()
+
+
+def load_candidate_pool(db: Session, engine: RankingEngine = ranking_engine, pool_size: int = RANKING_POOL_SIZE) -> CandidatePool:
+    """
+    Read the newest `pool_size` videos with their engagement counters and
+    install them as the engine's candidate pool.
+    """
+    rows = db.execute(
+        select(Video.id, Video.uploader_id, Video.created_at, Video.likes, Video.views, Video.comment_count)
+        .order_by(Video.created_at.desc(), Video.id.desc())
+        .limit(pool_size)
+    ).all()
+
+    now = datetime.utcnow()
+    return engine.set_pool(
+        ids=[row.id for row in rows],
+        uploader_ids=[row.uploader_id or 0 for row in rows],
+        age_hours=[(now - row.created_at).total_seconds() / 3600 if row.created_at else 0 for row in rows],
+        likes=[row.likes or 0 for row in rows],
+        views=[row.views or 0 for row in rows],
+        comments=[row.comment_count or 0 for row in rows],
+    )
+
+
+async def refresh_candidate_pool(engine: RankingEngine = ranking_engine) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(load_candidate_pool, engine)
+
+
+async def run_ranking_refresher(interval: float = RANKING_REFRESH_INTERVAL) -> None:
+    """
+    Background task that loads the candidate pool at startup and rebuilds it every `interval` seconds.
+    """
+    try:
+        await refresh_candidate_pool()
+    except Exception:
+        logger.exception("Error loading ranking candidate pool")
+    await run_periodically(refresh_candidate_pool, interval, "ranking pool refresher")
+
+
+def parse_for_you_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Split a For You cursor into the source that produced it and that source's own
+    cursor. Untagged cursors (from before sources were recorded) are told apart by shape.
+    :return: `(source, cursor)`, or `(None, None)` for the first page.
+    """
+    if not cursor:
+        return None, None
+    tagged = decode_source_cursor(cursor)
+    if tagged is not None:
+        return tagged
+    return (RANKED_SOURCE if decode_offset_cursor(cursor) is not None else RECENT_SOURCE), cursor
+
+
+async def for_you_page(
+    db: AsyncSession,
+    user_id: Optional[int],
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    skip: int = 0,
+    engine: RankingEngine = ranking_engine,
+) -> Optional[Tuple[List[int], Optional[str]]]:
+    """
+    Ids of the next page of a user's ranked "For You" feed (`user_id` None for anonymous).
+    :param skip: Where to start in the ranked list when no cursor is given.
+    :return: `(video_ids, next_cursor)`, or None while no candidate pool is loaded.
+    """
+    if not engine.ready:
+        return None
+
+    ranked = engine.cached(user_id)
+    if ranked is None:
+        followed_ids = []
+        if user_id is not None and follow_graph.ready:
+            followed_ids = follow_graph.following(user_id)
+        elif user_id is not None:
+            followed_ids = (
+                await db.execute(select(followers.c.followed_id).where(followers.c.follower_id == user_id))
+            ).scalars().all()
+        ranked = engine.rank(user_id, followed_ids)
+
+    offset = max(skip, 0)
+    position = decode_offset_cursor(cursor) if cursor else None
+    if position is not None:
+        list_id, offset = position
+        if list_id != ranked.list_id:
+            # Anonymous lists are the same for everyone, so keep paging the one the
+            # cursor started in. A signed-in user's rebuilt list already leaves out
+            # what they were served, so it starts from the top.
+            previous = engine.anonymous_list(list_id) if user_id is None else None
+            if previous is not None:
+                ranked = previous
+            else:
+                offset = 0
+
+    page = ranked.video_ids[offset:offset + limit].tolist()
+    engine.mark_seen(user_id, page)
+    next_offset = offset + len(page)
+    next_cursor = encode_offset_cursor(ranked.list_id, next_offset) if page and next_offset < len(ranked.video_ids) else None
+    return page, next_cursor
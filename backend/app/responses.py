@@ -0,0 +1,27 @@
+from typing import Any
+import orjson
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize a response body with orjson. Datetimes, dataclasses and numpy values
+    are encoded natively; anything else falls back to FastAPI's encoder.
+    """
+    return orjson.dumps(
+        content,
+        default=jsonable_encoder,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Returning one directly from a handler
+    also skips FastAPI's `jsonable_encoder` pass over the content.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,286 @@
+"""
+Full-text search over videos (title, description) and users (username).
+
+On Postgres, queries run against the trigger-maintained `search_vector` columns
+through their GIN indexes (see app.search.models). Elsewhere (SQLite test runs)
+they run against the `search_postings` inverted index, which this module keeps
+in step with every flush of a Video or User.
+
+Results are ranked, the last query word matches as a prefix (typeahead), and
+pages are keyset-paginated on (score, id).
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import BigInteger, cast, delete, event, func, insert, inspect, literal_column, select, tuple_
+from sqlalchemy.orm import Session, aliased
+from app.auth.models import User
+from app.video.models import Video
+from app.search.models import SearchPosting, SEARCH_TEXT_CONFIG, VIDEO_DOC, USER_DOC
+
+# Words of a query beyond this many are ignored
+MAX_QUERY_TERMS = 8
+
+# Longest indexed term; longer words are truncated
+MAX_TERM_LENGTH = 64
+
+# Fallback index: a prefix matches at most this many distinct terms, and word
+# frequencies are only counted this far when ordering the join
+MAX_PREFIX_EXPANSIONS = 50
+DF_SAMPLE_LIMIT = 10000
+
+# Fallback index: per-field weights (a title word counts four times a description word)
+FIELD_WEIGHTS = {
+    VIDEO_DOC: {"title": 4, "description": 1},
+    USER_DOC: {"username": 4},
+}
+
+# Postgres ranks are floats; they are scaled to integers so cursors compare exactly
+RANK_SCALE = 1_000_000
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text into lowercase words, treating punctuation and underscores as separators.
+    """
+    if not text:
+        return []
+    return [word[:MAX_TERM_LENGTH] for word in _WORD.findall(unicodedata.normalize("NFKC", text).lower())]
+
+
+def _doc_type(obj) -> Optional[str]:
+    if isinstance(obj, Video):
+        return VIDEO_DOC
+    if isinstance(obj, User):
+        return USER_DOC
+    return None
+
+
+def postings_for(doc_type: str, fields: Dict[str, Optional[str]]) -> Dict[str, int]:
+    """
+    Weighted term frequencies of one document.
+    """
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS[doc_type].items():
+        for term in tokenize(fields.get(field)):
+            weights[term] += weight
+    return weights
+
+
+def _uses_postgres_search(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+@event.listens_for(Session, "after_flush")
+def _update_postings(session: Session, flush_context) -> None:
+    """
+    Reindex videos and users inserted, deleted or retitled in this flush, in the same transaction.
+    """
+    if _uses_postgres_search(session):
+        return
+
+    stale, fresh = [], []
+    changes = [(obj, "new") for obj in session.new]
+    changes += [(obj, "dirty") for obj in session.dirty]
+    changes += [(obj, "deleted") for obj in session.deleted]
+    for obj, change in changes:
+        doc_type = _doc_type(obj)
+        if doc_type is None:
+            continue
+        fields = FIELD_WEIGHTS[doc_type]
+        if change == "dirty" and not any(inspect(obj).attrs[field].history.has_changes() for field in fields):
+            continue
+        stale.append((doc_type, obj.id))
+        if change != "deleted":
+            postings = postings_for(doc_type, {field: getattr(obj, field) for field in fields})
+            fresh.extend(
+                {"doc_type": doc_type, "term": term, "doc_id": obj.id, "weight": weight}
+                for term, weight in postings.items()
+            )
+
+    connection = session.connection()
+    if stale:
+        connection.execute(
+            delete(SearchPosting).where(tuple_(SearchPosting.doc_type, SearchPosting.doc_id).in_(stale))
+        )
+    if fresh:
+        connection.execute(insert(SearchPosting), fresh)
+
+
+def rebuild_postings(db: Session, batch_size: int = 5000) -> int:
+    """
+    Rebuild the fallback index from scratch, e.g. after rows were written with bulk
+    statements that bypass the flush hook.
+    :return: The number of documents indexed. The caller must commit.
+    """
+    db.execute(delete(SearchPosting))
+    indexed = 0
+    for doc_type, model in ((VIDEO_DOC, Video), (USER_DOC, User)):
+        fields = list(FIELD_WEIGHTS[doc_type])
+        columns = [model.id, *(getattr(model, field) for field in fields)]
+        last_id = 0
+        while True:
+            rows = db.execute(select(*columns).where(model.id > last_id).order_by(model.id).limit(batch_size)).all()
+            if not rows:
+                break
+            postings = []
+            for row in rows:
+                weights = postings_for(doc_type, dict(zip(fields, row[1:])))
+                postings.extend(
+                    {"doc_type": doc_type, "term": term, "doc_id": row.id, "weight": weight}
+                    for term, weight in weights.items()
+                )
+            if postings:
+                db.execute(insert(SearchPosting), postings)
+            indexed += len(rows)
+            last_id = rows[-1].id
+    return indexed
+
+
+def _postgres_matches(model, terms: List[str], prefix: bool):
+    """
+    Matching ids and integer scores, from the GIN-indexed search vector.
+    """
+    words = [f"'{term}'" for term in terms]
+    if prefix:
+        words[-1] += ":*"
+    query = func.to_tsquery(literal_column(f"'{SEARCH_TEXT_CONFIG}'::regconfig"), " & ".join(words))
+    vector = literal_column(f"{model.__tablename__}.search_vector")
+    score = cast(func.ts_rank_cd(vector, query) * RANK_SCALE, BigInteger)
+    return select(model.id.label("doc_id"), score.label("score")).where(vector.op("@@")(query))
+
+
+def _prefix_upper_bound(term: str) -> str:
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+def _expand_prefix(db: Session, doc_type: str, prefix: str) -> List[str]:
+    """
+    The indexed terms starting with `prefix`, shortest-first in index order, capped
+    so a one-letter prefix cannot turn into a scan of the whole vocabulary.
+    """
+    return db.execute(
+        select(SearchPosting.term)
+        .where(
+            SearchPosting.doc_type == doc_type,
+            SearchPosting.term >= prefix,
+            SearchPosting.term < _prefix_upper_bound(prefix),
+        )
+        .distinct()
+        .order_by(SearchPosting.term)
+        .limit(MAX_PREFIX_EXPANSIONS)
+    ).scalars().all()
+
+
+def _document_frequency(db: Session, doc_type: str, terms: List[str]) -> int:
+    """
+    How many postings the terms have, counted up to DF_SAMPLE_LIMIT (enough to pick the rarest word).
+    """
+    sample = (
+        select(SearchPosting.doc_id)
+        .where(SearchPosting.doc_type == doc_type, SearchPosting.term.in_(terms))
+        .limit(DF_SAMPLE_LIMIT)
+        .subquery()
+    )
+    return db.scalar(select(func.count()).select_from(sample))
+
+
+def _postings_matches(db: Session, doc_type: str, words: List[List[str]]):
+    """
+    Matching ids and integer scores, from the inverted index. Every word must
+    match one of its terms. The join starts from the rarest word, so the work
+    is bounded by its posting list rather than the most common word's.
+    """
+    words = sorted(words, key=lambda terms: _document_frequency(db, doc_type, terms))
+    postings = [aliased(SearchPosting) for _ in words]
+    first = postings[0]
+    stmt = select(first.doc_id, func.sum(sum((p.weight for p in postings[1:]), first.weight)).label("score"))
+    stmt = stmt.where(first.doc_type == doc_type, first.term.in_(words[0]))
+    for posting, terms in zip(postings[1:], words[1:]):
+        stmt = stmt.join(
+            posting,
+            (posting.doc_type == doc_type) & (posting.term.in_(terms)) & (posting.doc_id == first.doc_id),
+        )
+    return stmt.group_by(first.doc_id)
+
+
+def _single_term_page(db: Session, doc_type: str, term: str, after: Optional[Tuple[int, int]], limit: int) -> list:
+    """
+    One exact term needs no aggregation: its postings are read best-first straight
+    off the (doc_type, term, weight, doc_id) index and the scan stops after a page.
+    """
+    stmt = select(SearchPosting.doc_id, SearchPosting.weight.label("score")).where(
+        SearchPosting.doc_type == doc_type, SearchPosting.term == term
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(SearchPosting.weight, SearchPosting.doc_id) < tuple_(*after))
+    return db.execute(
+        stmt.order_by(SearchPosting.weight.desc(), SearchPosting.doc_id.desc()).limit(limit + 1)
+    ).all()
+
+
+def search_ids(
+    db: Session,
+    doc_type: str,
+    query: str,
+    after: Optional[Tuple[int, int]] = None,
+    limit: int = 20,
+    prefix: bool = True,
+) -> Tuple[List[Tuple[int, int]], bool]:
+    """
+    Rank the documents of one type matching every word of `query`.
+    :param after: The (score, id) of the last result of the previous page.
+    :param prefix: Match the last word as a prefix (typeahead).
+    :return: Up to `limit` (id, score) pairs, best first, and whether more follow.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], False
+
+    model = Video if doc_type == VIDEO_DOC else User
+    if _uses_postgres_search(db):
+        matches = _postgres_matches(model, terms, prefix).subquery()
+    else:
+        words = [[term] for term in terms]
+        if prefix:
+            words[-1] = _expand_prefix(db, doc_type, terms[-1])
+            if not words[-1]:
+                return [], False
+        if len(words) == 1 and len(words[0]) == 1:
+            rows = _single_term_page(db, doc_type, words[0][0], after, limit)
+            return [(row.doc_id, int(row.score)) for row in rows[:limit]], len(rows) > limit
+        matches = _postings_matches(db, doc_type, words).subquery()
+
+    stmt = select(matches.c.doc_id, matches.c.score)
+    if after is not None:
+        stmt = stmt.where(tuple_(matches.c.score, matches.c.doc_id) < tuple_(*after))
+    rows = db.execute(stmt.order_by(matches.c.score.desc(), matches.c.doc_id.desc()).limit(limit + 1)).all()
+    return [(row.doc_id, int(row.score)) for row in rows[:limit]], len(rows) > limit
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal, engine
+    from app.search.models import SEARCH_DDL
+    import app.models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Search index maintenance")
+    parser.add_argument("action", choices=["install", "rebuild"], help="install: add the Postgres search columns, triggers and indexes to an existing database; rebuild: rebuild the fallback index")
+    args = parser.parse_args()
+
+    if args.action == "install":
+        if engine.dialect.name != "postgresql":
+            raise SystemExit("The search columns and triggers are Postgres-only; use 'rebuild' elsewhere")
+        with engine.begin() as connection:
+            for statements in SEARCH_DDL.values():
+                for statement in statements:
+                    connection.exec_driver_sql(statement)
+        print("Installed search vectors, triggers and GIN indexes")
+    else:
+        with SessionLocal() as db:
+            count = rebuild_postings(db)
+            db.commit()
+        print(f"Indexed {count} documents")
@@ -0,0 +1,75 @@
+import os
+from sqlalchemy import Column, Integer, String, DDL, Index, event
+from app.database import Base
+from app.auth.models import User
+from app.video.models import Video
+
+# Text search configuration of the Postgres indexes ('simple' lowercases without stemming, fine for names and titles)
+SEARCH_TEXT_CONFIG = os.getenv("SEARCH_TEXT_CONFIG", "simple")
+
+# Document types of the fallback index
+VIDEO_DOC = "video"
+USER_DOC = "user"
+
+
+class SearchPosting(Base):
+    """
+    One entry of the inverted index used where Postgres full-text search is not
+    available (SQLite test runs): a term, a document containing it and the term's
+    weighted frequency there. Maintained on flush by app.search.index.
+    """
+    __tablename__ = "search_postings"
+    __table_args__ = (
+        # Removing a document's postings when it changes
+        Index("ix_search_postings_doc", "doc_type", "doc_id"),
+        # Impact order: a single term's best postings are read first, without sorting
+        Index("ix_search_postings_impact", "doc_type", "term", "weight", "doc_id"),
+    )
+
+    # The primary key doubles as the term index: exact lookups, joins on doc_id and prefix range scans
+    doc_type = Column(String(8), primary_key=True)
+    term = Column(String(64), primary_key=True)
+    doc_id = Column(Integer, primary_key=True)
+    weight = Column(Integer, nullable=False)
+
+
+def _search_vector_ddl(table: str, fields: dict) -> list:
+    """
+    Statements adding a trigger-maintained, GIN-indexed `search_vector` to `table`.
+    Idempotent, so they double as the upgrade for existing databases.
+    :param fields: Column name -> tsvector weight ('A' ranks highest).
+    """
+    vector = " || ".join(
+        f"setweight(to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce({{row}}{column}, '')), '{weight}')"
+        for column, weight in fields.items()
+    )
+    columns = ", ".join(fields)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {vector.format(row="NEW.")};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}",
+        f"""
+        CREATE TRIGGER {table}_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF {columns} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """,
+        f"UPDATE {table} SET search_vector = {vector.format(row='')} WHERE search_vector IS NULL",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+    ]
+
+
+SEARCH_DDL = {
+    Video.__table__: _search_vector_ddl("videos", {"title": "A", "description": "B"}),
+    User.__table__: _search_vector_ddl("users", {"username": "A"}),
+}
+
+for _table, _statements in SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(_table, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,149 @@
+import mimetypes
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+# Where media blobs are kept: file://<directory> or s3://<bucket>/<prefix>.
+# The media routes serve local blobs from ./uploads/media only.
+MEDIA_STORAGE_URL = os.getenv("MEDIA_STORAGE_URL", "file://./uploads/media")
+
+# For S3: the endpoint of an S3-compatible server (MinIO, a local stand-in, ...) and the public base URL of the bucket
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+MEDIA_PUBLIC_URL = os.getenv("MEDIA_PUBLIC_URL")
+
+
+def blob_key(checksum: str, extension: str, kind: str = "videos") -> str:
+    """
+    Content-addressed key of a blob, fanned out over two levels of subdirectories
+    (256 x 256) so each directory holds about 1/65536th of the blobs.
+    :param extension: Kept on the key so the media routes can serve the right content type.
+    """
+    return f"{kind}/{checksum[:2]}/{checksum[2:4]}/{checksum}{extension.lower()}"
+
+
+def thumbnail_key(checksum: str) -> str:
+    """
+    Key of the thumbnail extracted from the video blob with this checksum.
+    """
+    return blob_key(checksum, ".jpg", kind="thumbnails")
+
+
+class LocalStorage:
+    """
+    Blobs as files under `root`, served by the media routes under `base_url`.
+    Directories under `root` (and `root` itself) are created as blobs are stored.
+    """
+
+    def __init__(self, root: str, base_url: str = "/uploads/media"):
+        self.root = root
+        self.base_url = base_url
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, source_path: str, key: str) -> None:
+        """
+        Store a copy of a local file under `key` (a no-op if the blob is already there).
+        The copy is hard-linked where possible and always appears atomically.
+        """
+        target = self._path(key)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        staging = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source_path, staging)
+        except OSError:
+            shutil.copyfile(source_path, staging)
+        os.replace(staging, target)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        """
+        A local path to the blob, for tools that need a file (ffmpeg).
+        """
+        yield self._path(key)
+
+
+class S3Storage:
+    """
+    Blobs as objects in an S3 bucket, or in any server speaking the S3 API when
+    `endpoint_url` is set (MinIO, or a local stand-in for development).
+    Requires the `boto3` package.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, public_url: Optional[str] = None):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("MEDIA_STORAGE_URL points at S3 but the 'boto3' package is not installed")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        base = public_url or (f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com")
+        self.base_url = base.rstrip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, source_path: str, key: str) -> None:
+        if self.exists(key):
+            return
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_file(source_path, self.bucket, self._key(key), ExtraArgs={"ContentType": content_type})
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{self._key(key)}"
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        suffix = os.path.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(key), path)
+            yield path
+        finally:
+            os.remove(path)
+
+
+def create_storage(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return LocalStorage(os.path.normpath(parsed.netloc + parsed.path))
+    if parsed.scheme == "s3":
+        return S3Storage(parsed.netloc, parsed.path, endpoint_url=S3_ENDPOINT_URL, public_url=MEDIA_PUBLIC_URL)
+    raise ValueError(f"Unsupported media storage URL: {url}")
+
+
+media_storage = create_storage(MEDIA_STORAGE_URL)
@@ -0,0 +1,154 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import case, exists, func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.storage.models import MediaBlob
+from app.storage.backends import media_storage, thumbnail_key
+from app.video.models import Video
+from app.utils import run_periodically
+
+# Unreferenced blobs are kept this many seconds before deletion, so a blob
+# released and re-uploaded moments later is not deleted in between
+MEDIA_GC_GRACE_PERIOD = float(os.getenv("MEDIA_GC_GRACE_PERIOD", "3600"))
+
+# Seconds between garbage collection runs, and blobs deleted per transaction
+MEDIA_GC_INTERVAL = float(os.getenv("MEDIA_GC_INTERVAL", "3600"))
+MEDIA_GC_BATCH = int(os.getenv("MEDIA_GC_BATCH", "500"))
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Media blobs are not supported on {dialect}")
+    return insert(MediaBlob)
+
+
+def retain_blob(db: Session, checksum: str, key: str, size_bytes: int) -> str:
+    """
+    Take a reference to the blob with this checksum, recording it under `key` if it is new.
+    The blob row stays locked until the caller commits, so the garbage collector
+    cannot delete it in between; store the file before committing.
+    :return: The blob's storage key, which is the existing one for a duplicate upload.
+    """
+    stmt = _upsert(db).values(
+        checksum=checksum,
+        key=key,
+        size_bytes=size_bytes,
+        ref_count=1,
+        created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["checksum"],
+        set_={"ref_count": MediaBlob.ref_count + 1, "orphaned_at": None},
+    ).returning(MediaBlob.key)
+    return db.execute(stmt).scalar_one()
+
+
+def release_blob(db: Session, checksum: Optional[str]) -> None:
+    """
+    Drop a reference to a blob. At zero references the blob is left for the
+    garbage collector. Unknown checksums (files stored before blobs existed) are ignored.
+    The caller must commit.
+    """
+    if not checksum:
+        return
+    db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.checksum == checksum, MediaBlob.ref_count > 0)
+        .values(
+            ref_count=MediaBlob.ref_count - 1,
+            orphaned_at=case((MediaBlob.ref_count == 1, datetime.utcnow()), else_=MediaBlob.orphaned_at),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_blob_refs(db: Session) -> int:
+    """
+    Recount every blob's references from the videos using it. Catches references
+    dropped without `release_blob`, e.g. videos removed by a cascading user delete.
+    :return: The number of blobs whose count was corrected. The caller must commit.
+    """
+    actual = (
+        select(func.count())
+        .select_from(Video)
+        .where(Video.checksum == MediaBlob.checksum)
+        .correlate(MediaBlob)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.ref_count != actual)
+        .values(
+            ref_count=actual,
+            orphaned_at=case((actual == 0, func.coalesce(MediaBlob.orphaned_at, datetime.utcnow())), else_=None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def collect_garbage(db: Session, storage=media_storage, grace_period: float = MEDIA_GC_GRACE_PERIOD, batch_size: int = MEDIA_GC_BATCH) -> int:
+    """
+    Delete up to `batch_size` blobs (and their thumbnails) unreferenced for longer
+    than the grace period and not used by any video (the count is not trusted alone).
+    Files are deleted while the rows are locked, so a concurrent upload of the
+    same content waits and then stores the file again.
+    :return: The number of blobs deleted. The caller must commit.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_period)
+    blobs = db.execute(
+        select(MediaBlob)
+        .where(
+            MediaBlob.ref_count == 0,
+            MediaBlob.orphaned_at < cutoff,
+            ~exists().where(Video.checksum == MediaBlob.checksum),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    for blob in blobs:
+        storage.delete(blob.key)
+        storage.delete(thumbnail_key(blob.checksum))
+        db.delete(blob)
+    db.flush()
+    return len(blobs)
+
+
+def collect_media_garbage() -> int:
+    """
+    Reconcile reference counts, then garbage collect until nothing is due.
+    Blocking (file deletes); run it in a thread.
+    :return: The number of blobs deleted.
+    """
+    deleted = 0
+    with SessionLocal() as db:
+        reconcile_blob_refs(db)
+        db.commit()
+        while (count := collect_garbage(db)) > 0:
+            deleted += count
+            db.commit()
+    return deleted
+
+
+async def run_media_gc(interval: float = MEDIA_GC_INTERVAL) -> None:
+    """
+    Background task that garbage collects media blobs every `interval` seconds.
+    """
+    async def collect():
+        await run_in_threadpool(collect_media_garbage)
+
+    await run_periodically(collect, interval, "media garbage collection")
+
+
+if __name__ == "__main__":
+    import app.models  # noqa: F401
+
+    print(f"Deleted {collect_media_garbage()} unreferenced media blobs")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index, text
+from datetime import datetime
+from app.database import Base
+
+
+class MediaBlob(Base):
+    """
+    A stored file, identified by the SHA-256 of its content and shared by every
+    video with that checksum. Blobs nothing references are deleted by the garbage collector.
+    """
+    __tablename__ = "media_blobs"
+    __table_args__ = (
+        # Backs the garbage collector's scan for unreferenced blobs
+        Index(
+            "ix_media_blobs_orphaned_at",
+            "orphaned_at",
+            postgresql_where=text("ref_count = 0"),
+            sqlite_where=text("ref_count = 0"),
+        ),
+    )
+
+    checksum = Column(String(64), primary_key=True)
+    key = Column(String, nullable=False)  # Storage key (see app.storage.backends.blob_key)
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Videos using the blob
+    created_at = Column(DateTime, default=datetime.utcnow)
+    orphaned_at = Column(DateTime, nullable=True)  # When ref_count last dropped to 0
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.database import Base
+
+class TimelineEntry(Base):
+    """
+    One video in a user's precomputed Following inbox.
+    """
+    __tablename__ = "timeline_entries"
+    __table_args__ = (
+        # Inbox reads walk this index newest-first
+        Index("ix_timeline_entries_user_created_at_video", "user_id", "created_at", "video_id"),
+        # Unfollow prunes every entry from one creator
+        Index("ix_timeline_entries_user_uploader", "user_id", "uploader_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    uploader_id = Column(Integer, nullable=False)  # Denormalized from the video
+    created_at = Column(DateTime, nullable=False)  # Denormalized from the video
+
+
+class PullCreator(Base):
+    """
+    Creators with too many followers to fan out to; their videos are pulled
+    into followers' feeds at read time instead.
+    """
+    __tablename__ = "timeline_pull_creators"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
@@ -0,0 +1,319 @@
+import os
+import threading
+from typing import Iterable, List, Optional, Set
+from sqlalchemy import delete, insert, select, literal, exists, tuple_, func
+from sqlalchemy.orm import Session
+from app.auth.models import User, followers
+from app.database import AsyncSessionLocal
+from app.video.models import Video, VIDEO_PAYLOAD_COLUMNS
+from app.timeline.models import TimelineEntry, PullCreator
+from app.pagination import after_cursor, encode_cursor
+from app.utils import run_periodically
+
+# Maximum number of entries kept in a single user's inbox
+INBOX_MAX_ENTRIES = int(os.getenv("TIMELINE_INBOX_MAX_ENTRIES", "800"))
+
+# Creators with more followers than this are read with the pull path
+FANOUT_FOLLOWER_LIMIT = int(os.getenv("TIMELINE_FANOUT_FOLLOWER_LIMIT", "10000"))
+
+# Seconds between trims of the inboxes fan-out has added to, and inboxes trimmed per statement
+INBOX_TRIM_INTERVAL = float(os.getenv("TIMELINE_INBOX_TRIM_INTERVAL", "30"))
+INBOX_TRIM_BATCH = 500
+
+# Creators whose followers' inboxes grew since the last trim (this process's uploads)
+_creators_to_trim: Set[int] = set()
+_creators_lock = threading.Lock()
+
+
+def is_pull_creator(db: Session, user_id: int) -> bool:
+    """
+    Check whether a creator's videos are pulled at read time instead of fanned out.
+    """
+    return db.query(PullCreator.user_id).filter(PullCreator.user_id == user_id).first() is not None
+
+
+def _has_too_many_followers(db: Session, user_id: int) -> bool:
+    """
+    Check the follower count against the fan-out limit without counting past it.
+    """
+    capped = (
+        select(literal(1))
+        .select_from(followers)
+        .where(followers.c.followed_id == user_id)
+        .limit(FANOUT_FOLLOWER_LIMIT + 1)
+        .subquery()
+    )
+    count = db.execute(select(func.count()).select_from(capped)).scalar()
+    return count > FANOUT_FOLLOWER_LIMIT
+
+
+def _insert_ignoring_duplicates(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Timeline writes are not supported on {dialect}")
+    return insert(PullCreator)
+
+
+def fan_out_video(db: Session, video: Video) -> int:
+    """
+    Push a freshly uploaded video into the inbox of every follower of its uploader.
+    Creators over the fan-out limit are switched to the pull path instead.
+    The caller owns the transaction and must commit.
+    :return: The number of inboxes written.
+    """
+    if is_pull_creator(db, video.uploader_id):
+        return 0
+    if _has_too_many_followers(db, video.uploader_id):
+        # Two uploads by the same creator can both get here; the second insert is a no-op
+        db.execute(
+            _insert_ignoring_duplicates(db)
+            .values(user_id=video.uploader_id)
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+        return 0
+
+    rows = select(
+        followers.c.follower_id,
+        literal(video.id),
+        literal(video.uploader_id),
+        literal(video.created_at),
+    ).where(followers.c.followed_id == video.uploader_id)
+    result = db.execute(
+        insert(TimelineEntry).from_select(
+            ["user_id", "video_id", "uploader_id", "created_at"], rows
+        )
+    )
+    # Every recipient's inbox is one entry longer; trim them in the background rather than here
+    with _creators_lock:
+        _creators_to_trim.add(video.uploader_id)
+    return result.rowcount
+
+
+def trim_inbox(db: Session, user_id: int, max_entries: int = INBOX_MAX_ENTRIES) -> None:
+    """
+    Drop the oldest entries of one inbox so it holds at most `max_entries` videos.
+    """
+    boundary = (
+        db.query(TimelineEntry.created_at, TimelineEntry.video_id)
+        .filter(TimelineEntry.user_id == user_id)
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.video_id.desc())
+        .offset(max_entries - 1)
+        .limit(1)
+        .first()
+    )
+    if boundary is None:
+        return
+
+    db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == user_id,
+        tuple_(TimelineEntry.created_at, TimelineEntry.video_id) < tuple_(*boundary),
+    ).delete(synchronize_session=False)
+
+
+def trim_inboxes(db: Session, user_ids: List[int], max_entries: int = INBOX_MAX_ENTRIES) -> int:
+    """
+    Trim several inboxes to `max_entries` videos with one statement.
+    :return: The number of entries removed. The caller must commit.
+    """
+    position = func.row_number().over(
+        partition_by=TimelineEntry.user_id,
+        order_by=(TimelineEntry.created_at.desc(), TimelineEntry.video_id.desc()),
+    )
+    ranked = (
+        select(TimelineEntry.user_id, TimelineEntry.video_id, position.label("position"))
+        .where(TimelineEntry.user_id.in_(user_ids))
+        .subquery()
+    )
+    overflow = select(ranked.c.user_id, ranked.c.video_id).where(ranked.c.position > max_entries)
+    result = db.execute(
+        delete(TimelineEntry)
+        .where(tuple_(TimelineEntry.user_id, TimelineEntry.video_id).in_(overflow))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def trim_followers_inboxes(db: Session, creator_ids: Iterable[int], batch_size: int = INBOX_TRIM_BATCH) -> int:
+    """
+    Trim the inbox of every follower of these creators, `batch_size` inboxes per statement.
+    :return: The number of entries removed. The caller must commit.
+    """
+    follower_ids = list(
+        db.execute(
+            select(followers.c.follower_id.distinct())
+            .where(followers.c.followed_id.in_(list(creator_ids)))
+            .order_by(followers.c.follower_id)
+        ).scalars()
+    )
+    removed = 0
+    for start in range(0, len(follower_ids), batch_size):
+        removed += trim_inboxes(db, follower_ids[start:start + batch_size])
+    return removed
+
+
+async def trim_fanned_out_inboxes() -> int:
+    """
+    Trim the inboxes fan-out has added to since the last run; on failure the
+    creators are kept for the next one.
+    :return: The number of entries removed.
+    """
+    global _creators_to_trim
+    with _creators_lock:
+        creator_ids, _creators_to_trim = _creators_to_trim, set()
+    if not creator_ids:
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            removed = await db.run_sync(trim_followers_inboxes, creator_ids)
+            await db.commit()
+    except BaseException:
+        with _creators_lock:
+            _creators_to_trim |= creator_ids
+        raise
+    return removed
+
+
+async def run_inbox_trimmer(interval: float = INBOX_TRIM_INTERVAL) -> None:
+    """
+    Background task that keeps fanned-out inboxes at INBOX_MAX_ENTRIES every `interval` seconds.
+    """
+    await run_periodically(trim_fanned_out_inboxes, interval, "timeline inbox trimmer")
+
+
+def backfill_inbox(db: Session, follower_id: int, followed_id: int) -> None:
+    """
+    Copy the most recent videos of a newly followed creator into the follower's inbox.
+    """
+    if is_pull_creator(db, followed_id):
+        return
+
+    already_present = exists().where(
+        TimelineEntry.user_id == follower_id,
+        TimelineEntry.video_id == Video.id,
+    )
+    recent = (
+        select(literal(follower_id), Video.id, Video.uploader_id, Video.created_at)
+        .where(Video.uploader_id == followed_id, ~already_present)
+        .order_by(Video.created_at.desc(), Video.id.desc())
+        .limit(INBOX_MAX_ENTRIES)
+    )
+    db.execute(
+        insert(TimelineEntry).from_select(
+            ["user_id", "video_id", "uploader_id", "created_at"], recent
+        )
+    )
+    trim_inbox(db, follower_id)
+
+
+def prune_inbox(db: Session, follower_id: int, followed_id: int) -> None:
+    """
+    Remove an unfollowed creator's videos from the follower's inbox.
+    """
+    db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == follower_id,
+        TimelineEntry.uploader_id == followed_id,
+    ).delete(synchronize_session=False)
+
+
+def rebuild_inbox(db: Session, user_id: int) -> None:
+    """
+    Recompute a user's inbox from scratch out of the followers table.
+    """
+    db.query(TimelineEntry).filter(TimelineEntry.user_id == user_id).delete(synchronize_session=False)
+
+    followed_ids = select(followers.c.followed_id).where(followers.c.follower_id == user_id)
+    recent = (
+        select(literal(user_id), Video.id, Video.uploader_id, Video.created_at)
+        .where(
+            Video.uploader_id.in_(followed_ids),
+            Video.uploader_id.not_in(select(PullCreator.user_id)),
+        )
+        .order_by(Video.created_at.desc(), Video.id.desc())
+        .limit(INBOX_MAX_ENTRIES)
+    )
+    db.execute(
+        insert(TimelineEntry).from_select(
+            ["user_id", "video_id", "uploader_id", "created_at"], recent
+        )
+    )
+
+
+def read_following_feed(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 10, skip: int = 0):
+    """
+    Read a page of the Following feed from the user's inbox, merged with videos
+    pulled from any followed creators on the pull path.
+    :return: The video rows on the page (VIDEO_PAYLOAD_COLUMNS) and the cursor for the next page.
+    """
+    fetch = limit + 1 if cursor else skip + limit + 1
+
+    inbox = (
+        after_cursor(
+            db.query(TimelineEntry.video_id, TimelineEntry.created_at),
+            TimelineEntry.created_at,
+            TimelineEntry.video_id,
+            cursor,
+        )
+        .filter(TimelineEntry.user_id == user_id)
+        .limit(fetch)
+        .all()
+    )
+    candidates = {video_id: created_at for video_id, created_at in inbox}
+
+    pull_ids = [
+        row[0]
+        for row in db.query(followers.c.followed_id)
+        .join(PullCreator, PullCreator.user_id == followers.c.followed_id)
+        .filter(followers.c.follower_id == user_id)
+        .all()
+    ]
+    if pull_ids:
+        pulled = (
+            after_cursor(
+                db.query(Video.id, Video.created_at).filter(Video.uploader_id.in_(pull_ids)),
+                Video.created_at,
+                Video.id,
+                cursor,
+            )
+            .limit(fetch)
+            .all()
+        )
+        candidates.update({video_id: created_at for video_id, created_at in pulled})
+
+    merged = sorted(candidates.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    start = 0 if cursor else skip
+    page = merged[start:start + limit]
+
+    next_cursor = None
+    if page and len(merged) > start + limit:
+        last_id, last_created_at = page[-1]
+        next_cursor = encode_cursor(last_created_at, last_id)
+
+    page_ids = [video_id for video_id, _ in page]
+    rows = db.query(*VIDEO_PAYLOAD_COLUMNS).filter(Video.id.in_(page_ids)).all() if page_ids else []
+    videos = {row.id: row for row in rows}
+    return [videos[video_id] for video_id in page_ids if video_id in videos], next_cursor
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal
+    import app.models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Following inbox maintenance")
+    parser.add_argument("action", choices=["rebuild", "trim"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for (uid,) in db.query(User.id).all():
+            if args.action == "rebuild":
+                rebuild_inbox(db, uid)
+            else:
+                trim_inbox(db, uid)
+            db.commit()
+    finally:
+        db.close()
@@ -1,27 +1,247 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
 import os
 import uuid
-from fastapi import UploadFile
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
 
-def save_file_to_disk(file: UploadFile, upload_dir: str = "./uploads/videos") -> str:
+logger = logging.getLogger(__name__)
+
+# Size of each read/write when copying uploads to disk
+CHUNK_SIZE = 1024 * 1024
+
+# Largest video accepted, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+
+# Uploads are written here, then copied into media storage (app.storage) once published
+STAGING_DIR = "./uploads/staging"
+PARTIAL_UPLOAD_DIR = "./uploads/partial"
+
+
+@dataclass
+class SavedFile:
+    """
+    A staged upload: where it was written, its extension, how big it is and its SHA-256 checksum.
+    """
+    path: str
+    extension: str
+    size: int
+    checksum: str
+
+
+def _copy_to_disk(source, file_path: str, max_bytes: int):
+    """
+    Copy a file object to disk in fixed-size chunks, hashing as it goes.
+    Runs in a worker thread; the partial file is removed if the limit is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+
+    if size > max_bytes:
+        os.remove(file_path)
+        return None
+    return size, digest.hexdigest()
+
+
+async def save_file_to_disk(
+    file: UploadFile,
+    upload_dir: str = STAGING_DIR,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> Optional[SavedFile]:
     """
-    Saves the uploaded file to disk and returns the relative file URL.
+    Stream the uploaded file to the staging directory without holding it in memory,
+    hashing it on the way.
+    :return: The saved file, or None if it could not be written.
+    :raises HTTPException: 413 if the file is larger than `max_bytes`.
     """
     try:
         # Ensure the upload directory exists
         os.makedirs(upload_dir, exist_ok=True)
 
         # Generate a unique filename
-        unique_filename = f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
+        extension = os.path.splitext(file.filename)[1].lower()
+        unique_filename = f"{uuid.uuid4()}{extension}"
 
         # Full path to save the file
         file_path = os.path.join(upload_dir, unique_filename)
 
-        # Save the file to disk
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
-
-        # Construct the relative URL (ensure no double prefix)
-        return f"/uploads/videos/{unique_filename}"
-    except Exception as e:
-        print(f"Error saving file: {e}")
+        # Copy chunk by chunk in a worker thread so the event loop never blocks on disk I/O
+        result = await run_in_threadpool(_copy_to_disk, file.file, file_path, max_bytes)
+        if result is None:
+            raise HTTPException(status_code=413, detail="File too large")
+        size, checksum = result
+        return SavedFile(file_path, extension, size, checksum)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error saving file")
         return None
+
+
+def partial_upload_path(upload_id: str) -> str:
+    """
+    Path of the partially received file for a resumable upload session.
+    """
+    return os.path.join(PARTIAL_UPLOAD_DIR, f"{upload_id}.part")
+
+
+def partial_upload_size(upload_id: str) -> int:
+    """
+    Number of bytes received so far for a resumable upload; this is the resume offset.
+    """
+    try:
+        return os.path.getsize(partial_upload_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def _open_for_append(file_path: str, offset: int):
+    """
+    Open a file for appending under an exclusive lock, if it holds exactly `offset` bytes.
+    The lock is held until the file is closed, so a concurrent append to the same file
+    (from this or another worker process) cannot interleave with this one.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    f = open(file_path, "ab")
+    try:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=409, detail="Another chunk of this upload is being received")
+        size = f.seek(0, os.SEEK_END)
+        if size != offset:
+            raise HTTPException(status_code=409, detail=f"Upload offset mismatch, resume from {size}")
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+async def append_stream_to_file(stream: AsyncIterator[bytes], file_path: str, offset: int, max_size: int) -> int:
+    """
+    Append an incoming request body to a file, writing fixed-size chunks off the event loop.
+    Bytes that arrived before a disconnect stay on disk so the client can resume after them.
+    :param offset: How many bytes the file must already hold; checked under the file's lock.
+    :param max_size: How big the file may grow.
+    :return: The number of bytes appended.
+    :raises HTTPException: 409 if the file is not `offset` bytes long or another append to
+        it is in progress, 413 if the body would grow the file past `max_size`.
+    """
+    f = await run_in_threadpool(_open_for_append, file_path, offset)
+    max_bytes = max_size - offset
+    written = 0
+    buffer = bytearray()
+    try:
+        async for chunk in stream:
+            if written + len(buffer) + len(chunk) > max_bytes:
+                raise HTTPException(status_code=413, detail="Chunk exceeds the declared upload size")
+            buffer += chunk
+            if len(buffer) >= CHUNK_SIZE:
+                await run_in_threadpool(f.write, bytes(buffer))
+                written += len(buffer)
+                buffer.clear()
+    finally:
+        if buffer:
+            await run_in_threadpool(f.write, bytes(buffer))
+            written += len(buffer)
+        await run_in_threadpool(f.close)
+    return written
+
+
+def _finalize_partial_upload(upload_id: str, extension: str) -> SavedFile:
+    """
+    Checksum a completed partial upload, which then stays where it is as the staged file.
+    """
+    source = partial_upload_path(upload_id)
+    digest = hashlib.sha256()
+    size = 0
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return SavedFile(source, extension, size, digest.hexdigest())
+
+
+async def finalize_partial_upload(upload_id: str, filename: str) -> SavedFile:
+    """
+    Finish a resumable upload: compute its checksum so it can be published like any other staged upload.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return await run_in_threadpool(_finalize_partial_upload, upload_id, extension)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against our ETag (weak comparison, per RFC 9110).
+    """
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject upload requests over the limit before their body is spooled: at once
+    when the declared Content-Length is too large, otherwise (chunked or
+    understated bodies) as soon as the bytes received pass the limit.
+    """
+
+    def __init__(self, app, paths, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                response = JSONResponse({"detail": "File too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the body is parsed, so it becomes the response before any is sent
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def run_periodically(job: Callable[[], Awaitable], interval: float, name: str) -> None:
+    """
+    Run `job` every `interval` seconds until cancelled; errors are logged and the loop carries on.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error in %s", name)
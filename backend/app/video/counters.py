@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Dict
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.video.models import Video, Comment
+from app.profile.stats import bump_stats
+from app.utils import run_periodically
+
+# Seconds between flushes of buffered counter deltas
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "1.0"))
+
+COUNTER_FIELDS = ("likes", "views")
+
+# Which user_stats column each video counter rolls up into
+_STAT_FIELDS = {"likes": "like_count", "views": "view_count"}
+
+
+class CounterBuffer:
+    """
+    Accumulates like/view deltas per video in memory so a hot video's row is
+    updated once per flush interval instead of once per click.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, video_id: int, likes: int = 0, views: int = 0) -> None:
+        with self._lock:
+            deltas = self._pending.setdefault(video_id, dict.fromkeys(COUNTER_FIELDS, 0))
+            deltas["likes"] += likes
+            deltas["views"] += views
+
+    def pending(self, video_id: int) -> Dict[str, int]:
+        """
+        Deltas for a video that have not reached the database yet.
+        """
+        with self._lock:
+            return dict(self._pending.get(video_id) or dict.fromkeys(COUNTER_FIELDS, 0))
+
+    def merge(self, video: dict) -> dict:
+        """
+        Add not-yet-flushed deltas to a serialized video so reads see them immediately.
+        """
+        with self._lock:
+            deltas = self._pending.get(video["id"])
+            if deltas:
+                for field in COUNTER_FIELDS:
+                    video[field] = (video.get(field) or 0) + deltas[field]
+        return video
+
+    def drain(self) -> Dict[int, Dict[str, int]]:
+        """
+        Take every pending delta, leaving the buffer empty.
+        """
+        with self._lock:
+            drained, self._pending = self._pending, {}
+        return drained
+
+    def restore(self, drained: Dict[int, Dict[str, int]]) -> None:
+        """
+        Put back deltas whose flush failed so they are retried on the next one.
+        """
+        for video_id, deltas in drained.items():
+            self.add(video_id, **deltas)
+
+
+counter_buffer = CounterBuffer()
+
+
+def apply_counter_deltas(db: Session, drained: Dict[int, Dict[str, int]]) -> None:
+    """
+    Write drained deltas as one batched `SET col = col + :delta` UPDATE and roll
+    them up into the uploaders' profile counters. The caller must commit.
+    """
+    rows = [
+        {"b_id": video_id, "b_likes": deltas["likes"], "b_views": deltas["views"]}
+        for video_id, deltas in drained.items()
+        if any(deltas.values())
+    ]
+    if not rows:
+        return
+
+    videos = Video.__table__
+    db.execute(
+        videos.update()
+        .where(videos.c.id == bindparam("b_id"))
+        .values(
+            likes=videos.c.likes + bindparam("b_likes"),
+            views=videos.c.views + bindparam("b_views"),
+        ),
+        rows,
+    )
+
+    per_uploader = defaultdict(lambda: dict.fromkeys(_STAT_FIELDS.values(), 0))
+    uploaders = db.execute(select(Video.id, Video.uploader_id).where(Video.id.in_(list(drained)))).all()
+    for video_id, uploader_id in uploaders:
+        for field, stat_field in _STAT_FIELDS.items():
+            per_uploader[uploader_id][stat_field] += drained[video_id][field]
+    for uploader_id, deltas in per_uploader.items():
+        bump_stats(db, uploader_id, **deltas)
+
+
+async def flush_counters(buffer: CounterBuffer = counter_buffer) -> int:
+    """
+    Flush all buffered deltas in one transaction; on failure they go back in the buffer.
+    :return: The number of videos flushed.
+    """
+    drained = buffer.drain()
+    if not drained:
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(apply_counter_deltas, drained)
+            await db.commit()
+    except BaseException:
+        buffer.restore(drained)
+        raise
+    return len(drained)
+
+
+async def run_counter_flusher(interval: float = COUNTER_FLUSH_INTERVAL) -> None:
+    """
+    Background task that flushes the counter buffer every `interval` seconds.
+    """
+    await run_periodically(flush_counters, interval, "video counter flusher")
+
+
+def reconcile_comment_counts(db: Session, batch_size: int = 1000) -> int:
+    """
+    Recompute `videos.comment_count` from the comments table, one id range per
+    statement, fixing rows that drifted or predate the counter. The caller must commit.
+    :return: The number of videos corrected.
+    """
+    last_id = db.scalar(select(func.max(Video.id))) or 0
+    actual = (
+        select(func.count())
+        .where(Comment.video_id == Video.id)
+        .correlate(Video)
+        .scalar_subquery()
+    )
+    repaired = 0
+    for start in range(0, last_id + 1, batch_size):
+        result = db.execute(
+            update(Video)
+            .where(
+                Video.id >= start,
+                Video.id < start + batch_size,
+                or_(Video.comment_count.is_(None), Video.comment_count != actual),
+            )
+            .values(comment_count=actual)
+            .execution_options(synchronize_session=False)
+        )
+        repaired += result.rowcount
+    return repaired
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    import app.models  # noqa: F401
+
+    db = SessionLocal()
+    try:
+        repaired = reconcile_comment_counts(db)
+        db.commit()
+        print(f"Reconciled comment counts: {repaired} videos repaired")
+    finally:
+        db.close()
@@ -0,0 +1,62 @@
+import hashlib
+import math
+from typing import Optional
+
+# 2**12 one-byte registers: 4 KiB per video, about 1.6% standard error
+HLL_PRECISION = 12
+
+
+class HyperLogLog:
+    """
+    Fixed-size sketch estimating how many distinct items were added to it.
+    Sketches merge losslessly (register-wise max), so per-worker sketches can be
+    combined with the stored one at flush time.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError("Register array does not match the sketch precision")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, item: str) -> None:
+        """
+        Record one occurrence of `item`.
+        """
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.precision)
+        remainder = h & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (1-based)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """
+        Fold another sketch into this one.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """
+        Estimate the number of distinct items added.
+        """
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting is more accurate here
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = HLL_PRECISION) -> "HyperLogLog":
+        return cls(precision, data)
@@ -1,13 +1,32 @@
-from sqlalchemy import Column, Boolean, Integer, Text, String, ForeignKey, DateTime
+from sqlalchemy import Column, Boolean, Integer, BigInteger, Text, String, ForeignKey, DateTime, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
+# Video.processing_status: post-upload processing (app.jobs) is queued, running, done or gave up
+PROCESSING_PENDING = "pending"
+PROCESSING = "processing"
+PROCESSING_READY = "ready"
+PROCESSING_FAILED = "failed"
+
+
 class Video(Base):
     """
     Video model representing uploaded videos.
     """
     __tablename__ = "videos"
+    __table_args__ = (
+        # Composite indexes backing keyset pagination of the feeds
+        Index("ix_videos_created_at_id", "created_at", "id"),
+        Index("ix_videos_uploader_id_created_at_id", "uploader_id", "created_at", "id"),
+        Index(
+            "ix_videos_podcast_created_at_id",
+            "created_at",
+            "id",
+            postgresql_where=text("is_podcast"),
+            sqlite_where=text("is_podcast"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -20,6 +39,14 @@ class Video(Base):
     # New Attribute: likes
     likes = Column(Integer, default=0)  # Default to 0 likes
     views = Column(Integer, default=0)  # Add views column
+    comment_count = Column(Integer, default=0)  # Maintained on comment insert
+    unique_viewers = Column(Integer, default=0)  # Estimated from the view sketch
+    watch_time_ms = Column(BigInteger, default=0)  # Total reported watch time
+    size_bytes = Column(BigInteger, nullable=True)  # Size of the stored file
+    checksum = Column(String(64), nullable=True, index=True)  # SHA-256 of the stored file (its media blob)
+    processing_status = Column(String(16), default=PROCESSING_READY)
+    duration_ms = Column(Integer, nullable=True)  # Probed by the processing job
+    thumbnail_url = Column(String, nullable=True)  # Extracted by the processing job
 
     # Relationships
     uploader = relationship("app.auth.models.User", back_populates="videos")
@@ -43,14 +70,51 @@ class Video(Base):
             "is_podcast": self.is_podcast,  # Include podcast flag
             "likes": self.likes,  # Include likes in the dictionary
             "views": self.views,
+            "unique_viewers": self.unique_viewers,
+            "comment_count": self.comment_count,
+            "processing_status": self.processing_status,
+            "duration_ms": self.duration_ms,
+            "thumbnail_url": self.thumbnail_url,
         }
 
 
+# Columns of a video payload (named like the `to_dict` keys). Selecting just these
+# returns plain rows, skipping ORM identity-map hydration on hot read paths.
+VIDEO_PAYLOAD_COLUMNS = (
+    Video.id,
+    Video.title,
+    Video.description,
+    Video.url,
+    Video.uploader_id,
+    Video.created_at,
+    Video.is_podcast,
+    Video.likes,
+    Video.views,
+    Video.unique_viewers,
+    Video.comment_count,
+    Video.processing_status,
+    Video.duration_ms,
+    Video.thumbnail_url,
+)
+
+
+def video_payload(row) -> dict:
+    """
+    Build a video's payload from a row selected with VIDEO_PAYLOAD_COLUMNS.
+    `created_at` stays a datetime; the JSON response class renders it in ISO 8601.
+    """
+    return dict(row._mapping)
+
+
 class Comment(Base):
     """
     Comment model representing comments on videos.
     """
     __tablename__ = "comments"
+    __table_args__ = (
+        # Backs keyset pagination of a video's comments
+        Index("ix_comments_video_id_created_at_id", "video_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"))
@@ -61,3 +125,39 @@ class Comment(Base):
     # Relationships
     user = relationship("app.auth.models.User", back_populates="comments")
     video = relationship("app.video.models.Video", back_populates="comments")
+
+
+class Like(Base):
+    """
+    Like model recording which users liked which videos.
+    """
+    __tablename__ = "likes"
+
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UploadSession(Base):
+    """
+    A resumable upload in progress. The bytes received so far live in a
+    partial file on disk whose size is the offset to resume from.
+    """
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class VideoViewSketch(Base):
+    """
+    HyperLogLog registers estimating the distinct viewers of a video.
+    """
+    __tablename__ = "video_view_sketches"
+
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,186 +1,630 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import and_
-from app.database import get_db
-from app.video.models import Video
-from app.auth.dependencies import get_current_user
-from app.utils import save_file_to_disk
+import hmac
+import logging
+import os
+import uuid
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Query, Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.video.models import Video, Comment, Like, UploadSession, VIDEO_PAYLOAD_COLUMNS, PROCESSING_PENDING
+from app.video.schemas import UploadSessionCreate, ViewEventBatch
+from app.auth.dependencies import get_current_user, get_optional_user
+from app.utils import (
+    CHUNK_SIZE,
+    MAX_UPLOAD_BYTES,
+    SavedFile,
+    save_file_to_disk,
+    partial_upload_path,
+    partial_upload_size,
+    append_stream_to_file,
+    finalize_partial_upload,
+)
+from app.pagination import keyset_page, encode_score_cursor, decode_score_cursor, encode_source_cursor
+from app.responses import ORJSONResponse
+from app.ranking.engine import RANKED_SOURCE, RECENT_SOURCE, for_you_page, parse_for_you_cursor
+from app.cache.response import response_cache, VIDEOS_TAG
+from app.timeline.service import fan_out_video, read_following_feed
+from app.profile.stats import bump_stats
+from app.video.counters import counter_buffer
+from app.video.view_events import view_aggregator, view_deduplicator, MAX_VIEW_EVENTS_PER_BATCH, VIEW_INGEST_TOKEN
+from app.jobs.queue import enqueue_job, jobs_for_video
+from app.jobs.processors import PROCESS_VIDEO
+from app.storage.backends import media_storage, blob_key
+from app.storage.blobs import retain_blob, release_blob
+from app.search.index import search_ids
+from app.search.models import VIDEO_DOC, USER_DOC
+from app.loaders import Loaders, VideoExpansion, batch_ids, get_loaders, serialize_videos
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Largest page of comments a client may request
+MAX_COMMENTS_PER_PAGE = 100
+
+# Longest search query accepted
+MAX_SEARCH_QUERY_LENGTH = 100
+
 # Upload video route
 @router.post("/upload")
 async def upload_video(
     title: str = Form(...),
     description: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """
     Upload a new video with metadata.
     """
     try:
-        file_url = save_file_to_disk(file)
-        if not file_url:
+        # Hand the connection back to the pool while the file is copied to disk
+        await db.close()
+
+        saved = await save_file_to_disk(file)
+        if not saved:
             raise HTTPException(status_code=500, detail="Failed to save file")
 
+        new_video = await _publish_video(db, current_user.id, title, description, saved)
+        return {"message": "Video uploaded successfully", "video": new_video.to_dict()}
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error uploading video")
+        raise HTTPException(status_code=500, detail="Internal server error during video upload")
+
+
+async def _publish_video(db: AsyncSession, uploader_id: int, title: str, description: str, saved: SavedFile) -> Video:
+    """
+    Move a staged upload into media storage, create its Video row and queue its
+    processing; the worker (app.jobs.worker) picks it up once this commits.
+    A re-upload of content already stored shares the existing blob.
+    """
+    try:
+        key = await db.run_sync(retain_blob, saved.checksum, blob_key(saved.checksum, saved.extension), saved.size)
+        await run_in_threadpool(media_storage.put_file, saved.path, key)
+
         new_video = Video(
             title=title,
             description=description,
-            url=file_url,
-            uploader_id=current_user.id,
+            url=media_storage.url(key),
+            uploader_id=uploader_id,
+            size_bytes=saved.size,
+            checksum=saved.checksum,
+            processing_status=PROCESSING_PENDING,
         )
         db.add(new_video)
-        db.commit()
-        db.refresh(new_video)
+        await db.flush()
+        await db.run_sync(
+            enqueue_job,
+            PROCESS_VIDEO,
+            {"key": key, "checksum": saved.checksum},
+            new_video.id,
+        )
+
+        # Push the new video into followers' Following inboxes in the same transaction
+        await db.run_sync(fan_out_video, new_video)
+        await db.run_sync(bump_stats, uploader_id, video_count=1)
+        await db.commit()
+    finally:
+        await run_in_threadpool(_remove_staged, saved.path)
+    await db.refresh(new_video)
+
+    # Cached anonymous feeds no longer match
+    await response_cache.invalidate(VIDEOS_TAG)
+    return new_video
+
+
+def _remove_staged(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@router.get("/processing/{video_id}")
+async def get_processing_status(
+    video_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Report the processing status of one of the current user's videos, with its jobs.
+    """
+    video = await db.get(Video, video_id)
+    if not video or video.uploader_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Video not found")
+    jobs = await db.run_sync(jobs_for_video, video_id)
+    return {
+        "video_id": video.id,
+        "processing_status": video.processing_status,
+        "jobs": [job.to_dict() for job in jobs],
+    }
+
+
+@router.delete("/{video_id}")
+async def delete_video(
+    video_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Delete one of the current user's videos. Its file is removed by the media
+    garbage collector once no other video shares it.
+    """
+    video = await db.get(Video, video_id)
+    if not video or video.uploader_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    # Take what the video contributed to the uploader's totals back out with it
+    comments = await db.scalar(select(func.count(Comment.id)).where(Comment.video_id == video_id))
+    likes, views = video.likes or 0, video.views or 0
+
+    await db.run_sync(release_blob, video.checksum)
+    await db.delete(video)
+    await db.flush()
+    await db.run_sync(
+        bump_stats, current_user.id, video_count=-1, like_count=-likes, view_count=-views, comment_count=-comments,
+    )
+    await db.commit()
+
+    await response_cache.invalidate(VIDEOS_TAG)
+    return {"message": "Video deleted"}
+
+
+async def _get_upload_session(db: AsyncSession, upload_id: str, user_id: int) -> UploadSession:
+    """
+    Look up a resumable upload session owned by the given user.
+    """
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    )
+    session = result.scalars().first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+# Resumable upload routes
+@router.post("/uploads")
+async def create_upload_session(
+    session_data: UploadSessionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Start a resumable upload. Send the file in chunks with PATCH /uploads/{upload_id}.
+    """
+    if session_data.size <= 0:
+        raise HTTPException(status_code=400, detail="File size must be positive")
+    if session_data.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        filename=session_data.filename,
+        total_size=session_data.size,
+    )
+    db.add(session)
+    await db.commit()
+    return {"upload_id": session.id, "offset": 0, "size": session.total_size, "chunk_size": CHUNK_SIZE}
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Report how many bytes of a resumable upload have been received, i.e. where to resume.
+    """
+    session = await _get_upload_session(db, upload_id, current_user.id)
+    return {"upload_id": session.id, "offset": partial_upload_size(session.id), "size": session.total_size}
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Append the request body to a resumable upload.
+    The Upload-Offset header must match the number of bytes already received.
+    """
+    session = await _get_upload_session(db, upload_id, current_user.id)
+    offset = partial_upload_size(session.id)
+    if upload_offset != offset:
+        raise HTTPException(status_code=409, detail=f"Upload offset mismatch, resume from {offset}")
+
+    # Don't hold a pooled connection for as long as the client takes to send the body
+    await db.close()
+
+    # Re-checks the offset under a lock on the partial file, so of two chunks sent for
+    # the same offset only one is appended
+    written = await append_stream_to_file(
+        request.stream(), partial_upload_path(session.id), offset, session.total_size
+    )
+    return {"upload_id": session.id, "offset": offset + written, "size": session.total_size}
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    title: str = Form(...),
+    description: str = Form(...),
+    checksum: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Publish a fully received resumable upload as a video.
+    An optional SHA-256 `checksum` is verified against the received bytes.
+    """
+    session = await _get_upload_session(db, upload_id, current_user.id)
+    if partial_upload_size(session.id) != session.total_size:
+        raise HTTPException(status_code=409, detail="Upload is incomplete")
+
+    saved = await finalize_partial_upload(session.id, session.filename)
+    await db.delete(session)
+    if checksum and checksum.lower() != saved.checksum:
+        _remove_staged(saved.path)
+        await db.commit()
+        raise HTTPException(status_code=422, detail="Checksum mismatch, upload discarded")
+
+    new_video = await _publish_video(db, current_user.id, title, description, saved)
+    return {"message": "Video uploaded successfully", "video": new_video.to_dict()}
 
-        return {"message": "Video uploaded successfully", "video": new_video.to_dict()}
-    except Exception as e:
-        print(f"Error uploading video: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error during video upload")
 
 @router.get("/feed/for-you")
-async def get_for_you_feed(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def get_for_you_feed(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    expand: List[VideoExpansion] = Query([]),
+    db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
+    current_user=Depends(get_optional_user),
+):
     """
-    Fetch videos for the "For You" feed.
+    Fetch videos for the "For You" feed, ranked for the signed-in user (or globally
+    for anonymous requests). Until the ranking pool is loaded the newest videos are returned.
+    Anonymous pages are identical for everyone and are served from the response cache.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page, and
+    `expand=uploader` / `expand=comments` to embed uploaders and comment previews.
+    A cursor continues from the source that produced it: a scroll that started on
+    the newest videos stays on them after the ranking becomes available.
     """
-    try:
-        videos = (
-            db.query(Video)
-            .order_by(Video.created_at.desc())  # Modify to add recommendation logic if needed
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-        return {"videos": [video.to_dict() for video in videos]}
-    except Exception as e:
-        print(f"Error fetching For You feed: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    async def build():
+        try:
+            user_id = current_user.id if current_user else None
+            source, source_cursor = parse_for_you_cursor(cursor)
+            ranked = None
+            if source != RECENT_SOURCE:
+                ranked = await for_you_page(
+                    db, user_id, cursor=source_cursor if source == RANKED_SOURCE else None, limit=limit, skip=skip,
+                )
+            if ranked is not None:
+                video_ids, next_source_cursor = ranked
+                source = RANKED_SOURCE
+                rows = [row for row in await loaders.videos.load_many(video_ids) if row is not None]
+            else:
+                # A ranked cursor with no ranking loaded (e.g. after a restart) starts over on the newest videos
+                rows, next_source_cursor = await keyset_page(
+                    db,
+                    select(*VIDEO_PAYLOAD_COLUMNS),
+                    Video.created_at,
+                    Video.id,
+                    cursor=source_cursor if source == RECENT_SOURCE else None,
+                    limit=limit,
+                    skip=skip,
+                    scalars=False,
+                )
+                source = RECENT_SOURCE
+            next_cursor = encode_source_cursor(source, next_source_cursor) if next_source_cursor else None
+            return {"videos": await serialize_videos(loaders, rows, expand), "next_cursor": next_cursor}
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Error fetching For You feed")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+    if current_user is not None:
+        return ORJSONResponse(await build())
+    return await response_cache.respond(request, build, tags=(VIDEOS_TAG,))
+
+
+@router.get("/batch")
+async def get_videos_batch(
+    ids: List[int] = Depends(batch_ids),
+    expand: List[VideoExpansion] = Query([]),
+    loaders: Loaders = Depends(get_loaders),
+):
+    """
+    Fetch several videos by id (`?ids=1,2,3`) in the order given; ids that do
+    not exist are listed in `missing`. `expand` embeds uploaders and comment
+    previews, loaded with one query each for the whole batch.
+    """
+    rows = await loaders.videos.load_many(ids)
+    videos = await serialize_videos(loaders, [row for row in rows if row is not None], expand)
+    missing = [video_id for video_id, row in zip(ids, rows) if row is None]
+    return ORJSONResponse({"videos": videos, "missing": missing})
+
+
+@router.get("/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_QUERY_LENGTH),
+    type: Literal["videos", "users"] = "videos",
+    prefix: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    expand: List[VideoExpansion] = Query([]),
+    db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
+):
+    """
+    Search video titles and descriptions (`type=videos`) or usernames (`type=users`).
+    Results are ranked best first and must contain every word of `q`; with
+    `prefix`, the last word also matches words it begins (typeahead).
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
+    """
+    after = decode_score_cursor(cursor) if cursor else None
+
+    async def build():
+        try:
+            doc_type = VIDEO_DOC if type == "videos" else USER_DOC
+            hits, has_more = await db.run_sync(search_ids, doc_type, q, after, limit, prefix)
+            next_cursor = encode_score_cursor(hits[-1][1], hits[-1][0]) if has_more else None
+            ids = [doc_id for doc_id, _ in hits]
+            if doc_type == USER_DOC:
+                users = [user for user in await loaders.users.load_many(ids) if user is not None]
+                return {"users": users, "next_cursor": next_cursor}
+            rows = [row for row in await loaders.videos.load_many(ids) if row is not None]
+            return {"videos": await serialize_videos(loaders, rows, expand), "next_cursor": next_cursor}
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Error searching %s", type)
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Typeahead repeats the same short prefixes across clients, so share results briefly
+    return await response_cache.respond(request, build, tags=(VIDEOS_TAG,) if type == "videos" else ())
 
 
 @router.get("/feed/following")
 async def get_following_feed(
-    skip: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    expand: List[VideoExpansion] = Query([]),
+    db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
     current_user=Depends(get_current_user)
 ):
     """
     Fetch videos uploaded by users the current user is following.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
     """
     try:
-        # Debugging: Check if `current_user.following` exists and is populated
-        if not hasattr(current_user, "following"):
-            print("Error: `current_user.following` is not defined.")
-            raise HTTPException(status_code=500, detail="Following data not available")
-
-        following_user_ids = [user.id for user in current_user.following]
-
-        # Debugging: Log the list of followed user IDs
-        print(f"Following user IDs: {following_user_ids}")
-
-        # If no users are followed, return an empty list
-        if not following_user_ids:
-            return {"videos": []}
-
-        videos = (
-            db.query(Video)
-            .filter(Video.uploader_id.in_(following_user_ids))
-            .order_by(Video.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+        # Read the precomputed inbox instead of joining across every followed user
+        rows, next_cursor = await db.run_sync(
+            read_following_feed, current_user.id, cursor=cursor, limit=limit, skip=skip
         )
-        return {"videos": [video.to_dict() for video in videos]}
-    except Exception as e:
-        print(f"Error fetching Following feed: {e}")
+        return ORJSONResponse({"videos": await serialize_videos(loaders, rows, expand), "next_cursor": next_cursor})
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error fetching Following feed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 
 # Fetch the "Podcasts" feed
 @router.get("/feed/podcasts")
-async def get_podcast_feed(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def get_podcast_feed(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    expand: List[VideoExpansion] = Query([]),
+    db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
+):
     """
-    Fetch podcasts for the podcast feed.
+    Fetch podcasts for the podcast feed, served from the response cache.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
     """
-    try:
-        podcasts = (
-            db.query(Video)
-            .filter(Video.is_podcast == True)
-            .order_by(Video.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-        return {"videos": [podcast.to_dict() for podcast in podcasts]}
-    except Exception as e:
-        print(f"Error fetching Podcasts feed: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    async def build():
+        try:
+            rows, next_cursor = await keyset_page(
+                db,
+                select(*VIDEO_PAYLOAD_COLUMNS).where(Video.is_podcast == True),
+                Video.created_at,
+                Video.id,
+                cursor=cursor,
+                limit=limit,
+                skip=skip,
+                scalars=False,
+            )
+            return {"videos": await serialize_videos(loaders, rows, expand), "next_cursor": next_cursor}
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Error fetching Podcasts feed")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+    return await response_cache.respond(request, build, tags=(VIDEOS_TAG,))
 
 
 # Like/unlike a video
 @router.post("/like/{video_id}")
-async def toggle_like_video(video_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+async def toggle_like_video(video_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
     """
     Toggle like status for a video.
+    The like count itself is buffered and written in batches by the counter flusher.
     """
     try:
-        video = db.query(Video).filter(Video.id == video_id).first()
+        video = await db.get(Video, video_id)
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
 
-        like = db.query(Video.likes).filter(
-            and_(Video.likes.video_id == video_id, Video.likes.user_id == current_user.id)
-        ).first()
+        like = await db.get(Like, (video_id, current_user.id))
 
         if like:
-            db.delete(like)
-            video.likes -= 1
+            await db.delete(like)
+            delta = -1
             message = "Video unliked successfully"
         else:
             new_like = Like(video_id=video_id, user_id=current_user.id)
             db.add(new_like)
-            video.likes += 1
+            delta = 1
             message = "Video liked successfully"
 
-        db.commit()
-        return {"message": message, "likes": video.likes}
-    except Exception as e:
-        print(f"Error toggling like: {e}")
+        await db.commit()
+        counter_buffer.add(video_id, likes=delta)
+        return {"message": message, "likes": counter_buffer.merge(video.to_dict())["likes"]}
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error toggling like")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+# Record a view
+@router.post("/view/{video_id}")
+async def record_view(
+    video_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_optional_user),
+):
+    """
+    Count a view of a video. Buffered in memory and flushed in batches.
+    Repeat views by the same user (or, anonymously, the same address) within
+    VIEW_DEDUP_WINDOW seconds are not counted.
+    """
+    if current_user is not None:
+        viewer_key = f"user:{current_user.id}"
+    else:
+        viewer_key = f"ip:{request.client.host if request.client else 'unknown'}"
+    # A repeat is known to be of an existing video, so it needs no query
+    if view_deduplicator.seen(viewer_key, video_id):
+        return {"message": "View already recorded"}
+    exists = await db.scalar(select(Video.id).where(Video.id == video_id))
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if not view_deduplicator.add(viewer_key, video_id):
+        return {"message": "View already recorded"}
+    counter_buffer.add(video_id, views=1)
+    return {"message": "View recorded"}
+
+
+@router.post("/views/batch")
+async def ingest_view_events(
+    batch: ViewEventBatch,
+    x_ingest_token: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_optional_user),
+):
+    """
+    Record many view/watch-time events at once.
+    Events are aggregated in memory per video and written in bulk by the view flusher;
+    distinct viewers are counted with a HyperLogLog sketch per video.
+    Signed-in users report their own views (their `viewer_id` is ignored); ingesters
+    presenting VIEW_INGEST_TOKEN report anyone's. Each event goes through the same
+    dedupe as POST /view/{video_id}, and only those that pass it (for videos that
+    exist) are counted.
+    """
+    trusted = bool(VIEW_INGEST_TOKEN) and x_ingest_token is not None and hmac.compare_digest(
+        x_ingest_token.encode(), VIEW_INGEST_TOKEN.encode()
+    )
+    if not trusted and current_user is None:
+        raise HTTPException(status_code=401, detail="Sign in or present an ingest token to report views")
+    if len(batch.events) > MAX_VIEW_EVENTS_PER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_VIEW_EVENTS_PER_BATCH} events per batch")
+
+    video_ids = {event.video_id for event in batch.events}
+    existing_ids = set((await db.execute(select(Video.id).where(Video.id.in_(video_ids)))).scalars())
+    views_per_video = {}
+    for event in batch.events:
+        if event.video_id not in existing_ids:
+            continue
+        viewer_id = event.viewer_id if trusted else str(current_user.id)
+        if not view_deduplicator.add(f"viewer:{viewer_id}" if trusted else f"user:{viewer_id}", event.video_id):
+            continue
+        view_aggregator.add(event.video_id, viewer_id, event.watch_ms)
+        views_per_video[event.video_id] = views_per_video.get(event.video_id, 0) + 1
+    for video_id, views in views_per_video.items():
+        counter_buffer.add(video_id, views=views)
+    return {"accepted": sum(views_per_video.values())}
+
+
 # Comment on a video
 @router.post("/comment/{video_id}")
-async def comment_on_video(video_id: int, text: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+async def comment_on_video(video_id: int, text: str, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user)):
     """
     Add a comment to a video.
     """
     try:
-        video = db.query(Video).filter(Video.id == video_id).first()
+        video = await db.get(Video, video_id)
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
 
-        new_comment = Comment(video_id=video_id, user_id=current_user.id, text=text)
+        new_comment = Comment(video_id=video_id, user_id=current_user.id, content=text)
         db.add(new_comment)
-        db.commit()
+        await db.flush()
+        await db.execute(
+            update(Video)
+            .where(Video.id == video_id)
+            .values(comment_count=func.coalesce(Video.comment_count, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.run_sync(bump_stats, video.uploader_id, comment_count=1)
+        await db.commit()
+        # Cached feeds embed comment previews (?expand=comments)
+        await response_cache.invalidate(VIDEOS_TAG)
         return {"message": "Comment added successfully"}
-    except Exception as e:
-        print(f"Error adding comment: {e}")
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error adding comment")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 # Fetch comments for a video
 @router.get("/comments/{video_id}")
-async def get_comments(video_id: int, db: Session = Depends(get_db)):
+async def get_comments(
+    video_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_COMMENTS_PER_PAGE),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    Fetch comments for a specific video.
+    Fetch a page of comments for a specific video, newest first.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
     """
     try:
-        comments = db.query(Comment).filter(Comment.video_id == video_id).all()
-        return {"comments": [{"id": c.id, "text": c.text, "user_id": c.user_id, "created_at": c.created_at.isoformat()} for c in comments]}
-    except Exception as e:
-        print(f"Error fetching comments: {e}")
+        rows, next_cursor = await keyset_page(
+            db,
+            select(Comment.id, Comment.content.label("text"), Comment.user_id, Comment.created_at)
+            .where(Comment.video_id == video_id),
+            Comment.created_at,
+            Comment.id,
+            cursor=cursor,
+            limit=limit,
+            scalars=False,
+        )
+        return ORJSONResponse({"comments": [dict(row._mapping) for row in rows], "next_cursor": next_cursor})
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error fetching comments")
         raise HTTPException(status_code=500, detail="Internal server error")
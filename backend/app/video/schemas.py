@@ -0,0 +1,14 @@
+from typing import List
+from pydantic import BaseModel
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int  # Total size of the file in bytes
+
+class ViewEvent(BaseModel):
+    video_id: int
+    viewer_id: str  # Stable per viewer, e.g. a user or device id
+    watch_ms: int = 0
+
+class ViewEventBatch(BaseModel):
+    events: List[ViewEvent]
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.video.hll import HyperLogLog
+from app.video.models import Video, VideoViewSketch
+from app.utils import run_periodically
+
+# Seconds between flushes of aggregated view events
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5.0"))
+
+# Events accepted per ingestion request, and the most watch time one event may report
+MAX_VIEW_EVENTS_PER_BATCH = int(os.getenv("MAX_VIEW_EVENTS_PER_BATCH", "500"))
+MAX_WATCH_MS_PER_EVENT = 6 * 60 * 60 * 1000
+
+# Seconds during which repeat views of a video by the same viewer are not counted,
+# and the most (viewer, video) pairs remembered for it
+VIEW_DEDUP_WINDOW = float(os.getenv("VIEW_DEDUP_WINDOW", "30"))
+VIEW_DEDUP_MAX_ENTRIES = int(os.getenv("VIEW_DEDUP_MAX_ENTRIES", "100000"))
+
+# Shared secret that trusted ingesters (e.g. an analytics pipeline) send as X-Ingest-Token
+# to report other viewers' events in bulk; unset, only signed-in users may report
+VIEW_INGEST_TOKEN = os.getenv("VIEW_INGEST_TOKEN", "")
+
+
+@dataclass
+class VideoViews:
+    """
+    View events for one video accumulated since the last flush.
+    """
+    sketch: HyperLogLog = field(default_factory=HyperLogLog)
+    watch_ms: int = 0
+
+
+class ViewAggregator:
+    """
+    Folds incoming view events into one sketch and one watch-time total per
+    video, so a flush writes a single row per video however many events arrived.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, VideoViews] = {}
+        self._lock = threading.Lock()
+
+    def add(self, video_id: int, viewer_key: str, watch_ms: int = 0) -> None:
+        watch_ms = min(max(watch_ms, 0), MAX_WATCH_MS_PER_EVENT)
+        with self._lock:
+            views = self._pending.get(video_id)
+            if views is None:
+                views = self._pending[video_id] = VideoViews()
+            views.sketch.add(viewer_key)
+            views.watch_ms += watch_ms
+
+    def drain(self) -> Dict[int, VideoViews]:
+        with self._lock:
+            drained, self._pending = self._pending, {}
+        return drained
+
+    def restore(self, drained: Dict[int, VideoViews]) -> None:
+        """
+        Merge back aggregates whose flush failed so they are retried on the next one.
+        """
+        with self._lock:
+            for video_id, views in drained.items():
+                current = self._pending.get(video_id)
+                if current is None:
+                    self._pending[video_id] = views
+                else:
+                    current.sketch.merge(views.sketch)
+                    current.watch_ms += views.watch_ms
+
+
+view_aggregator = ViewAggregator()
+
+
+class ViewDeduplicator:
+    """
+    Remembers recent (viewer, video) pairs so replayed or scripted views are
+    counted once per `window` seconds. Bounded LRU, local to this process.
+    """
+
+    def __init__(self, window: float = VIEW_DEDUP_WINDOW, max_entries: int = VIEW_DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, viewer_key: str, video_id: int) -> bool:
+        """
+        Whether this viewer's view of the video was counted within the window.
+        """
+        key = (viewer_key, video_id)
+        with self._lock:
+            expires_at = self._seen.get(key)
+            return expires_at is not None and expires_at > time.monotonic()
+
+    def add(self, viewer_key: str, video_id: int) -> bool:
+        """
+        Record a view; False when it repeats one counted within the window.
+        """
+        key = (viewer_key, video_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._seen.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._seen[key] = now + self.window
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return True
+
+
+view_deduplicator = ViewDeduplicator()
+
+
+def apply_view_aggregates(db: Session, drained: Dict[int, VideoViews]) -> None:
+    """
+    Merge drained sketches into the stored ones and write unique-viewer estimates
+    and watch time for all affected videos in bulk. The caller must commit.
+    """
+    existing_ids = set(db.execute(select(Video.id).where(Video.id.in_(list(drained)))).scalars())
+    if not existing_ids:
+        return
+
+    # Lock the stored sketches so concurrent workers merge one after another
+    stored = {
+        row.video_id: row
+        for row in db.query(VideoViewSketch)
+        .filter(VideoViewSketch.video_id.in_(existing_ids))
+        .with_for_update()
+        .all()
+    }
+
+    video_rows = []
+    for video_id in existing_ids:
+        views = drained[video_id]
+        row = stored.get(video_id)
+        if row is None:
+            sketch = views.sketch
+            db.add(VideoViewSketch(video_id=video_id, registers=sketch.to_bytes()))
+        else:
+            sketch = HyperLogLog.from_bytes(row.registers)
+            sketch.merge(views.sketch)
+            row.registers = sketch.to_bytes()
+        video_rows.append({"b_id": video_id, "b_unique": sketch.count(), "b_watch": views.watch_ms})
+
+    videos = Video.__table__
+    db.execute(
+        videos.update()
+        .where(videos.c.id == bindparam("b_id"))
+        .values(
+            unique_viewers=bindparam("b_unique"),
+            watch_time_ms=videos.c.watch_time_ms + bindparam("b_watch"),
+        ),
+        video_rows,
+    )
+
+
+async def flush_view_events(aggregator: ViewAggregator = view_aggregator) -> int:
+    """
+    Flush aggregated view events in one transaction; on failure they go back in the aggregator.
+    :return: The number of videos flushed.
+    """
+    drained = aggregator.drain()
+    if not drained:
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(apply_view_aggregates, drained)
+            await db.commit()
+    except BaseException:
+        aggregator.restore(drained)
+        raise
+    return len(drained)
+
+
+async def run_view_flusher(interval: float = VIEW_FLUSH_INTERVAL) -> None:
+    """
+    Background task that flushes aggregated view events every `interval` seconds.
+    """
+    await run_periodically(flush_view_events, interval, "view event flusher")
@@ -0,0 +1,278 @@
+"""
+Seeded synthetic dataset for the endpoint benchmarks and the load driver:
+N users with a power-law follower graph (a few creators followed by a large
+share of everyone, most by a handful), M videos uploaded mostly by the popular
+creators, comments and likes concentrated on the most viewed videos, and the
+derived tables (timeline inboxes, pull creators, user stats, search index)
+built the way the app maintains them.
+
+The same arguments always produce the same rows, so runs against different
+code are comparable. Generating into a database that already has users
+requires --reset, which drops and recreates every table:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.datagen --users 10000 --videos 50000 --reset
+    DATABASE_URL=postgresql://localhost/bytetok_bench python -m benchmarks.datagen --users 100000 --videos 1000000 --reset
+"""
+import argparse
+import math
+import os
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from app.database import Base, SessionLocal, engine
+from app.auth.models import User, followers
+from app.auth.utils import hash_password
+from app.video.models import Video, Comment, Like
+from app.timeline.models import PullCreator
+from app.timeline.service import rebuild_inbox, FANOUT_FOLLOWER_LIMIT
+from app.profile.stats import reconcile_user_stats
+from app.search.index import rebuild_postings
+import app.models  # noqa: F401  (register every table for create_all)
+
+# Every generated account logs in with this password
+BENCHMARK_PASSWORD = "benchmark-password"
+
+VOCABULARY_SIZE = 20000
+INSERT_BATCH = 10000
+
+# Popularity of the user at rank r is proportional to 1 / (r + 1) ** FOLLOW_EXPONENT
+FOLLOW_EXPONENT = 1.1
+
+# Videos span this many days back from the generation time
+VIDEO_HISTORY_DAYS = 30
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 10000
+    videos: int = 50000
+    comments: int = 200000
+    likes: int = 500000
+    mean_follows: int = 40
+    podcast_share: float = 0.1
+    seed: int = 42
+
+
+def word(rank: int) -> str:
+    """
+    A pronounceable synthetic word for a vocabulary rank.
+    """
+    syllables = ("ka", "lo", "mi", "ra", "te", "zu", "ne", "po", "shi", "va", "do", "ye")
+    parts = []
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank, len(syllables))
+        parts.append(syllables[digit])
+    return "".join(parts)
+
+
+def username(index: int) -> str:
+    return f"user{index}"
+
+
+def email(index: int) -> str:
+    return f"user{index}@example.com"
+
+
+def _sampler(weights: np.ndarray):
+    """
+    Draw indexes with probability proportional to `weights`: one cumulative sum,
+    then a binary search per draw (numpy's weighted choice redoes the sum every call).
+    """
+    cdf = np.cumsum(weights, dtype=np.float64)
+    cdf /= cdf[-1]
+
+    def sample(rng: np.random.Generator, size: int) -> np.ndarray:
+        return np.minimum(np.searchsorted(cdf, rng.random(size), side="right"), len(cdf) - 1)
+
+    return sample
+
+
+def _text(rng: np.random.Generator, sample_word, words: int) -> str:
+    return " ".join(word(int(rank)) for rank in sample_word(rng, words))
+
+
+def _insert(db, table, rows: List[dict], label: str) -> None:
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.execute(insert(table), rows[start:start + INSERT_BATCH])
+        print(f"\r{label}: {min(start + INSERT_BATCH, len(rows)):,}/{len(rows):,}", end="", flush=True)
+    db.commit()
+    print()
+
+
+def _ids(db, model) -> List[int]:
+    """
+    Ids of the rows just inserted into an empty table, in insertion order.
+    """
+    return db.execute(select(model.id).order_by(model.id)).scalars().all()
+
+
+def follow_edges(spec: DatasetSpec, rng: np.random.Generator) -> List[tuple]:
+    """
+    (follower index, followed index) pairs. Out-degrees are log-normal around
+    `mean_follows`; whom to follow is drawn from a Zipf popularity ranking over a
+    shuffled user order, so in-degrees follow a power law.
+    """
+    popularity = 1 / np.arange(1, spec.users + 1, dtype=np.float64) ** FOLLOW_EXPONENT
+    sample_followed = _sampler(rng.permutation(popularity))
+    sigma = 1.0
+    degrees = rng.lognormal(math.log(max(spec.mean_follows, 1)) - sigma ** 2 / 2, sigma, spec.users)
+    degrees = np.minimum(degrees.astype(np.int64), spec.users - 1)
+
+    edges = []
+    for follower, degree in enumerate(degrees):
+        if degree == 0:
+            continue
+        followed = np.unique(sample_followed(rng, int(degree * 1.5) + 2))
+        followed = followed[followed != follower][:degree]
+        edges.extend((follower, int(target)) for target in followed)
+    return edges
+
+
+def generate(spec: DatasetSpec, reset: bool = False) -> dict:
+    """
+    Fill the database with the dataset described by `spec`.
+    :param reset: Drop and recreate every table first.
+    :return: Row counts and timings of the generated dataset.
+    """
+    started = time.perf_counter()
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = np.random.default_rng(spec.seed)
+    sample_word = _sampler(1 / np.arange(1, VOCABULARY_SIZE + 1, dtype=np.float64))
+    now = datetime.utcnow().replace(microsecond=0)
+
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(User)):
+            raise SystemExit("The database already has users; pass --reset to drop and regenerate every table")
+
+        # One bcrypt hash for everyone: hashing per user would dominate generation time
+        hashed = hash_password(BENCHMARK_PASSWORD)
+        _insert(db, User, [
+            {"username": username(i), "email": email(i), "hashed_password": hashed}
+            for i in range(spec.users)
+        ], "users")
+        user_ids = _ids(db, User)
+
+        edges = follow_edges(spec, rng)
+        _insert(db, followers, [
+            {"follower_id": user_ids[a], "followed_id": user_ids[b]} for a, b in edges
+        ], "follows")
+        in_degree = np.bincount([b for _, b in edges], minlength=spec.users)
+
+        # Creators post in proportion to the square root of their audience
+        uploaders = _sampler(np.sqrt(in_degree + 1.0))(rng, spec.videos)
+        ages = np.sort(rng.uniform(0, VIDEO_HISTORY_DAYS * 86400, spec.videos))[::-1]
+        views = (rng.pareto(1.2, spec.videos) * 50).astype(np.int64)
+        podcasts = rng.random(spec.videos) < spec.podcast_share
+
+        # Comments and likes land on videos in proportion to their views
+        sample_video = _sampler(views + 1.0)
+        comment_videos = sample_video(rng, spec.comments)
+        comment_users = rng.integers(0, spec.users, spec.comments)
+        like_pairs = np.unique(
+            np.stack([sample_video(rng, spec.likes), rng.integers(0, spec.users, spec.likes)], axis=1),
+            axis=0,
+        )
+        comment_counts = np.bincount(comment_videos, minlength=spec.videos)
+        like_counts = np.bincount(like_pairs[:, 0], minlength=spec.videos)
+
+        _insert(db, Video, [
+            {
+                "title": _text(rng, sample_word, 4).capitalize(),
+                "description": _text(rng, sample_word, 10),
+                "url": f"/uploads/media/videos/bench-{i}.mp4",
+                "uploader_id": user_ids[uploaders[i]],
+                "is_podcast": bool(podcasts[i]),
+                "created_at": now - timedelta(seconds=float(ages[i])),
+                "likes": int(like_counts[i]),
+                "views": int(max(views[i], like_counts[i])),
+                "comment_count": int(comment_counts[i]),
+            }
+            for i in range(spec.videos)
+        ], "videos")
+        video_ids = _ids(db, Video)
+
+        _insert(db, Comment, [
+            {
+                "video_id": video_ids[video],
+                "user_id": user_ids[user],
+                "content": _text(rng, sample_word, 6).capitalize(),
+                "created_at": now - timedelta(seconds=float(ages[video]) * rng.random()),
+            }
+            for video, user in zip(comment_videos.tolist(), comment_users.tolist())
+        ], "comments")
+        _insert(db, Like, [
+            {"video_id": video_ids[video], "user_id": user_ids[user], "created_at": now}
+            for video, user in like_pairs.tolist()
+        ], "likes")
+
+        # Derived tables, as the write paths would have left them
+        heavy = [user_ids[i] for i in np.flatnonzero(in_degree > FANOUT_FOLLOWER_LIMIT)]
+        if heavy:
+            db.execute(insert(PullCreator), [{"user_id": uid} for uid in heavy])
+            db.commit()
+        follower_ids = sorted({user_ids[a] for a, _ in edges})
+        for count, uid in enumerate(follower_ids, 1):
+            rebuild_inbox(db, uid)
+            if count % 500 == 0 or count == len(follower_ids):
+                db.commit()
+                print(f"\rinboxes: {count:,}/{len(follower_ids):,}", end="", flush=True)
+        print()
+        reconcile_user_stats(db)
+        db.commit()
+        if engine.dialect.name != "postgresql":
+            # Core inserts skip the flush hook that maintains the fallback search index
+            rebuild_postings(db)
+            db.commit()
+
+    return {
+        "spec": asdict(spec),
+        "dialect": engine.dialect.name,
+        "follows": len(edges),
+        "likes": len(like_pairs),
+        "pull_creators": len(heavy),
+        "max_followers": int(in_degree.max()) if spec.users else 0,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main():
+    defaults = DatasetSpec()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--videos", type=int, default=defaults.videos)
+    parser.add_argument("--comments", type=int, default=defaults.comments)
+    parser.add_argument("--likes", type=int, default=defaults.likes)
+    parser.add_argument("--mean-follows", type=int, default=defaults.mean_follows)
+    parser.add_argument("--podcast-share", type=float, default=defaults.podcast_share)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+
+    spec = DatasetSpec(
+        users=args.users,
+        videos=args.videos,
+        comments=args.comments,
+        likes=args.likes,
+        mean_follows=args.mean_follows,
+        podcast_share=args.podcast_share,
+        seed=args.seed,
+    )
+    summary = generate(spec, reset=args.reset)
+    print(
+        f"Generated {spec.users:,} users, {summary['follows']:,} follows (max {summary['max_followers']:,} followers), "
+        f"{spec.videos:,} videos, {spec.comments:,} comments and {summary['likes']:,} likes "
+        f"on {summary['dialect']} in {summary['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
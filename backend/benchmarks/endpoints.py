@@ -0,0 +1,80 @@
+"""
+Per-endpoint latency, one request at a time, through the ASGI app in this
+process (routing, dependencies, database and serialization, without a network
+hop). Anonymous feeds are measured with a warm response cache, as production
+serves them.
+
+Generate a dataset first (benchmarks.datagen), then:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.endpoints --output endpoints.json
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.endpoints --only following,search --compare endpoints.json
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.harness import (
+    SCENARIOS, check_against, client, load_fixtures, make_report, prepare_app, print_results, summarize, write_report,
+)
+
+# Logins run bcrypt on purpose; fewer of them keep the run short
+SLOW_SCENARIOS = {"login": 0.1}
+
+
+async def measure(http, fixtures, name: str, iterations: int, warmup: int, seed: int) -> dict:
+    scenario = SCENARIOS[name]
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await scenario(http, fixtures, rng)
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = await scenario(http, fixtures, rng)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run(args):
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    fixtures = load_fixtures(seed=args.seed)
+    await prepare_app()
+    results = {}
+    async with client() as http:
+        for name in names:
+            iterations = max(1, int(args.iterations * SLOW_SCENARIOS.get(name, 1)))
+            results[name] = await measure(http, fixtures, name, iterations, args.warmup, args.seed)
+    return fixtures, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="a previous report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    fixtures, results = asyncio.run(run(args))
+    print(f"{fixtures.counts['users']:,} users, {fixtures.counts['videos']:,} videos; latency in ms")
+    print_results(results)
+
+    report = make_report("endpoints", results, fixtures, {"iterations": args.iterations, "warmup": args.warmup, "seed": args.seed})
+    if args.output:
+        write_report(args.output, report)
+    if args.compare:
+        check_against(args.compare, report, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Rows/sec of the feed read path: ORM entities + `to_dict` + the default JSON
+encoder (before) against column-projected rows + orjson (after).
+
+Run from the backend directory against a scratch database:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.feed_serialization --limit 50
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+from app.database import Base, SessionLocal, engine
+from app.auth.models import User
+from app.video.models import Video, VIDEO_PAYLOAD_COLUMNS, video_payload
+from app.responses import dumps
+import app.models  # noqa: F401  (register every table for create_all)
+
+
+def seed(rows: int) -> None:
+    """
+    Make sure the database holds at least `rows` videos.
+    """
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(Video))
+        if existing >= rows:
+            return
+        user = db.query(User).filter(User.username == "bench").first()
+        if user is None:
+            user = User(username="bench", email="bench@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+        now = datetime.utcnow()
+        db.add_all(
+            Video(
+                title=f"Benchmark video {i}",
+                description="A reasonably sized description for a short video " * 2,
+                url=f"/uploads/videos/bench-{i}.mp4",
+                uploader_id=user.id,
+                is_podcast=i % 5 == 0,
+                created_at=now - timedelta(seconds=i),
+                likes=i % 997,
+                views=i * 7,
+                unique_viewers=i * 3,
+            )
+            for i in range(existing, rows)
+        )
+        db.commit()
+
+
+def orm_page(limit: int, podcasts: bool) -> bytes:
+    with SessionLocal() as db:
+        stmt = select(Video)
+        if podcasts:
+            stmt = stmt.where(Video.is_podcast == True)
+        videos = db.execute(stmt.order_by(Video.created_at.desc(), Video.id.desc()).limit(limit)).scalars().all()
+        content = {"videos": [video.to_dict() for video in videos], "next_cursor": None}
+        # What FastAPI does with a returned dict under the default JSONResponse
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def projected_page(limit: int, podcasts: bool) -> bytes:
+    with SessionLocal() as db:
+        stmt = select(*VIDEO_PAYLOAD_COLUMNS)
+        if podcasts:
+            stmt = stmt.where(Video.is_podcast == True)
+        rows = db.execute(stmt.order_by(Video.created_at.desc(), Video.id.desc()).limit(limit)).all()
+        return dumps({"videos": [video_payload(row) for row in rows], "next_cursor": None})
+
+
+def measure(fn, limit: int, podcasts: bool, iterations: int) -> float:
+    """
+    :return: Rows per second over `iterations` pages.
+    """
+    fn(limit, podcasts)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(limit, podcasts)
+    elapsed = time.perf_counter() - start
+    return iterations * limit / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="videos to seed (default 5000)")
+    parser.add_argument("--limit", type=int, nargs="+", default=[10, 50], help="page sizes to measure")
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    print(f"{'feed':<10}{'limit':>6}{'before rows/s':>16}{'after rows/s':>16}{'speedup':>9}")
+    for feed, podcasts in (("for-you", False), ("podcasts", True)):
+        for limit in args.limit:
+            before = measure(orm_page, limit, podcasts, args.iterations)
+            after = measure(projected_page, limit, podcasts, args.iterations)
+            print(f"{feed:<10}{limit:>6}{before:>16,.0f}{after:>16,.0f}{after / before:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Follow graph queries answered by the in-memory graph (app.auth.graph) against
+the SQL that answers them from the `followers` table: membership, follower
+counts, mutual follows and friends-of-friends suggestions.
+
+Runs against an existing dataset, e.g. one made by benchmarks.datagen:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.datagen --users 100000
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.follow_graph
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from app.database import SessionLocal, engine
+from app.auth.graph import FollowGraph, load_follow_graph
+from app.auth.models import followers
+import app.models  # noqa: F401
+
+
+def sql_is_following(db, user_id: int, other_id: int) -> bool:
+    return db.execute(
+        select(followers.c.follower_id).where(followers.c.follower_id == user_id, followers.c.followed_id == other_id)
+    ).first() is not None
+
+
+def sql_followers_count(db, user_id: int, other_id: int) -> int:
+    return db.execute(select(func.count()).select_from(followers).where(followers.c.followed_id == user_id)).scalar()
+
+
+def sql_mutuals(db, user_id: int, other_id: int) -> list:
+    back = followers.alias("back")
+    return db.execute(
+        select(followers.c.followed_id)
+        .join(back, and_(back.c.follower_id == followers.c.followed_id, back.c.followed_id == followers.c.follower_id))
+        .where(followers.c.follower_id == user_id)
+    ).scalars().all()
+
+
+def sql_suggestions(db, user_id: int, other_id: int, limit: int = 20) -> list:
+    mine = followers.alias("mine")
+    theirs = followers.alias("theirs")
+    already = select(followers.c.followed_id).where(followers.c.follower_id == user_id)
+    return db.execute(
+        select(theirs.c.followed_id, func.count().label("n"))
+        .join(mine, mine.c.followed_id == theirs.c.follower_id)
+        .where(mine.c.follower_id == user_id, theirs.c.followed_id != user_id, theirs.c.followed_id.not_in(already))
+        .group_by(theirs.c.followed_id)
+        .order_by(func.count().desc())
+        .limit(limit)
+    ).all()
+
+
+def percentiles(samples: list) -> str:
+    cuts = statistics.quantiles(sorted(samples), n=100, method="inclusive")
+    return f"{cuts[49]:>10.3f}{cuts[94]:>10.3f}{cuts[98]:>10.3f}"
+
+
+def measure(fn, pairs) -> list:
+    timings = []
+    for user_id, other_id in pairs:
+        start = time.perf_counter()
+        fn(user_id, other_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--sql-iterations", type=int, default=100, help="iterations of each SQL query")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    graph = FollowGraph()
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        snapshot = load_follow_graph(db, graph)
+        elapsed = time.perf_counter() - start
+    if not snapshot.edges:
+        raise SystemExit("No follows to benchmark; generate a dataset with benchmarks.datagen first")
+    nbytes = sum(array.nbytes for array in (snapshot.out_offsets, snapshot.out_ids, snapshot.in_offsets, snapshot.in_ids))
+    print(
+        f"{snapshot.edges:,} follows of {snapshot.size - 1:,} users on {engine.dialect.name}: "
+        f"loaded in {elapsed:.2f}s, {nbytes / 2**20:.1f} MiB of arrays"
+    )
+
+    # Users who follow someone, paired with random other users (mostly non-edges)
+    rng = np.random.default_rng(args.seed)
+    active = np.flatnonzero(np.diff(snapshot.out_offsets))
+    users = rng.choice(active, args.iterations).tolist()
+    others = rng.choice(active, args.iterations).tolist()
+    pairs = list(zip(users, others))
+
+    with SessionLocal() as db:
+        operations = {
+            "is following": (graph.is_following, lambda u, o: sql_is_following(db, u, o)),
+            "followers count": (lambda u, o: graph.followers_count(u), lambda u, o: sql_followers_count(db, u, o)),
+            "mutuals": (lambda u, o: graph.mutuals(u), lambda u, o: sql_mutuals(db, u, o)),
+            "suggestions": (lambda u, o: graph.suggestions(u), lambda u, o: sql_suggestions(db, u, o)),
+        }
+        print(f"{'operation':<18}{'source':<8}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+        for name, (in_memory, sql) in operations.items():
+            print(f"{name:<18}{'graph':<8}{percentiles(measure(in_memory, pairs))}")
+            print(f"{'':<18}{'sql':<8}{percentiles(measure(sql, pairs[:args.sql_iterations]))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Load benchmark for the gift ledger: gifts/sec through the group-commit writer
+against one transaction per gift that also bumps the creator's balance row
+(the lock-per-gift design the ledger replaces). Ends with a settlement run
+and a reconciliation check.
+
+Run from the backend directory against a scratch database:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.gift_ledger --gifts 20000 --concurrency 500
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+from sqlalchemy import delete, select, update
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.auth.models import User
+from app.gifts.ledger import GIFT_CATALOG, GiftLedgerWriter, reconcile_gift_ledger, settle_gifts
+from app.gifts.models import CreatorBalance, GiftLedgerEntry, GiftSettlement
+import app.models  # noqa: F401  (register every table for create_all)
+
+
+def prepare() -> tuple:
+    """
+    Create the tables, empty the gift tables and return (sender_id, creator_id).
+    """
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.execute(delete(GiftLedgerEntry))
+        db.execute(delete(GiftSettlement))
+        db.execute(delete(CreatorBalance))
+        ids = []
+        for name in ("bench-sender", "bench-creator"):
+            user = db.scalar(select(User).where(User.username == name))
+            if user is None:
+                user = User(username=name, email=f"{name}@example.com", hashed_password="x")
+                db.add(user)
+                db.flush()
+            ids.append(user.id)
+        db.commit()
+    return tuple(ids)
+
+
+def gift_row(sender_id: int, creator_id: int) -> dict:
+    return {
+        "idempotency_key": uuid.uuid4().hex,
+        "sender_id": sender_id,
+        "recipient_id": creator_id,
+        "stream_id": None,
+        "gift": "rose",
+        "amount": GIFT_CATALOG["rose"],
+    }
+
+
+async def drive(send, gifts: int, concurrency: int) -> float:
+    """
+    Send `gifts` gifts from `concurrency` concurrent senders.
+    :return: Gifts per second.
+    """
+    remaining = iter(range(gifts))
+
+    async def sender():
+        for _ in remaining:
+            await send()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return gifts / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gifts", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--naive-gifts", type=int, default=2000, help="gifts for the per-gift baseline")
+    args = parser.parse_args()
+
+    sender_id, creator_id = prepare()
+
+    async def naive_send():
+        async with AsyncSessionLocal() as db:
+            row = gift_row(sender_id, creator_id)
+            db.add(GiftLedgerEntry(created_at=datetime.utcnow(), **row))
+            # Lock-per-gift: every gift updates the creator's single balance row
+            await db.execute(
+                update(CreatorBalance)
+                .where(CreatorBalance.user_id == creator_id)
+                .values(
+                    earned_amount=CreatorBalance.earned_amount + row["amount"],
+                    gift_count=CreatorBalance.gift_count + 1,
+                )
+            )
+            await db.commit()
+
+    with SessionLocal() as db:
+        db.add(CreatorBalance(user_id=creator_id, earned_amount=0, gift_count=0))
+        db.commit()
+    naive_rate = await drive(naive_send, args.naive_gifts, min(args.concurrency, 20))
+    prepare()
+
+    writer = GiftLedgerWriter()
+    rate = await drive(lambda: writer.submit(gift_row(sender_id, creator_id)), args.gifts, args.concurrency)
+    await writer.close()
+
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        settled = 0
+        while (settlement := settle_gifts(db)) is not None:
+            settled += settlement.entry_count
+            db.commit()
+        settle_seconds = time.perf_counter() - start
+        problems = reconcile_gift_ledger(db)
+
+    print(f"per-gift transactions: {naive_rate:>10,.0f} gifts/s")
+    print(f"group-commit ledger:   {rate:>10,.0f} gifts/s  ({writer.batches} commits for {args.gifts} gifts)")
+    print(f"settlement:            {settled:>10,} entries in {settle_seconds:.2f}s")
+    print(f"reconciliation:        {len(problems)} discrepancies")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,321 @@
+"""
+Shared by the endpoint benchmarks and the load driver: the HTTP client (the
+ASGI app in-process, or a running server), fixtures drawn from a generated
+dataset (see benchmarks.datagen), the request scenarios, latency summaries
+and JSON reports.
+
+Two reports compare as a regression check:
+
+    python -m benchmarks.harness baseline.json current.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import httpx
+import numpy as np
+from sqlalchemy import func, select
+from app.database import SessionLocal, engine
+from app.auth.models import User
+from app.auth.utils import create_token
+from app.profile.models import UserStats
+from app.video.models import Video
+from app.ranking.engine import refresh_candidate_pool
+from benchmarks.datagen import BENCHMARK_PASSWORD, word
+import app.models  # noqa: F401
+
+# Tokens outlive any run
+TOKEN_LIFETIME_HOURS = 24
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Fixtures:
+    """
+    Ids and credentials sampled from the dataset, so requests hit realistic rows.
+    """
+    user_ids: List[int]
+    emails: List[str]
+    tokens: Dict[int, str]
+    video_ids: List[int]
+    search_terms: List[str]
+    counts: Dict[str, int]
+
+    def auth(self, rng: random.Random, user_id: Optional[int] = None) -> dict:
+        """
+        Headers signing the request in as `user_id`, or as a random sampled user.
+        """
+        token = self.tokens[user_id if user_id is not None else rng.choice(self.user_ids)]
+        return {"Authorization": f"Bearer {token}"}
+
+
+def load_fixtures(sample: int = 200, seed: int = 7) -> Fixtures:
+    """
+    Sample users that follow someone (so their following feed has content) and
+    the most commented videos (the ones whose comment pages are actually read).
+    """
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        counts = {
+            "users": db.scalar(select(func.count()).select_from(User)),
+            "videos": db.scalar(select(func.count()).select_from(Video)),
+        }
+        if not counts["users"] or not counts["videos"]:
+            raise SystemExit("No dataset found; run python -m benchmarks.datagen first")
+        followers = db.execute(
+            select(UserStats.user_id).where(UserStats.following_count > 0).order_by(UserStats.user_id)
+        ).scalars().all()
+        if not followers:
+            # A dataset without follows: any users will do, their following feeds are just empty
+            followers = db.execute(select(User.id).order_by(User.id)).scalars().all()
+        user_ids = sorted(rng.sample(followers, min(sample, len(followers))))
+        emails = db.execute(select(User.email).where(User.id.in_(user_ids)).order_by(User.id)).scalars().all()
+        video_ids = db.execute(
+            select(Video.id).order_by(Video.comment_count.desc(), Video.id).limit(sample)
+        ).scalars().all()
+
+    lifetime = timedelta(hours=TOKEN_LIFETIME_HOURS)
+    return Fixtures(
+        user_ids=user_ids,
+        emails=emails,
+        tokens={uid: create_token({"sub": uid}, lifetime) for uid in user_ids},
+        video_ids=video_ids,
+        # Common, mid-frequency and rare words of the generator's vocabulary
+        search_terms=[word(rank) for rank in (*range(0, 10), *range(200, 210), *range(5000, 5010))],
+        counts=counts,
+    )
+
+
+Scenario = Callable[[httpx.AsyncClient, Fixtures, random.Random], Awaitable[httpx.Response]]
+
+
+async def health(client, fixtures, rng):
+    return await client.get("/")
+
+
+async def for_you_anonymous(client, fixtures, rng):
+    return await client.get("/video/feed/for-you", params={"limit": 10})
+
+
+async def for_you(client, fixtures, rng):
+    return await client.get("/video/feed/for-you", params={"limit": 10}, headers=fixtures.auth(rng))
+
+
+async def following(client, fixtures, rng):
+    return await client.get("/video/feed/following", params={"limit": 10}, headers=fixtures.auth(rng))
+
+
+async def podcasts(client, fixtures, rng):
+    return await client.get("/video/feed/podcasts", params={"limit": 10})
+
+
+async def own_profile(client, fixtures, rng):
+    return await client.get("/profile/", headers=fixtures.auth(rng))
+
+
+async def profile_videos(client, fixtures, rng):
+    user_id = rng.choice(fixtures.user_ids)
+    return await client.get(f"/profile/{user_id}", params={"limit": 10}, headers=fixtures.auth(rng, user_id))
+
+
+async def comments(client, fixtures, rng):
+    return await client.get(f"/video/comments/{rng.choice(fixtures.video_ids)}", params={"limit": 20})
+
+
+async def search(client, fixtures, rng):
+    return await client.get("/video/search", params={"q": rng.choice(fixtures.search_terms), "prefix": "false"})
+
+
+async def for_you_expanded(client, fixtures, rng):
+    params = {"limit": 10, "expand": ["uploader", "comments"]}
+    return await client.get("/video/feed/for-you", params=params, headers=fixtures.auth(rng))
+
+
+async def video_batch(client, fixtures, rng):
+    ids = ",".join(str(video_id) for video_id in rng.sample(fixtures.video_ids, 20))
+    return await client.get("/video/batch", params={"ids": ids, "expand": ["uploader", "comments"]})
+
+
+async def users_batch(client, fixtures, rng):
+    ids = ",".join(str(user_id) for user_id in rng.sample(fixtures.user_ids, 20))
+    return await client.get("/auth/users/batch", params={"ids": ids})
+
+
+async def record_view(client, fixtures, rng):
+    return await client.post(f"/video/view/{rng.choice(fixtures.video_ids)}")
+
+
+async def login(client, fixtures, rng):
+    return await client.post("/auth/login", json={"email": rng.choice(fixtures.emails), "password": BENCHMARK_PASSWORD})
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "health": health,
+    "for_you_anonymous": for_you_anonymous,
+    "for_you": for_you,
+    "following": following,
+    "podcasts": podcasts,
+    "own_profile": own_profile,
+    "profile_videos": profile_videos,
+    "comments": comments,
+    "search": search,
+    "for_you_expanded": for_you_expanded,
+    "video_batch": video_batch,
+    "users_batch": users_batch,
+    "record_view": record_view,
+    "login": login,
+}
+
+# Relative frequency of each scenario in the load mix (reads dominate, logins are rare)
+LOAD_MIX = {
+    "for_you_anonymous": 15,
+    "for_you": 25,
+    "following": 15,
+    "podcasts": 5,
+    "own_profile": 5,
+    "profile_videos": 8,
+    "comments": 10,
+    "search": 5,
+    "record_view": 11,
+    "login": 1,
+}
+
+
+def client(url: Optional[str] = None, timeout: float = 30.0) -> httpx.AsyncClient:
+    """
+    A client for a running server at `url`, or for the app in this process.
+    Against a server, its SECRET_KEY must match this process's (tokens are minted here).
+    """
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=timeout)
+
+
+async def prepare_app() -> None:
+    """
+    What the app's startup hook would have done that the measured paths depend
+    on (the ASGI transport does not run lifespan events): load the ranking pool.
+    """
+    await refresh_candidate_pool()
+
+
+def summarize(latencies_ms: List[float], errors: int = 0, seconds: Optional[float] = None) -> dict:
+    """
+    Latency percentiles in milliseconds, plus throughput when the wall time is known.
+    """
+    summary = {"requests": len(latencies_ms), "errors": errors}
+    if latencies_ms:
+        samples = np.asarray(latencies_ms)
+        for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+            summary[f"p{p}"] = round(float(value), 3)
+        summary["mean"] = round(float(samples.mean()), 3)
+        summary["max"] = round(float(samples.max()), 3)
+    if seconds:
+        summary["throughput"] = round(len(latencies_ms) / seconds, 1)
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(kind: str, results: Dict[str, dict], fixtures: Fixtures, options: dict) -> dict:
+    """
+    Results with what is needed to judge whether two reports are comparable.
+    """
+    return {
+        "kind": kind,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": _git_commit(),
+        "dialect": engine.dialect.name,
+        "python": platform.python_version(),
+        "dataset": fixtures.counts,
+        "options": options,
+        "results": results,
+    }
+
+
+def write_report(path: str, report: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def print_results(results: Dict[str, dict]) -> None:
+    print(f"{'scenario':<20}{'requests':>9}{'errors':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}")
+    for name, summary in results.items():
+        print(
+            f"{name:<20}{summary['requests']:>9}{summary['errors']:>7}"
+            + "".join(f"{summary.get(f'p{p}', float('nan')):>9.2f}" for p in PERCENTILES)
+            + f"{summary.get('throughput', float('nan')):>9.1f}"
+        )
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float = 0.10) -> List[str]:
+    """
+    Print per-scenario changes and list the regressions: a percentile more than
+    `threshold` slower, throughput more than `threshold` lower, or new errors.
+    """
+    if baseline.get("dataset") != current.get("dataset") or baseline.get("dialect") != current.get("dialect"):
+        print("warning: the reports were taken on different datasets or databases")
+    regressions = []
+    print(f"{'scenario':<20}{'metric':<12}{'baseline':>10}{'current':>10}{'change':>9}")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric in (*(f"p{p}" for p in PERCENTILES), "throughput"):
+            if metric not in before or metric not in now or not before[metric]:
+                continue
+            change = (now[metric] - before[metric]) / before[metric]
+            worse = change < -threshold if metric == "throughput" else change > threshold
+            print(f"{name:<20}{metric:<12}{before[metric]:>10.2f}{now[metric]:>10.2f}{change:>+8.0%}{'  !' if worse else ''}")
+            if worse:
+                regressions.append(f"{name} {metric} {change:+.0%}")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name} errors {before['errors']} -> {now['errors']}")
+    return regressions
+
+
+def check_against(baseline_path: str, report: dict, threshold: float = 0.10) -> None:
+    """
+    Compare `report` with a saved baseline and exit with status 1 on regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare_reports(baseline, report, threshold)
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        sys.exit(1)
+    print("No regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.current) as f:
+        current = json.load(f)
+    check_against(args.baseline, current, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
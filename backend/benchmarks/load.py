@@ -0,0 +1,96 @@
+"""
+Concurrent load: `--concurrency` clients each send the next request as soon as
+the previous one answers, for `--duration` seconds, choosing scenarios from a
+weighted mix of feed, profile, comment, search, view and login requests
+(harness.LOAD_MIX). Reports throughput and p50/p95/p99 overall and per scenario.
+
+In-process through the ASGI app by default (the load generator shares the
+event loop, so absolute throughput is a floor), or against a running server
+started on the same database and SECRET_KEY:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.load --concurrency 32 --duration 30 --output load.json
+    DATABASE_URL=postgresql://localhost/bytetok_bench python -m benchmarks.load --url http://localhost:8000 --compare load.json
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.harness import (
+    LOAD_MIX, SCENARIOS, check_against, client, load_fixtures, make_report, prepare_app, print_results, summarize,
+    write_report,
+)
+
+
+async def _client_loop(http, fixtures, rng: random.Random, deadline: float, warmup_until: float, latencies, errors) -> None:
+    names, weights = list(LOAD_MIX), list(LOAD_MIX.values())
+    while (now := time.perf_counter()) < deadline:
+        name = rng.choices(names, weights)[0]
+        try:
+            response = await SCENARIOS[name](http, fixtures, rng)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        if now >= warmup_until:
+            latencies[name].append((time.perf_counter() - now) * 1000)
+            errors[name] += failed
+
+
+async def run(args):
+    fixtures = load_fixtures(seed=args.seed)
+    if not args.url:
+        await prepare_app()
+    latencies, errors = defaultdict(list), Counter()
+    async with client(args.url) as http:
+        start = time.perf_counter()
+        warmup_until = start + args.warmup
+        deadline = warmup_until + args.duration
+        await asyncio.gather(*(
+            _client_loop(http, fixtures, random.Random(args.seed + i), deadline, warmup_until, latencies, errors)
+            for i in range(args.concurrency)
+        ))
+        # Requests still in flight at the deadline finish late; measure to the last one
+        elapsed = time.perf_counter() - warmup_until
+
+    results = {"all": summarize([ms for samples in latencies.values() for ms in samples], sum(errors.values()), elapsed)}
+    for name in LOAD_MIX:
+        if name in latencies:
+            results[name] = summarize(latencies[name], errors[name], elapsed)
+    return fixtures, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--url", help="base URL of a running server (default: the app in this process)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="a previous report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    fixtures, results = asyncio.run(run(args))
+    target = args.url or "in-process"
+    print(f"{args.concurrency} clients for {args.duration:g}s against {target}; latency in ms")
+    print_results(results)
+
+    options = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "target": target,
+        "seed": args.seed,
+        "mix": LOAD_MIX,
+    }
+    report = make_report("load", results, fixtures, options)
+    if args.output:
+        write_report(args.output, report)
+    if args.compare:
+        check_against(args.compare, report, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
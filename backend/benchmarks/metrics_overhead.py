@@ -0,0 +1,114 @@
+"""
+Cost of the request metrics and SQL accounting (app.metrics), measured two ways:
+
+- in isolation: the middleware around a no-op ASGI app, and the engine event
+  handlers around one statement, so the fixed costs are visible without noise;
+- end to end: the endpoint benchmarks with METRICS_ENABLED=0 and =1 in
+  alternating subprocesses (neither side gets a warmer process), reporting
+  the difference in median latency per scenario.
+
+Generate a dataset first (benchmarks.datagen), then:
+
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.metrics_overhead --rounds 5
+    python -m benchmarks.metrics_overhead --fixed-only
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SCENARIOS = "health,for_you_anonymous,following,own_profile,comments,search"
+
+
+async def _noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _discard(message):
+    pass
+
+
+async def _per_call_us(app, scope: dict, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await app(dict(scope), None, _discard)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def fixed_costs(calls: int = 100000) -> dict:
+    """
+    Microseconds the middleware adds to a request, and the query hooks to a statement.
+    """
+    from app.metrics.middleware import MetricsMiddleware
+    from app.metrics import queries
+
+    class Route:
+        path_format = "/video/comments/{video_id}"
+
+    scope = {"type": "http", "method": "GET", "path": "/video/comments/1", "route": Route(), "path_params": {"video_id": 1}}
+    bare = asyncio.run(_per_call_us(_noop_app, scope, calls))
+    wrapped = asyncio.run(_per_call_us(MetricsMiddleware(_noop_app), scope, calls))
+
+    class Connection:
+        info = {}
+
+    connection, statement = Connection(), "SELECT videos.id FROM videos WHERE videos.id = ?"
+    token = queries.start_request()
+    start = time.perf_counter()
+    for _ in range(calls):
+        queries._before_cursor_execute(connection, None, statement, None, None, False)
+        queries._after_cursor_execute(connection, None, statement, None, None, False)
+    per_query = (time.perf_counter() - start) / calls * 1e6
+    queries.end_request(token)
+    return {"request": wrapped - bare, "query": per_query}
+
+
+def run_endpoints(enabled: bool, scenarios: str, iterations: int) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.endpoints", "--only", scenarios,
+             "--iterations", str(iterations), "--output", output.name],
+            env={**os.environ, "METRICS_ENABLED": "1" if enabled else "0"},
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output.name) as f:
+            return json.load(f)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--only", default=DEFAULT_SCENARIOS, help="comma separated scenario names")
+    parser.add_argument("--fixed-only", action="store_true", help="skip the end-to-end comparison (needs no dataset)")
+    args = parser.parse_args()
+
+    costs = fixed_costs()
+    print(f"middleware: {costs['request']:.1f} us per request; query hooks: {costs['query']:.2f} us per statement")
+    if args.fixed_only:
+        return
+
+    medians = {False: {}, True: {}}
+    for round_number in range(args.rounds):
+        for enabled in (False, True):
+            for name, summary in run_endpoints(enabled, args.only, args.iterations).items():
+                medians[enabled].setdefault(name, []).append(summary["p50"])
+        print(f"\rround {round_number + 1}/{args.rounds}", end="", flush=True)
+    print()
+
+    print(f"{'scenario':<20}{'off p50':>10}{'on p50':>10}{'overhead':>11}")
+    for name in medians[False]:
+        off = statistics.median(medians[False][name])
+        on = statistics.median(medians[True][name])
+        print(f"{name:<20}{off:>10.3f}{on:>10.3f}{(on - off) * 1000:>+8.0f} us ({(on - off) / off:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Search latency over a seeded video table: the indexed engine (GIN-indexed
+tsvector on Postgres, the postings index elsewhere) against the LIKE scan a
+client effectively runs when it pages through feeds looking for a word.
+
+Seeds once (Zipf-distributed words, so common and rare terms both occur), then
+reports p50/p95/p99 per query shape. The reference dataset is 1M videos:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.search --videos 1000000
+    DATABASE_URL=sqlite:///./benchmark.db python -m benchmarks.search --videos 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+from sqlalchemy import func, insert, or_, select
+from app.database import Base, SessionLocal, engine
+from app.auth.models import User
+from app.video.models import Video
+from app.search.index import rebuild_postings, search_ids
+from app.search.models import VIDEO_DOC
+from benchmarks.datagen import VOCABULARY_SIZE, word
+import app.models  # noqa: F401  (register every table for create_all)
+
+SEED_BATCH = 10000
+
+
+def seed(videos: int) -> None:
+    """
+    Make sure the database holds at least `videos` videos with searchable text.
+    """
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(Video))
+        if existing >= videos:
+            return
+        user = db.scalar(select(User).where(User.username == "bench"))
+        if user is None:
+            user = User(username="bench", email="bench@example.com", hashed_password="x")
+            db.add(user)
+            db.commit()
+        now = datetime.utcnow()
+        for start in range(existing, videos, SEED_BATCH):
+            rows = []
+            for i in range(start, min(start + SEED_BATCH, videos)):
+                ranks = rng.choices(range(VOCABULARY_SIZE), weights, k=14)
+                rows.append({
+                    "title": " ".join(word(rank) for rank in ranks[:4]).capitalize(),
+                    "description": " ".join(word(rank) for rank in ranks[4:]),
+                    "url": f"/uploads/videos/bench-{i}.mp4",
+                    "uploader_id": user.id,
+                    "created_at": now - timedelta(seconds=i),
+                })
+            # Core inserts skip the flush hook; the fallback index is rebuilt below
+            db.execute(insert(Video), rows)
+            db.commit()
+            print(f"\rseeded {min(start + SEED_BATCH, videos):,} videos", end="", flush=True)
+        print()
+        if engine.dialect.name != "postgresql":
+            start = time.perf_counter()
+            rebuild_postings(db)
+            db.commit()
+            print(f"built the postings index in {time.perf_counter() - start:.1f}s")
+
+
+def like_scan(db, query: str, limit: int) -> list:
+    """
+    Baseline: substring match on title and description, newest first.
+    """
+    clauses = [or_(Video.title.ilike(f"%{term}%"), Video.description.ilike(f"%{term}%")) for term in query.split()]
+    stmt = select(Video.id).where(*clauses).order_by(Video.created_at.desc(), Video.id.desc()).limit(limit)
+    return db.execute(stmt).scalars().all()
+
+
+def indexed(db, query: str, limit: int) -> list:
+    return search_ids(db, VIDEO_DOC, query, limit=limit, prefix=False)[0]
+
+
+def typeahead(db, query: str, limit: int) -> list:
+    return search_ids(db, VIDEO_DOC, query, limit=limit, prefix=True)[0]
+
+
+def deep_page(db, query: str, limit: int, pages: int = 5) -> list:
+    """
+    Follow the cursor `pages` pages deep.
+    """
+    after = None
+    for _ in range(pages):
+        hits, has_more = search_ids(db, VIDEO_DOC, query, after=after, limit=limit, prefix=False)
+        if not has_more:
+            break
+        after = (hits[-1][1], hits[-1][0])
+    return hits
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return f"{cuts[49]:>8.2f}{cuts[94]:>8.2f}{cuts[98]:>8.2f}"
+
+
+def measure(fn, db, queries: list, limit: int, iterations: int) -> list:
+    timings = []
+    for i in range(iterations):
+        query = queries[i % len(queries)]
+        start = time.perf_counter()
+        fn(db, query, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--baseline-iterations", type=int, default=20, help="iterations of the (slow) LIKE scan")
+    args = parser.parse_args()
+
+    seed(args.videos)
+    shapes = {
+        "common term": ([word(rank) for rank in range(0, 10)], indexed),
+        "rare term": ([word(rank) for rank in range(5000, 5050)], indexed),
+        "two terms": ([f"{word(a)} {word(b)}" for a, b in zip(range(0, 20), range(20, 40))], indexed),
+        "typeahead": ([f"{word(rank)} {word(rank + 1)[:3]}" for rank in range(100, 150)], typeahead),
+    }
+
+    print(f"{args.videos:,} videos on {engine.dialect.name}, limit {args.limit}; latency in ms")
+    print(f"{'query':<14}{'engine':<10}{'p50':>8}{'p95':>8}{'p99':>8}")
+    with SessionLocal() as db:
+        for shape, (queries, search) in shapes.items():
+            for name, fn, iterations in (
+                ("like scan", like_scan, args.baseline_iterations),
+                ("indexed", search, args.iterations),
+            ):
+                fn(db, queries[0], args.limit)  # warm up
+                print(f"{shape:<14}{name:<10}{percentiles(measure(fn, db, queries, args.limit, iterations))}")
+        timings = measure(deep_page, db, shapes["common term"][0], args.limit, args.iterations // 4)
+        print(f"{'page 5':<14}{'indexed':<10}{percentiles(timings)}")
+
+
+if __name__ == "__main__":
+    main()
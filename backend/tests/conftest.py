@@ -0,0 +1,57 @@
+import os
+import tempfile
+import uuid
+
+# app.database and app.auth.utils read these at import time
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bytetok-tests.db')}")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-that-is-long-enough-for-hs256")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, _enable_sqlite_foreign_keys
+import app.models  # noqa: F401  (register every table for create_all)
+
+# A Redis server for the Redis-backed tests; without one they run on fakeredis, or are skipped
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Sessions on a fresh SQLite database with every table created.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    _enable_sqlite_foreign_keys(engine)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def redis_client_factory():
+    """
+    Makes async clients of one Redis: TEST_REDIS_URL's server, or else a
+    fakeredis server shared by the clients of one test. Skips the test when
+    neither the server nor fakeredis is available.
+    """
+    pytest.importorskip("redis")
+    if TEST_REDIS_URL:
+        from redis import asyncio as redis_asyncio
+        return lambda: redis_asyncio.from_url(TEST_REDIS_URL)
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeAsyncRedis(server=server)
+
+
+@pytest.fixture
+def redis_prefix():
+    """
+    A key prefix of this test's own, so tests sharing a real server do not meet.
+    """
+    return f"bytetok-test:{uuid.uuid4().hex}:"
@@ -0,0 +1,41 @@
+"""
+Processors standing in for the media pipeline in tests. The worker imports this
+module in its pool processes, so the stubs carry any state they need in the
+payload or on disk rather than in module globals.
+"""
+import os
+from app.jobs.processors import PermanentProcessingError, ProcessingError, register_processor
+
+STUB_SUCCEED = "stub_succeed"
+STUB_FAIL_ONCE = "stub_fail_once"
+STUB_FAIL_PERMANENTLY = "stub_fail_permanently"
+STUB_CHECKSUM_WITHOUT_KEY = "stub_checksum_without_key"
+
+
+@register_processor(STUB_SUCCEED)
+def succeed(payload: dict) -> dict:
+    return {"duration_ms": payload["duration_ms"], "thumbnail_url": "/thumbnails/stub.jpg"}
+
+
+@register_processor(STUB_FAIL_ONCE)
+def fail_once(payload: dict) -> dict:
+    """
+    Fails the first time it runs (recorded by creating `payload["marker"]`), then succeeds.
+    """
+    if not os.path.exists(payload["marker"]):
+        open(payload["marker"], "w").close()
+        raise ProcessingError("transient failure")
+    return {"duration_ms": payload["duration_ms"]}
+
+
+@register_processor(STUB_FAIL_PERMANENTLY)
+def fail_permanently(payload: dict) -> dict:
+    raise PermanentProcessingError("corrupt file")
+
+
+@register_processor(STUB_CHECKSUM_WITHOUT_KEY)
+def checksum_without_key(payload: dict) -> dict:
+    """
+    Reports a replacement file's checksum without saying where the file was stored.
+    """
+    return {"checksum": "0" * 64, "size_bytes": 10}
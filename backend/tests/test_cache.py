@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from app.cache.backends import MemoryBackend, RedisBackend
+from app.cache.response import ResponseCache, VIDEOS_TAG
+
+pytestmark = pytest.mark.anyio
+
+
+def redis_backend(client, prefix: str) -> RedisBackend:
+    backend = RedisBackend("redis://localhost", prefix=prefix)
+    backend.client = client
+    return backend
+
+
+@pytest.fixture(params=["memory", "redis"])
+async def make_backend(request):
+    """
+    Makes backends sharing one store: the same MemoryBackend (one process), or
+    clients of one Redis (one per worker). Cleared after the test.
+    """
+    if request.param == "memory":
+        shared = MemoryBackend()
+        yield lambda: shared
+        await shared.clear()
+        return
+    factory = request.getfixturevalue("redis_client_factory")
+    prefix = request.getfixturevalue("redis_prefix")
+    made = []
+
+    def make():
+        made.append(redis_backend(factory(), prefix))
+        return made[-1]
+
+    yield make
+    if made:
+        await made[0].clear()
+
+
+async def test_set_and_get(make_backend):
+    backend = make_backend()
+    assert await backend.get("missing") is None
+    await backend.set("a", b"1")
+    await backend.set("b", b"2")
+    assert await backend.get("a") == b"1"
+    assert await backend.get_many(["a", "missing", "b"]) == [b"1", None, b"2"]
+    assert await backend.get_many([]) == []
+
+
+async def test_entries_expire(make_backend):
+    backend = make_backend()
+    await backend.set("short", b"x", ttl=0.05)
+    await backend.set("long", b"y", ttl=60)
+    await asyncio.sleep(0.1)
+    assert await backend.get("short") is None
+    assert await backend.get("long") == b"y"
+
+
+async def test_incr_counts_from_zero(make_backend):
+    backend = make_backend()
+    assert await backend.incr("gen:videos") == 1
+    assert await backend.incr("gen:videos") == 2
+    assert int(await backend.get("gen:videos")) == 2
+
+
+async def test_clear(make_backend):
+    backend = make_backend()
+    await backend.set("a", b"1")
+    await backend.clear()
+    assert await backend.get("a") is None
+
+
+def make_request(path: str = "/video/feed/for-you", query: bytes = b"limit=5") -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+async def test_response_cache_serves_hits(make_backend):
+    cache = ResponseCache(make_backend(), default_ttl=60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {"videos": [1, 2, 3]}
+
+    first = await cache.respond(make_request(), build, tags=(VIDEOS_TAG,))
+    second = await cache.respond(make_request(), build, tags=(VIDEOS_TAG,))
+    assert len(builds) == 1
+    assert first.body == second.body
+    assert first.headers["etag"] == second.headers["etag"]
+
+    await cache.respond(make_request(query=b"limit=10"), build, tags=(VIDEOS_TAG,))
+    assert len(builds) == 2
+
+
+async def test_invalidation_reaches_every_worker(make_backend):
+    # Two workers' caches over the same store
+    worker_a = ResponseCache(make_backend(), default_ttl=60)
+    worker_b = ResponseCache(make_backend(), default_ttl=60)
+    version = {"value": 1}
+
+    async def build():
+        return {"version": version["value"]}
+
+    assert (await worker_a.respond(make_request(), build, tags=(VIDEOS_TAG,))).body == b'{"version":1}'
+    version["value"] = 2
+    assert (await worker_b.respond(make_request(), build, tags=(VIDEOS_TAG,))).body == b'{"version":1}'
+
+    await worker_a.invalidate(VIDEOS_TAG)
+    assert (await worker_b.respond(make_request(), build, tags=(VIDEOS_TAG,))).body == b'{"version":2}'
+
+
+async def test_concurrent_misses_share_one_build(make_backend):
+    cache = ResponseCache(make_backend(), default_ttl=60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    responses = await asyncio.gather(*(cache.respond(make_request(), build) for _ in range(10)))
+    assert len(builds) == 1
+    assert {response.body for response in responses} == {b'{"ok":true}'}
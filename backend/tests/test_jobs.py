@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+import pytest
+from app.jobs import queue, worker as worker_module
+from app.jobs.models import Job, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+from app.jobs.queue import claim_jobs, complete_job, enqueue_job, fail_job
+from app.jobs.worker import JobWorker
+from app.video.models import Video, PROCESSING, PROCESSING_FAILED, PROCESSING_PENDING, PROCESSING_READY
+from tests.stub_processors import STUB_CHECKSUM_WITHOUT_KEY, STUB_FAIL_ONCE, STUB_FAIL_PERMANENTLY, STUB_SUCCEED
+
+
+def make_video_job(session_factory, kind: str, payload: dict, max_attempts: int = 3):
+    with session_factory() as db:
+        video = Video(title="clip", url="/uploads/videos/clip.mp4", processing_status=PROCESSING_PENDING)
+        db.add(video)
+        db.flush()
+        job = enqueue_job(db, kind, payload, video_id=video.id, max_attempts=max_attempts)
+        db.commit()
+        return job.id, video.id
+
+
+def load(session_factory, job_id: int, video_id: int):
+    with session_factory() as db:
+        return db.get(Job, job_id), db.get(Video, video_id)
+
+
+def run_worker(session_factory) -> JobWorker:
+    worker = JobWorker(processes=1, poll_interval=0.05, processor_modules=["tests.stub_processors"], session_factory=session_factory)
+    worker.run(exit_when_idle=True)
+    return worker
+
+
+def test_successful_job_marks_video_ready(session_factory):
+    job_id, video_id = make_video_job(session_factory, STUB_SUCCEED, {"duration_ms": 1500})
+
+    worker = run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (1, 0)
+    assert job.status == JOB_SUCCEEDED and job.attempts == 1 and job.finished_at is not None
+    assert video.processing_status == PROCESSING_READY
+    assert video.duration_ms == 1500
+    assert video.thumbnail_url == "/thumbnails/stub.jpg"
+
+
+def test_failed_attempt_is_retried(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(queue, "retry_delay", lambda attempts: 0)
+    job_id, video_id = make_video_job(
+        session_factory, STUB_FAIL_ONCE, {"duration_ms": 900, "marker": str(tmp_path / "failed-once")},
+    )
+
+    worker = run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (1, 1)
+    assert job.status == JOB_SUCCEEDED and job.attempts == 2
+    assert job.last_error is None
+    assert video.processing_status == PROCESSING_READY and video.duration_ms == 900
+
+
+def test_failed_attempt_waits_for_backoff(session_factory, tmp_path):
+    job_id, video_id = make_video_job(
+        session_factory, STUB_FAIL_ONCE, {"duration_ms": 900, "marker": str(tmp_path / "failed-once")},
+    )
+
+    worker = run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (0, 1)
+    assert job.status == JOB_QUEUED and job.attempts == 1
+    assert job.last_error == "ProcessingError: transient failure"
+    assert job.run_after > datetime.utcnow()
+    assert video.processing_status == PROCESSING_PENDING
+
+
+def test_permanent_failure_is_not_retried(session_factory):
+    job_id, video_id = make_video_job(session_factory, STUB_FAIL_PERMANENTLY, {})
+
+    worker = run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (0, 1)
+    assert job.status == JOB_FAILED and job.attempts == 1
+    assert job.last_error == "PermanentProcessingError: corrupt file"
+    assert video.processing_status == PROCESSING_FAILED
+
+
+def test_unknown_job_kind_fails_permanently(session_factory):
+    job_id, video_id = make_video_job(session_factory, "no_such_kind", {})
+
+    run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert job.status == JOB_FAILED and job.attempts == 1
+    assert video.processing_status == PROCESSING_FAILED
+
+
+def test_malformed_result_fails_job(session_factory):
+    job_id, video_id = make_video_job(session_factory, STUB_CHECKSUM_WITHOUT_KEY, {})
+
+    worker = run_worker(session_factory)
+
+    job, video = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (0, 1)
+    assert job.status == JOB_FAILED and job.attempts == 1
+    assert job.last_error == "PermanentProcessingError: Processor returned a checksum without key"
+    assert video.processing_status == PROCESSING_FAILED
+
+
+def test_lost_lease_is_not_counted_as_success(session_factory, monkeypatch):
+    monkeypatch.setattr(worker_module, "complete_job", lambda *args: None)
+    job_id, video_id = make_video_job(session_factory, STUB_SUCCEED, {"duration_ms": 1})
+
+    worker = run_worker(session_factory)
+
+    job, _ = load(session_factory, job_id, video_id)
+    assert (worker.succeeded, worker.failed) == (0, 0)
+    assert job.status == JOB_RUNNING
+
+
+def expire_lease(session_factory, job_id: int) -> None:
+    with session_factory() as db:
+        db.get(Job, job_id).locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+
+def test_expired_lease_passes_job_to_another_worker(session_factory):
+    job_id, video_id = make_video_job(session_factory, STUB_SUCCEED, {"duration_ms": 1})
+    with session_factory() as db:
+        assert [job.id for job in claim_jobs(db, "worker-a", 10)] == [job_id]
+        db.commit()
+    with session_factory() as db:
+        assert claim_jobs(db, "worker-b", 10) == []
+        db.commit()
+
+    expire_lease(session_factory, job_id)
+    with session_factory() as db:
+        assert [job.id for job in claim_jobs(db, "worker-b", 10)] == [job_id]
+        db.commit()
+
+    # The worker that lost the lease can no longer record an outcome
+    with session_factory() as db:
+        assert complete_job(db, job_id, "worker-a", {"duration_ms": 1}) is None
+        assert fail_job(db, job_id, "worker-a", "late failure") is None
+        db.rollback()
+    job, video = load(session_factory, job_id, video_id)
+    assert job.status == JOB_RUNNING and job.locked_by == "worker-b" and job.attempts == 2
+    assert video.processing_status == PROCESSING
+
+    with session_factory() as db:
+        assert complete_job(db, job_id, "worker-b", {"duration_ms": 1}) is not None
+        db.commit()
+    job, video = load(session_factory, job_id, video_id)
+    assert job.status == JOB_SUCCEEDED
+    assert video.processing_status == PROCESSING_READY
+
+
+def test_lease_expiring_on_final_attempt_fails_job(session_factory):
+    job_id, video_id = make_video_job(session_factory, STUB_SUCCEED, {"duration_ms": 1}, max_attempts=1)
+    with session_factory() as db:
+        claim_jobs(db, "worker-a", 10)
+        db.commit()
+
+    expire_lease(session_factory, job_id)
+    with session_factory() as db:
+        assert claim_jobs(db, "worker-b", 10) == []
+        db.commit()
+
+    job, video = load(session_factory, job_id, video_id)
+    assert job.status == JOB_FAILED
+    assert job.last_error == "Lease expired on the final attempt"
+    assert video.processing_status == PROCESSING_FAILED
+
+
+@pytest.mark.parametrize("attempts", [1, 3, 8])
+def test_retry_delay_grows_and_is_capped(attempts):
+    delay = queue.retry_delay(attempts, base=10, cap=60)
+    expected = min(60, 10 * 2 ** (attempts - 1))
+    assert expected / 2 <= delay <= expected
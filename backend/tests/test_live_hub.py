@@ -0,0 +1,111 @@
+import asyncio
+import json
+import pytest
+from app.live_stream.hub import ChatRateLimit, LiveHub, LocalBroker, RedisBroker, Subscriber
+
+pytestmark = pytest.mark.anyio
+
+
+async def next_event(subscriber: Subscriber, timeout: float = 2.0) -> dict:
+    return json.loads(await asyncio.wait_for(subscriber.queue.get(), timeout))
+
+
+def redis_broker(client, prefix: str) -> RedisBroker:
+    broker = RedisBroker("redis://localhost", prefix=prefix)
+    broker.client = client
+    return broker
+
+
+async def test_local_hub_delivers_to_room():
+    hub = LiveHub(LocalBroker())
+    viewer, other_room = Subscriber(None), Subscriber(None)
+    await hub.join(1, viewer)
+    await hub.join(2, other_room)
+
+    await hub.publish(1, {"type": "gift", "gift": "rose"})
+
+    assert await next_event(viewer) == {"type": "gift", "gift": "rose"}
+    assert other_room.queue.empty()
+    assert hub.viewer_count(1) == 1
+
+    await hub.leave(1, viewer)
+    assert hub.viewer_count(1) == 0 and 1 not in hub.rooms
+    await hub.close()
+
+
+async def test_slow_consumer_is_dropped():
+    hub = LiveHub(LocalBroker())
+    slow = Subscriber(None, queue_size=2)
+    await hub.join(1, slow)
+
+    for n in range(3):
+        await hub.publish(1, {"n": n})
+
+    assert slow.dropped
+    assert hub.dropped == 1 and hub.viewer_count(1) == 0
+    await hub.close()
+
+
+async def wait_for_subscribers(client, channel: str, expected: int, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        [(_, count)] = await client.pubsub_numsub(channel)
+        if count == expected:
+            return
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError(f"{channel} has {count} subscribers, expected {expected}")
+        await asyncio.sleep(0.01)
+
+
+async def test_redis_broker_relays_between_workers(redis_client_factory, redis_prefix):
+    publisher = LiveHub(redis_broker(redis_client_factory(), redis_prefix))
+    receiver = LiveHub(redis_broker(redis_client_factory(), redis_prefix))
+    probe = redis_client_factory()
+    viewer = Subscriber(None)
+    try:
+        await publisher.start()
+        await receiver.join(7, viewer)
+        await wait_for_subscribers(probe, f"{redis_prefix}7", 1)
+
+        await publisher.publish(7, {"type": "comment", "text": "hi"})
+
+        assert await next_event(viewer) == {"type": "comment", "text": "hi"}
+        # The publisher has no viewers of the stream, so it never subscribed
+        assert publisher.viewer_count(7) == 0
+
+        await receiver.leave(7, viewer)
+        await wait_for_subscribers(probe, f"{redis_prefix}7", 0)
+    finally:
+        await publisher.close()
+        await receiver.close()
+        await probe.close()
+
+
+async def test_redis_broker_delivers_own_events(redis_client_factory, redis_prefix):
+    hub = LiveHub(redis_broker(redis_client_factory(), redis_prefix))
+    probe = redis_client_factory()
+    viewer = Subscriber(None)
+    try:
+        await hub.join(3, viewer)
+        await wait_for_subscribers(probe, f"{redis_prefix}3", 1)
+
+        await hub.publish(3, {"type": "like"})
+
+        # Delivered once, from the channel, not also directly
+        assert await next_event(viewer) == {"type": "like"}
+        await asyncio.sleep(0.1)
+        assert viewer.queue.empty()
+    finally:
+        await hub.close()
+        await probe.close()
+
+
+def test_chat_rate_limit_allows_a_burst_then_the_sustained_rate():
+    now = [0.0]
+    limit = ChatRateLimit(rate=2, burst=3, clock=lambda: now[0])
+
+    assert [limit.allow() for _ in range(4)] == [True, True, True, False]
+    now[0] += 0.5
+    assert [limit.allow() for _ in range(2)] == [True, False]
+    now[0] += 10
+    assert [limit.allow() for _ in range(4)] == [True, True, True, False]